@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+
+"""
+Tests of clade counting and majority rule consensus trees (CladeCounter
+and ConsensusTree) against brute-force counts of clades.
+"""
+
+import random
+import pytest
+import toytree
+from toytree.CladeCounter import CladeCounter
+from toytree.Multitree import ConsensusTree
+from toytree.utils import ToytreeError
+
+
+def get_trees(ntips, ntrees, nswaps, seed):
+    "returns trees that differ from one random tree by swapped tip names"
+    rng = random.Random(seed)
+    base = toytree.rtree.coaltree(ntips, seed=seed)
+    trees = []
+    for _ in range(ntrees):
+        tree = toytree.tree(base.write())
+        tips = tree.treenode.get_leaves()
+        for _ in range(nswaps):
+            tip1, tip2 = rng.sample(tips, 2)
+            tip1.name, tip2.name = tip2.name, tip1.name
+        trees.append(toytree.tree(tree.write()))
+    return trees
+
+
+def get_splits(tree):
+    """
+    returns the non-trivial splits of a tree as sets of tip names on the 
+    side without the first tip name, mapped to their node supports.
+    """
+    root = tree.treenode
+    tips = frozenset(root.get_leaf_names())
+    first = min(tips)
+    splits = {}
+    for node in root.traverse():
+        if node is root:
+            continue
+        side = frozenset(node.get_leaf_names())
+        if first in side:
+            side = tips - side
+        if 1 < len(side) < len(tips) - 1:
+            splits[side] = node.support
+    return splits
+
+
+def get_freqs(trees):
+    "returns the frequency of each non-trivial split among trees"
+    counts = {}
+    for tree in trees:
+        for split in get_splits(tree):
+            counts[split] = counts.get(split, 0) + 1
+    return {i: j / float(len(trees)) for (i, j) in counts.items()}
+
+
+def get_names(mask, names):
+    "returns the set of tip names of a clade bitset"
+    return frozenset(j for i, j in enumerate(names) if mask >> i & 1)
+
+
+def get_counted_freqs(cons):
+    "returns the non-trivial split freqs of a ConsensusTree after update()"
+    tips = frozenset(cons.names)
+    freqs = {}
+    for mask, freq in cons.clade_counts:
+        split = get_names(mask, cons.names)
+        if min(tips) in split:
+            split = tips - split
+        if 1 < len(split) < len(tips) - 1:
+            freqs[split] = freq
+    return freqs
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_clade_counts_equal_brute_force(seed):
+    trees = get_trees(12, 30, 2, seed)
+
+    # some trees are rooted differently, which has the same splits
+    rng = random.Random(seed)
+    for idx, tree in enumerate(trees):
+        if rng.random() < 0.3:
+            trees[idx] = tree.root(rng.choice(tree.get_tip_labels()))
+        elif rng.random() < 0.3:
+            trees[idx] = tree.unroot()
+
+    cons = ConsensusTree(trees)
+    cons.update()
+    counted = get_counted_freqs(cons)
+    expected = get_freqs(trees)
+    assert counted.keys() == expected.keys()
+    for split, freq in expected.items():
+        assert counted[split] == pytest.approx(freq)
+
+    # clades are in order of decreasing frequency
+    freqs = [i[1] for i in cons.clade_counts]
+    assert freqs == sorted(freqs, reverse=True)
+
+
+def is_compatible(clade1, clade2):
+    "two clades on the same side of the first tip are nested or disjoint"
+    return clade1 <= clade2 or clade2 <= clade1 or not clade1 & clade2
+
+
+@pytest.mark.parametrize("cutoff", [0.0, 0.3, 0.5])
+@pytest.mark.parametrize("seed", range(3))
+def test_filter_clades_equals_brute_force(seed, cutoff):
+    trees = get_trees(14, 40, 3, seed)
+    cons = ConsensusTree(trees, cutoff=cutoff)
+    cons.update()
+
+    # greedily keep clades above the cutoff compatible with all kept
+    kept = []
+    for mask, freq in cons.clade_counts:
+        if freq < cutoff:
+            break
+        clade = get_names(mask, cons.names)
+        if all(is_compatible(clade, i) for i in kept):
+            kept.append(clade)
+    filtered = [get_names(i[0], cons.names) for i in cons.fclade_counts]
+    assert filtered == kept
+
+
+# consensus trees of get_trees(ntips, ntrees, nswaps, seed) at a cutoff 
+# written by the implementation before clades were counted as bitsets.
+PREVIOUS = [
+    ((10, 40, 1, 1), 0.0, (
+        "(r9:100,(r7:100,r8:100)80:80,(r6:100,(r5:100,(r4:100,(r3:100,"
+        "(r2:100,(r1:100,r0:100)57:57)40:40)48:48)48:48)42:42)55:55);")),
+    ((12, 60, 2, 2), 0.5, (
+        "(r2:100,r10:100,r7:100,r6:100,r3:100,r1:100,r11:100,r0:100,"
+        "(r9:100,r8:100)52:52,(r5:100,r4:100)60:60);")),
+    ((16, 80, 2, 3), 0.0, (
+        "((r12:100,r13:100)64:64,(r15:100,r14:100)51:51,(r11:100,((r10:100,"
+        "((r6:100,r7:100)55:55,(r9:100,r8:100)60:60)36:36)31:31,(r5:100,"
+        "((r3:100,r4:100)69:69,(r2:100,(r1:100,r0:100)66:66)44:44)26:26)"
+        "26:26)32:32)41:41);")),
+    ((20, 100, 3, 4), 0.0, (
+        "(r19:100,((r18:100,r17:100)47:47,(r16:100,(r15:100,(r14:100,"
+        "r13:100)46:46)35:35)27:27)15:15,(r12:100,((r11:100,(r10:100,"
+        "(r9:100,r8:100)49:49)37:37)27:27,((r6:100,r7:100)55:55,((r5:100,"
+        "(r3:100,r4:100)52:52)43:43,(r2:100,(r1:100,r0:100)60:60)45:45)"
+        "26:26)21:21)9:9)15:15);")),
+]
+
+
+@pytest.mark.parametrize("args, cutoff, newick", PREVIOUS)
+def test_consensus_equals_previous_output(args, cutoff, newick):
+    trees = get_trees(*args)
+    ctree = toytree.mtree(trees).get_consensus_tree(cutoff=cutoff)
+    expected = toytree.tree(newick)
+    assert sorted(ctree.get_tip_labels()) == sorted(expected.get_tip_labels())
+    assert get_splits(ctree) == get_splits(expected)
+    for node in ctree.treenode.traverse():
+        assert len(node.children) != 1
+
+
+def test_merged_clade_counters_equal_one_counter():
+    trees = get_trees(12, 30, 2, 5)
+    names = trees[0].get_tip_labels()
+    total = CladeCounter(names)
+    for tree in trees:
+        total.add(tree.treenode)
+
+    # merge counters of chunks in a different order
+    chunks = [CladeCounter(names) for _ in range(3)]
+    for idx, tree in enumerate(trees):
+        chunks[idx % 3].add(tree.treenode)
+    merged = chunks[2].merge(chunks[0]).merge(chunks[1])
+    assert merged.ntrees == total.ntrees
+    assert merged.counts == total.counts
+    for key, value in total.dists.items():
+        assert merged.dists[key] == pytest.approx(value)
+    assert merged.get_clade_freqs()[0] == total.get_clade_freqs()[0]
+
+    with pytest.raises(ToytreeError):
+        merged.merge(CladeCounter(names[::-1]))
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_clade_counter_from_newicks(tmp_path, workers):
+    trees = get_trees(12, 30, 2, 6)
+    newicks = [i.write() for i in trees]
+    path = tmp_path / "trees.nex"
+    path.write_text("#NEXUS\n" + "\n".join(newicks) + "\nEnd;\n")
+    counter = CladeCounter.from_newicks(
+        str(path), workers=workers, chunksize=7)
+    assert counter.ntrees == len(trees)
+    assert get_splits(counter.get_consensus_tree()) == get_splits(
+        toytree.mtree(trees).get_consensus_tree())
+
+
+@pytest.mark.parametrize("cutoff", [0.0, 0.5])
+def test_incremental_consensus_equals_full(cutoff):
+    trees = get_trees(14, 60, 2, 7)
+    cons = ConsensusTree(trees[:10], cutoff=cutoff)
+    cons.update()
+    for start in range(10, 60, 10):
+        # add trees as ToyTrees, TreeNodes and newick strings
+        chunk = trees[start:start + 10]
+        cons.add_many(chunk[:4])
+        cons.add_many([i.treenode for i in chunk[4:7]])
+        cons.add_many([i.write() for i in chunk[7:]])
+        cons.update()
+        full = ConsensusTree(trees[:start + 10], cutoff=cutoff)
+        full.update()
+        assert cons.fclade_counts == full.fclade_counts
+        assert get_splits(cons.ttree) == get_splits(full.ttree)
+
+
+def test_incremental_consensus_from_nothing():
+    trees = get_trees(10, 20, 2, 8)
+    cons = ConsensusTree()
+    cons.add_many(i.write() for i in trees)
+    cons.update()
+    full = ConsensusTree(trees)
+    full.update()
+    assert get_splits(cons.ttree) == get_splits(full.ttree)
+
+
+def test_incremental_support_on_best_tree():
+    trees = get_trees(10, 30, 2, 9)
+    best = trees[0]
+    cons = ConsensusTree(trees[:10], best_tree=best)
+    cons.update()
+    cons.add_many(trees[10:])
+    cons.update()
+    full = ConsensusTree(trees, best_tree=best)
+    full.update()
+    assert get_splits(cons.ttree) == get_splits(full.ttree)
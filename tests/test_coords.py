@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+
+"""
+Tests that cached plot coordinates are re-used only while the tree is
+unchanged (see Coords.update_layout).
+"""
+
+import numpy as np
+import toytree
+from copy import deepcopy
+from toytree.Drawing import Drawing
+
+
+def drawn_verts(tree, layout=None):
+    "returns the node coordinates of a drawing of a tree"
+    style = deepcopy(tree.style)
+    if layout:
+        style.layout = layout
+    draw = Drawing(tree, style=style)
+    draw.update()
+    return draw.coords.verts
+
+
+def fresh_verts(tree):
+    "returns the node coordinates of a copy of the tree built from scratch"
+    fresh = tree.copy()
+    fresh._coords.update()
+    return drawn_verts(fresh)
+
+
+def test_draw_after_editing_dists_in_place():
+    tree = toytree.rtree.unittree(5, seed=123)
+    before = drawn_verts(tree)
+    for node in tree.treenode.traverse():
+        node.dist = 3
+    after = drawn_verts(tree)
+    assert not np.allclose(before, after)
+    assert np.allclose(after, fresh_verts(tree))
+
+
+def test_draw_after_editing_topology_in_place():
+    tree = toytree.rtree.unittree(8, seed=1)
+    drawn_verts(tree)
+    node = tree.treenode.children[0]
+    node.children = node.children[::-1]
+    assert np.allclose(drawn_verts(tree), fresh_verts(tree))
+
+
+def test_draw_after_set_node_values():
+    tree = toytree.tree("((a:1,b:2):1,c:3);")
+    drawn_verts(tree)
+    ntree = tree.set_node_values("dist", {"a": 5})
+    assert np.allclose(drawn_verts(ntree), fresh_verts(ntree))
+
+
+def test_layouts_reuse_cached_geometry():
+    tree = toytree.rtree.unittree(20, seed=2)
+    xpos = tree._coords._xpos
+    for layout in ("r", "l", "u", "d"):
+        verts = drawn_verts(tree, layout=layout)
+        fresh = tree.copy()
+        fresh._coords.update()
+        assert np.allclose(verts, drawn_verts(fresh, layout=layout))
+    assert tree._coords._xpos is xpos
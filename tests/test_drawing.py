@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+"""
+Tests that ToyTree.draw() shows the current state of a tree, which is
+drawn from a read-only view that shares the cached coordinates.
+"""
+
+import numpy as np
+import toyplot
+import toyplot.svg
+import toytree
+
+
+def node_positions(tree, **kwargs):
+    "returns the x and y of the node markers of a drawn tree"
+    canvas, axes = tree.draw(node_sizes=8, **kwargs)
+    marks = canvas._scenegraph.targets(axes, "render")
+    nodes = [i for i in marks if isinstance(i, toyplot.mark.Point)][0]
+    return np.column_stack([nodes._table["x"], nodes._table["y0"]])
+
+
+def test_draw_after_direct_edits():
+    tree = toytree.rtree.unittree(5, seed=123)
+    before = node_positions(tree)
+    for node in tree.treenode.traverse():
+        node.dist = 3
+    after = node_positions(tree)
+    fresh = node_positions(toytree.tree(tree.write()))
+    assert not np.allclose(before, after)
+    assert np.allclose(after, fresh)
+
+
+def test_draw_does_not_modify_tree():
+    tree = toytree.rtree.unittree(10, seed=1)
+    verts = tree._coords.verts.copy()
+    node_positions(tree, layout="d")
+    assert tree.style.layout == "r"
+    assert np.allclose(tree._coords.verts, verts)
+
+
+def test_draw_nodes_with_mixed_sizes_and_colors():
+    tree = toytree.rtree.unittree(6, seed=7)
+    sizes = [0, 6, 8, 10] * 3
+    colors = ["red", "blue", "green"] * 4
+    fills = {
+        "red": "rgb(100%,0%,0%)",
+        "blue": "rgb(0%,0%,100%)",
+        "green": "rgb(0%,50.2%,0%)",
+    }
+    canvas, _ = tree.draw(
+        node_labels="idx", node_sizes=sizes[:11], node_colors=colors[:11])
+    svg = toyplot.svg.render(canvas)
+
+    # node values are in plot order (reversed idx)
+    nidxs = tree.get_node_values("idx", 1, 1)
+    expected = {
+        str(j): (sizes[i] / 2., fills[colors[i]])
+        for i, j in enumerate(nidxs)
+    }
+
+    # every internal node is drawn with its own size and color
+    points = [
+        i for i in svg.iter("g")
+        if i.get("class") == "toyplot-mark-Point"]
+    datums = [
+        i for i in points[0].iter("g")
+        if i.get("class") == "toyplot-Datum"]
+    labels = [i.find(".//text").text for i in datums]
+    assert sorted(labels) == sorted(
+        str(i) for i in range(tree.ntips, tree.nnodes))
+    for datum, label in zip(datums, labels):
+        radius = datum.find("circle").get("r")
+        size, color = expected[label]
+        assert float(radius) == size
+        assert "fill:{};".format(color) in datum.get("style") + ";"
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+"""
+Tests of ToyTree.drop_tips() against clades and distances of the tips 
+that are kept, computed by brute force on the full tree.
+"""
+
+import itertools
+import random
+import pytest
+import toytree
+from toytree.utils import ToytreeError
+
+
+def get_clades(treenode, keep):
+    "returns the set of clades of a tree restricted to the tips in keep"
+    clades = set()
+    for node in treenode.traverse():
+        clade = frozenset(node.get_leaf_names()) & keep
+        if clade:
+            clades.add(clade)
+    return clades
+
+
+def get_distances(treenode, keep):
+    "returns the distances between each pair of tips in keep"
+    tips = {i.name: i for i in treenode.get_leaves()}
+    return {
+        (i, j): treenode.get_distance(tips[i], tips[j])
+        for (i, j) in itertools.combinations(sorted(keep), 2)
+    }
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_drop_tips_equals_brute_force(seed):
+    rng = random.Random(seed)
+    tree = toytree.rtree.coaltree(rng.choice([4, 12, 30]), seed=seed)
+    tips = tree.get_tip_labels()
+    drop = rng.sample(tips, rng.randint(1, len(tips) - 2))
+    keep = set(tips) - set(drop)
+    newick = tree.write()
+
+    dropped = tree.drop_tips(drop)
+    assert set(dropped.get_tip_labels()) == keep
+    assert get_clades(dropped.treenode, keep) == get_clades(tree.treenode, keep)
+    expected = get_distances(tree.treenode, keep)
+    for key, dist in get_distances(dropped.treenode, keep).items():
+        assert dist == pytest.approx(expected[key])
+
+    # no unary nodes are left below the root, and the tree is unchanged
+    for node in dropped.treenode.traverse():
+        assert node.is_root() or len(node.children) != 1
+    assert tree.write() == newick
+    assert dropped._coords.verts.shape[0] == dropped.nnodes
+
+
+def test_drop_tips_selects_by_regex():
+    tree = toytree.rtree.unittree(8, seed=1)
+    dropped = tree.drop_tips(regex="r[0-3]$")
+    assert sorted(dropped.get_tip_labels()) == ["r4", "r5", "r6", "r7"]
+
+
+def test_drop_all_tips_raises():
+    tree = toytree.rtree.unittree(5, seed=1)
+    with pytest.raises(ToytreeError):
+        tree.drop_tips(tree.get_tip_labels())
@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+
+"""
+Tests of the native SVG renderer (toytree.html).
+"""
+
+import pytest
+import toytree
+import toytree.html
+from toytree.utils import ToytreeError
+
+
+@pytest.mark.parametrize("layout", ["r", "l", "u", "d", "c"])
+def test_render_layouts(layout):
+    tree = toytree.rtree.unittree(8, seed=1)
+    svg = toytree.html.render(tree, layout=layout)
+    assert svg.startswith("<svg") and svg.rstrip().endswith("</svg>")
+
+
+@pytest.mark.parametrize("layout", ["x", "unrooted", "z"])
+def test_render_unsupported_layout_raises(layout):
+    tree = toytree.rtree.unittree(8, seed=1)
+    with pytest.raises(ToytreeError, match="unsupported layout"):
+        toytree.html.render(tree, layout=layout)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+"""
+Tests of ToyTree.induced_subtrees() against clades and distances of each
+tip subset, computed by brute force on the full tree.
+"""
+
+import itertools
+import random
+import pytest
+import toytree
+from toytree.utils import ToytreeError
+
+
+def get_clades(treenode, keep):
+    "returns the set of clades of a tree restricted to the tips in keep"
+    clades = set()
+    for node in treenode.traverse():
+        clade = frozenset(node.get_leaf_names()) & keep
+        if clade:
+            clades.add(clade)
+    return clades
+
+
+def get_distances(treenode, keep):
+    "returns the distances between each pair of tips in keep"
+    tips = {i.name: i for i in treenode.get_leaves()}
+    return {
+        (i, j): treenode.get_distance(tips[i], tips[j])
+        for (i, j) in itertools.combinations(sorted(keep), 2)
+    }
+
+
+def get_tipsets(tree, ntipsets, seed):
+    rng = random.Random(seed)
+    tips = tree.get_tip_labels()
+    return [
+        rng.sample(tips, rng.randint(2, len(tips)))
+        for i in range(ntipsets)
+    ]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_induced_subtrees_equal_brute_force(seed):
+    tree = toytree.rtree.coaltree(25, seed=seed)
+    tipsets = get_tipsets(tree, 10, seed)
+    subtrees = tree.induced_subtrees(tipsets)
+    assert subtrees.ntrees == len(tipsets)
+    for subtree, tipset in zip(subtrees.treelist, tipsets):
+        keep = set(tipset)
+        assert set(subtree.get_tip_labels()) == keep
+        assert (
+            get_clades(subtree.treenode, keep) ==
+            get_clades(tree.treenode, keep))
+        expected = get_distances(tree.treenode, keep)
+        for key, dist in get_distances(subtree.treenode, keep).items():
+            assert dist == pytest.approx(expected[key])
+        for node in subtree.treenode.traverse():
+            assert len(node.children) != 1
+
+
+def test_induced_subtrees_equal_drop_tips():
+    tree = toytree.rtree.coaltree(20, seed=3)
+    tipsets = get_tipsets(tree, 5, 3)
+    subtrees = tree.induced_subtrees(tipsets)
+    for subtree, tipset in zip(subtrees.treelist, tipsets):
+        drop = set(tree.get_tip_labels()) - set(tipset)
+        dropped = tree.drop_tips(list(drop)) if drop else tree
+        assert (
+            subtree.treenode.get_topology_hash() ==
+            dropped.treenode.get_topology_hash())
+
+
+def test_induced_subtrees_same_for_any_workers():
+    tree = toytree.rtree.coaltree(20, seed=1)
+    tipsets = get_tipsets(tree, 8, 1)
+    serial = tree.induced_subtrees(tipsets)
+    parallel = tree.induced_subtrees(tipsets, workers=2)
+    assert (
+        [i.write() for i in serial.treelist] ==
+        [i.write() for i in parallel.treelist])
+
+
+@pytest.mark.parametrize("tipset", [["r0"], ["r0", "missing"]])
+def test_induced_subtrees_bad_tipsets_raise(tipset):
+    tree = toytree.rtree.unittree(6, seed=1)
+    with pytest.raises(ToytreeError):
+        tree.induced_subtrees([tipset])
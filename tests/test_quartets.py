@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+"""
+Tests of quartet distances and quartet concordance factors (Quartets)
+against enumeration of all quartets.
+"""
+
+import itertools
+import random
+import numpy as np
+import pytest
+import toytree
+
+
+def get_path_lengths(tree):
+    "returns a function of the number of edges between two tip names"
+    paths = {}
+    for leaf in tree.treenode.get_leaves():
+        path = []
+        node = leaf
+        while node is not None:
+            path.append(node)
+            node = node.up
+        paths[leaf.name] = path
+
+    def length(name1, name2):
+        path1, path2 = paths[name1], paths[name2]
+        shared = set(path2)
+        for idx, node in enumerate(path1):
+            if node in shared:
+                return idx + path2.index(node)
+    return length
+
+
+def get_topology(length, tip1, tip2, tip3, tip4):
+    """
+    returns 0, 1, or 2 if a quartet is 12|34, 13|24, or 14|23 by the
+    four point condition, or -1 if it is unresolved.
+    """
+    sums = [
+        length(tip1, tip2) + length(tip3, tip4),
+        length(tip1, tip3) + length(tip2, tip4),
+        length(tip1, tip4) + length(tip2, tip3),
+    ]
+    if sums.count(min(sums)) > 1:
+        return -1
+    return sums.index(min(sums))
+
+
+def get_tree(ntips, seed, collapse=0.):
+    "returns a random tree, rooted or not, with some internal edges removed"
+    rng = random.Random(seed)
+    tree = toytree.rtree.unittree(ntips, seed=seed)
+    for node in list(tree.treenode.traverse()):
+        if node.up and node.children and rng.random() < collapse:
+            node.delete()
+    tree = toytree.tree(tree.write())
+    return (tree.unroot() if rng.random() < 0.5 else tree)
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_quartet_distance_equals_enumeration(seed):
+    ntips = 4 + seed
+    tree1 = get_tree(ntips, seed)
+    tree2 = get_tree(ntips, seed + 100)
+    length1 = get_path_lengths(tree1)
+    length2 = get_path_lengths(tree2)
+    quartets = list(itertools.combinations(tree1.get_tip_labels(), 4))
+    expected = sum(
+        get_topology(length1, *i) != get_topology(length2, *i)
+        for i in quartets)
+    assert tree1.quartet_distance(tree2) == expected
+    assert tree1.quartet_distance(tree2, normalize=True) == pytest.approx(
+        expected / float(len(quartets)))
+    assert tree1.quartet_distance(tree1) == 0
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_quartet_distances_equal_pairwise(workers):
+    reference = get_tree(10, 1)
+    trees = [get_tree(10, i) for i in range(2, 8)]
+    dists = toytree.mtree(trees).quartet_distances(reference, workers=workers)
+    assert dists.tolist() == [reference.quartet_distance(i) for i in trees]
+
+
+def get_sides(node, names):
+    "returns the four sides L, R, A, B around the edge above a node"
+    left, right = [set(i.get_leaf_names()) for i in node.children]
+    parent = node.up
+    others = [i for i in parent.children if i is not node]
+    if parent.is_root():
+        above = [set(i.get_leaf_names()) for i in others]
+    else:
+        above = [
+            set(others[0].get_leaf_names()),
+            set(names) - set(parent.get_leaf_names())]
+    return left, right, above[0], above[1]
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_concordance_factors_equal_enumeration(workers):
+    species = get_tree(9, 1)
+    genes = [get_tree(9, i, collapse=0.3) for i in range(2, 8)]
+    names = species.get_tip_labels()
+    lengths = [get_path_lengths(i) for i in genes]
+    splits = [
+        set(frozenset(j.get_leaf_names()) for j in i.treenode.traverse())
+        for i in genes]
+
+    ctree = toytree.mtree(genes).get_concordance_factors(species, workers)
+    nedges = 0
+    for node in ctree.treenode.traverse():
+        if node.gcf == "":
+            continue
+        nedges += 1
+        left, right, above1, above2 = get_sides(node, names)
+
+        # gCF: % of gene trees with the split of the edge
+        clade = frozenset(left | right)
+        found = sum(
+            clade in i or frozenset(names) - clade in i for i in splits)
+        assert node.gcf == pytest.approx(100 * found / float(len(genes)))
+
+        # qCF and qDFs: % of resolved quartets around the edge
+        counts = np.zeros(3)
+        for length in lengths:
+            for quartet in itertools.product(left, right, above1, above2):
+                topology = get_topology(length, *quartet)
+                if topology >= 0:
+                    counts[topology] += 1
+        expected = 100 * counts / max(counts.sum(), 1)
+        assert [node.qcf, node.qdf1, node.qdf2] == pytest.approx(expected)
+
+    # every internal edge of the unrooted species tree
+    assert nedges == len(names) - 3
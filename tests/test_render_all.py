@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+
+"""
+Tests of writing many tree drawings with MultiTree.render_all().
+"""
+
+import os
+import pytest
+import toytree
+from toytree.Multitree import _has_ghostscript
+
+
+def get_trees():
+    return toytree.mtree([toytree.rtree.unittree(8, seed=i) for i in range(4)])
+
+
+@pytest.mark.parametrize("fmt", ["svg", "html"])
+def test_render_all_same_for_any_workers(tmp_path, fmt):
+    mtree = get_trees()
+    serial = mtree.render_all(str(tmp_path / "a"), fmt=fmt, node_sizes=6)
+    parallel = mtree.render_all(
+        str(tmp_path / "b"), fmt=fmt, workers=2, node_sizes=6)
+    for spath, ppath in zip(serial, parallel):
+        with open(spath, "rb") as sfile, open(ppath, "rb") as pfile:
+            assert sfile.read() == pfile.read()
+
+
+@pytest.mark.skipif(_has_ghostscript(), reason="ghostscript is installed")
+def test_render_all_png_without_ghostscript_warns(tmp_path):
+    with pytest.warns(UserWarning, match="raster"):
+        paths = get_trees().render_all(str(tmp_path), fmt="png")
+    assert all(os.path.getsize(i) for i in paths)
+
+
+def test_render_all_prints_only_if_verbose(tmp_path, capsys):
+    mtree = get_trees()
+    mtree.render_all(str(tmp_path / "a"))
+    assert capsys.readouterr().out == ""
+    mtree.render_all(str(tmp_path / "b"), verbose=True)
+    assert "trees/s" in capsys.readouterr().out
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+"""
+Tests of Robinson-Foulds distances between pairs of trees and of all-pairs
+distances with MultiTree.rf_matrix().
+"""
+
+import itertools
+import numpy as np
+import pytest
+import toytree
+import toytree.Multitree
+from toytree.RobinsonFoulds import RobinsonFoulds
+
+
+def get_trees():
+    trees = [toytree.rtree.unittree(10, seed=i) for i in range(12)]
+    trees += [i.root("r{}".format(idx)) for idx, i in enumerate(trees[:4])]
+    return trees
+
+
+def pairwise(trees, unrooted):
+    rfs, maxs = [], []
+    for tree1, tree2 in itertools.combinations(trees, 2):
+        result = tree1.treenode.robinson_foulds(
+            tree2.treenode, unrooted_trees=unrooted)
+        rfs.append(result[0])
+        maxs.append(result[1])
+    return np.array(rfs), np.array(maxs)
+
+
+@pytest.mark.parametrize("unrooted", [False, True])
+def test_rf_matrix_equals_pairwise_robinson_foulds(unrooted):
+    trees = get_trees()
+    rfs, maxs = pairwise(trees, unrooted)
+    mtree = toytree.mtree(trees)
+    assert np.array_equal(mtree.rf_matrix(unrooted=unrooted), rfs)
+    assert np.allclose(
+        mtree.rf_matrix(normalize=True, unrooted=unrooted), rfs / maxs)
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_rf_matrix_same_in_blocks(monkeypatch, workers):
+    mtree = toytree.mtree(get_trees())
+    expected = mtree.rf_matrix(unrooted=True)
+    # blocks of a few rows and columns of the table of trees x splits
+    monkeypatch.setattr(toytree.Multitree, "RF_BLOCK", 40)
+    blocks = mtree.rf_matrix(unrooted=True, workers=workers)
+    assert np.array_equal(blocks, expected)
+
+
+def test_rf_matrix_normalized_small_trees():
+    trees = [toytree.tree("((a,b),c);"), toytree.tree("((a,c),b);")]
+    for unrooted in (False, True):
+        dists = toytree.mtree(trees).rf_matrix(
+            normalize=True, unrooted=unrooted)
+        assert np.all(np.isfinite(dists))
+    # trees with a single tip have no splits to compare
+    trees = [toytree.tree("(a);"), toytree.tree("(a);")]
+    for unrooted in (False, True):
+        dists = toytree.mtree(trees).rf_matrix(
+            normalize=True, unrooted=unrooted)
+        assert np.array_equal(dists, [0.])
+
+
+def get_splits(tree, unrooted):
+    "returns the clades of a tree, or if unrooted its oriented splits"
+    tips = frozenset(tree.get_tip_labels())
+    splits = set()
+    for node in tree.treenode.traverse():
+        split = frozenset(node.get_leaf_names())
+        if unrooted:
+            if split == tips:
+                continue
+            if min(tips) in split:
+                split = tips - split
+        splits.add(split)
+    return splits
+
+
+@pytest.mark.parametrize("unrooted", [False, True])
+def test_robinson_foulds_equals_brute_force(unrooted):
+    trees = get_trees()
+    splits = [get_splits(i, unrooted) for i in trees]
+    for (idx1, tree1), (idx2, tree2) in itertools.combinations(
+            enumerate(trees), 2):
+        result = tree1.treenode.robinson_foulds(
+            tree2.treenode, unrooted_trees=unrooted)
+        assert result[0] == len(splits[idx1] ^ splits[idx2])
+
+
+def test_robinson_foulds_compare_reuses_reference():
+    trees = get_trees()
+    rfs = RobinsonFoulds(trees[0].treenode, trees[1].treenode)
+    for tree in trees[1:]:
+        assert (
+            rfs.compare(tree.treenode)[:2] ==
+            trees[0].treenode.robinson_foulds(tree.treenode)[:2])
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+
+"""
+Tests of re-rooting trees in place (toytree.Rooter) against brute-force
+root-to-tip distances and the splits and supports of the unrooted tree.
+"""
+
+import itertools
+import random
+import numpy as np
+import pytest
+import toytree
+from toytree.Rooter import reroot, iter_root_edges
+from toytree.utils import ToytreeError
+
+
+def get_tree(ntips, seed, unrooted=False):
+    "returns a coalescent tree with random supports on each edge"
+    rng = random.Random(seed)
+    tree = toytree.rtree.coaltree(ntips, seed=seed)
+    for node in tree.treenode.traverse():
+        node.support = rng.randint(0, 100)
+    if unrooted:
+        return tree.unroot()
+
+    # the two edges at the root are one edge of the unrooted tree
+    for child in tree.treenode.children:
+        child.support = 100
+    return tree
+
+
+def get_edges(tree):
+    """
+    returns {split: support} for the edges of the unrooted tree, where a
+    split is the smaller side (or the side without the first tip name), 
+    and the two edges at a bifurcating root are one edge.
+    """
+    root = tree.treenode
+    tips = frozenset(root.get_leaf_names())
+    first = min(tips)
+    edges = {}
+    for node in root.traverse():
+        if node is root:
+            continue
+        side = frozenset(node.get_leaf_names())
+        if first in side:
+            side = tips - side
+        if side and side != tips:
+            edges.setdefault(side, set()).add(node.support)
+    return edges
+
+
+def get_distances(tree):
+    "returns the distances between each pair of tips"
+    tips = {i.name: i for i in tree.treenode.get_leaves()}
+    return {
+        (i, j): tree.treenode.get_distance(tips[i], tips[j])
+        for (i, j) in itertools.combinations(sorted(tips), 2)
+    }
+
+
+def get_rootdists(tree):
+    "returns the distance from the root to each tip ordered by tip idx"
+    root = tree.treenode
+    dists = np.zeros(len(root.get_leaves()))
+    for leaf in root.get_leaves():
+        dists[leaf.idx] = root.get_distance(leaf)
+    return dists
+
+
+@pytest.mark.parametrize("unrooted", [False, True])
+@pytest.mark.parametrize("seed", range(4))
+def test_reroot_keeps_unrooted_tree(seed, unrooted):
+    tree = get_tree(12, seed, unrooted)
+    edges = get_edges(tree)
+    distances = get_distances(tree)
+    nodes = [i for i in tree.treenode.traverse() if not i.is_root()]
+    for node in nodes:
+        ctree = tree.copy()
+        cnode = ctree.treenode.search_nodes(idx=node.idx)[0]
+        dist = cnode.dist / 3.
+        reroot(ctree, cnode, dist)
+        ctree._coords.update()
+
+        # bifurcating root on the edge above the node
+        assert len(ctree.treenode.children) == 2
+        assert cnode.up is ctree.treenode
+        assert cnode.dist == pytest.approx(dist)
+
+        # same splits, supports, and distances between tips
+        assert get_edges(ctree) == edges
+        for key, value in get_distances(ctree).items():
+            assert value == pytest.approx(distances[key])
+
+
+def test_reroot_outside_edge_raises():
+    tree = get_tree(6, 1)
+    with pytest.raises(ToytreeError):
+        reroot(tree, tree.treenode)
+    node = tree.treenode.children[0]
+    with pytest.raises(ToytreeError):
+        reroot(tree, node, node.dist * 2)
+
+
+@pytest.mark.parametrize("ntips", [3, 4, 9, 20])
+@pytest.mark.parametrize("unrooted", [False, True])
+def test_iter_root_edges_visits_all_edges(ntips, unrooted):
+    tree = get_tree(ntips, ntips, unrooted)
+    newick = tree.write()
+    edges = get_edges(tree)
+    seen = []
+    for node, rootdists in tree.iter_root_edges():
+        assert node.up is tree.treenode
+        assert node.dist == 0
+        assert np.allclose(rootdists, get_rootdists(tree))
+        assert get_edges(tree) == edges
+        seen.append(node)
+
+    # each of the 2n - 3 edges once, and the tree is restored
+    assert len(seen) == len(set(seen)) == 2 * ntips - 3
+    assert tree.write() == newick
+
+
+def test_iter_root_edges_restores_tree_when_closed():
+    tree = get_tree(10, 2)
+    newick = tree.write()
+    edges = iter_root_edges(tree)
+    for _ in range(5):
+        next(edges)
+    edges.close()
+    assert tree.write() == newick
+
+
+@pytest.mark.parametrize("unrooted", [False, True])
+@pytest.mark.parametrize("seed", range(5))
+def test_root_midpoint_equals_brute_force(seed, unrooted):
+    tree = get_tree(15, seed, unrooted)
+    distances = get_distances(tree)
+    half = max(distances.values()) / 2.
+
+    # the root is halfway on a longest path between two tips, which
+    # are on different sides of the root.
+    rtree = tree.root_midpoint()
+    assert len(rtree.treenode.children) == 2
+    sides = [
+        max(rtree.treenode.get_distance(i) for i in j.get_leaves())
+        for j in rtree.treenode.children]
+    assert sides == pytest.approx([half, half])
+    for key, value in get_distances(rtree).items():
+        assert value == pytest.approx(distances[key])
+
+
+def get_min_var(tree):
+    """
+    returns the min variance of root-to-tip distances over every position
+    on every edge, from the variance at both ends and at the minimum of
+    the quadratic function of the position on each edge.
+    """
+    best = np.inf
+    for node, rootdists in tree.iter_root_edges():
+        # moving the root up by x adds x to tips below node and 
+        # subtracts x from the others.
+        signs = -np.ones(rootdists.size)
+        signs[[i.idx for i in node.get_leaves()]] = 1
+        length = [i for i in tree.treenode.children if i is not node][0].dist
+        vals = [0., length]
+        slope = np.mean(signs * (rootdists - rootdists.mean()))
+        var = np.var(signs)
+        if var:
+            vals.append(min(max(-slope / var, 0.), length))
+        for val in vals:
+            best = min(best, np.var(rootdists + val * signs))
+    return best
+
+
+@pytest.mark.parametrize("unrooted", [False, True])
+@pytest.mark.parametrize("seed", range(5))
+def test_root_min_var_equals_brute_force(seed, unrooted):
+    tree = get_tree(15, seed, unrooted)
+    distances = get_distances(tree)
+    rtree = tree.root_min_var()
+    assert len(rtree.treenode.children) == 2
+    assert np.var(get_rootdists(rtree)) == pytest.approx(get_min_var(tree))
+    for key, value in get_distances(rtree).items():
+        assert value == pytest.approx(distances[key])
+
+
+def test_multitree_rooting_applies_to_each_tree():
+    trees = [get_tree(8, i, True) for i in range(3)]
+    mtree = toytree.mtree(trees)
+    for method in ("root_midpoint", "root_min_var"):
+        rooted = getattr(mtree, method)()
+        for tree, rtree in zip(trees, rooted.treelist):
+            assert rtree.write() == getattr(tree, method)().write()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+"""
+Tests of mapping support and transfer bootstrap expectation (TBE) from
+replicate trees onto a best tree (SupportMapper) against brute force.
+"""
+
+import random
+import numpy as np
+import pytest
+import toytree
+from toytree.SupportMapper import SupportMapper
+
+
+def get_replicates(ntips, ntrees, nswaps, seed):
+    """
+    returns trees that differ from one random tree by swapped tip names,
+    with random rootings, and a best tree among them.
+    """
+    rng = random.Random(seed)
+    base = toytree.rtree.coaltree(ntips, seed=seed)
+    trees = []
+    for _ in range(ntrees):
+        tree = toytree.tree(base.write())
+        tips = tree.treenode.get_leaves()
+        for _ in range(nswaps):
+            tip1, tip2 = rng.sample(tips, 2)
+            tip1.name, tip2.name = tip2.name, tip1.name
+        tree = toytree.tree(tree.write())
+        if rng.random() < 0.5:
+            tree = tree.root(rng.choice(tree.get_tip_labels()))
+        else:
+            tree = tree.unroot()
+        trees.append(tree)
+    return trees, trees[-1].root(rng.choice(base.get_tip_labels()))
+
+
+def get_clades(tree):
+    "returns the tip name sets below each node of a tree"
+    return [frozenset(i.get_leaf_names()) for i in tree.treenode.traverse()]
+
+
+@pytest.mark.parametrize("args", [(8, 20, 2, 1), (20, 30, 5, 2)])
+def test_support_and_tbe_equal_brute_force(args):
+    trees, best = get_replicates(*args)
+    ntips = args[0]
+    result = toytree.mtree(trees).get_consensus_tree(
+        best_tree=best, tbe=True)
+    replicates = [get_clades(i) for i in trees]
+    tips = frozenset(best.get_tip_labels())
+
+    for node in result.treenode.traverse():
+        if node.is_leaf() or node.is_root():
+            continue
+        split = frozenset(node.get_leaf_names())
+        small = min(len(split), ntips - len(split))
+
+        # support: the split is a clade, or the complement of a clade.
+        found = [
+            any(i == split or i == tips - split for i in clades)
+            for clades in replicates]
+        support = 100 * sum(found) / float(len(trees))
+        assert node.support == int(support)
+
+        # transfer distance: min tips moved to make the split equal to a
+        # split of the replicate, from either side of each of its clades.
+        tbe = 0.
+        for clades in replicates:
+            dist = small - 1
+            for clade in clades:
+                moved = len(split ^ clade)
+                dist = min(dist, moved, ntips - moved)
+            tbe += 1 - dist / float(small - 1)
+        assert node.tbe == pytest.approx(100 * tbe / len(trees))
+
+
+def test_support_mapper_same_for_any_workers(tmp_path):
+    trees, best = get_replicates(15, 25, 3, 3)
+    newicks = [i.write() for i in trees]
+    serial = SupportMapper.from_newicks(best, newicks, tbe=True)
+    path = tmp_path / "trees.nwk"
+    path.write_text("\n".join(newicks) + "\n")
+    parallel = SupportMapper.from_newicks(
+        best, str(path), tbe=True, workers=2, chunksize=4)
+    assert np.array_equal(serial.counts, parallel.counts)
+    assert np.allclose(serial.tbes, parallel.tbes)
+    assert serial.get_tree().write() == parallel.get_tree().write()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+
+"""
+A mergeable accumulator of clade counts for consensus trees.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from .TreeParser import Newick2TreeNode
+from .utils import ToytreeError
+
+
+# names and newick format shared with worker processes (see _init_worker)
+_SHARED = {}
+
+
+class CladeCounter:
+    """
+    Counts the occurrences and summed edge lengths of clades in a set of
+    trees with the same tips. Clades are bitsets stored as python ints
+    (bit i is set for tip names[i]) and each split is oriented to the side
+    that excludes the first tip (see _orient_split), such that rooted and
+    unrooted trees count the same splits. A counter holds only dicts and
+    ints, so it can be pickled and sent between processes, and counters
+    made from different sets of trees can be combined with merge(), which
+    is associative and commutative. This makes it possible to count trees
+    in chunks across worker processes, or while streaming them from a file,
+    and to infer a consensus tree from the total counts.
+
+    Parameters:
+    -----------
+    names: list
+        Tip names of the trees. Their order sets the bit of each tip.
+    """
+    def __init__(self, names):
+
+        # tip names and their bit indices
+        self.names = list(names)
+        self.ndict = {j: i for i, j in enumerate(self.names)}
+        self.full = (1 << len(self.names)) - 1
+
+        # number of trees counted, and counts and summed edge lengths
+        # keyed by oriented clade masks.
+        self.ntrees = 0
+        self.counts = {}
+        self.dists = {}
+
+
+    def __len__(self):
+        return self.ntrees
+
+
+    def add(self, treenode, ncopies=1):
+        """
+        Counts the clades of one tree in one postorder pass by OR-ing the
+        masks of children. Each split is counted once per tree with the
+        length of its edge, which at a bifurcating root is the sum of the
+        two root edges.
+
+        Parameters:
+        -----------
+        treenode: TreeNode
+            The root TreeNode of a tree, e.g., ToyTree.treenode.
+        ncopies: int
+            Number of times to count the tree, e.g., for duplicate trees.
+        """
+        masks = {}
+        for node in treenode.traverse("postorder"):
+            if node.is_leaf():
+                try:
+                    masks[node] = 1 << self.ndict[node.name]
+                except KeyError:
+                    raise ToytreeError(
+                        "tip '{}' is not in the names of this counter"
+                        .format(node.name))
+            else:
+                mask = 0
+                for child in node.children:
+                    mask |= masks[child]
+                masks[node] = mask
+
+        # sum edge lengths on each side of the same split
+        dists = {}
+        for node, mask in masks.items():
+            key = _orient_split(mask, self.full)
+            dist = (0. if node.is_root() else node.dist)
+            dists[key] = dists.get(key, 0.) + dist
+
+        for key, dist in dists.items():
+            self.counts[key] = self.counts.get(key, 0) + ncopies
+            self.dists[key] = self.dists.get(key, 0.) + dist * ncopies
+        self.ntrees += ncopies
+        return self
+
+
+    def add_newick(self, newick, tree_format=0):
+        """
+        Parses a newick string to a TreeNode, without making a ToyTree,
+        and counts its clades.
+
+        Parameters:
+        -----------
+        newick: str
+            A newick string of one tree.
+        tree_format: int
+            ete format of the newick string. Default is 0.
+        """
+        treenode = Newick2TreeNode(newick.strip(), fmt=tree_format)
+        return self.add(treenode.newick_from_string())
+
+
+    def merge(self, other):
+        """
+        Adds the counts of another CladeCounter with the same names to this
+        one in place and returns this counter.
+
+        Parameters:
+        -----------
+        other: CladeCounter
+            A counter of other trees.
+        """
+        if other.names != self.names:
+            raise ToytreeError(
+                "CladeCounters can only be merged if their names are in "
+                "the same order.")
+        for key, val in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + val
+            self.dists[key] = self.dists.get(key, 0.) + other.dists[key]
+        self.ntrees += other.ntrees
+        return self
+
+
+    def get_clade_freqs(self):
+        """
+        Returns a list of (clade, freq) sorted by decreasing frequency, and
+        a dict with the mean edge length of each clade. Clades with equal
+        frequency are sorted by their masks, such that the order does not
+        depend on the order in which trees were counted or merged.
+        """
+        dists = {
+            key: self.dists[key] / val for key, val in self.counts.items()}
+        freqs = sorted(
+            ((key, val / float(self.ntrees)) for key, val in self.counts.items()),
+            key=lambda x: (-x[1], x[0]))
+        return freqs, dists
+
+
+    def get_consensus_tree(self, cutoff=0.0, edge_lengths=False):
+        """
+        Returns an extended majority rule consensus tree of the counted
+        trees as a ToyTree object with 'support' values on nodes.
+
+        Parameters:
+        -----------
+        cutoff: float
+            Clades with support below this proportion are collapsed.
+        edge_lengths: bool
+            If True edge lengths are the mean edge length of each clade,
+            otherwise edge lengths are equal to support values.
+        """
+        from .Multitree import ConsensusTree
+        cons = ConsensusTree(
+            None, cutoff=cutoff, edge_lengths=edge_lengths, counter=self)
+        cons.update()
+        return cons.ttree
+
+
+    @classmethod
+    def from_newicks(
+        cls, newicks, names=None, tree_format=0, workers=None, chunksize=100):
+        """
+        Returns a CladeCounter of trees read one at a time from a file with
+        one newick string per line, or from an iterable of newick strings.
+        Lines without a tree (e.g., nexus headers) are skipped. Trees are
+        parsed and counted in chunks, in parallel if workers > 1, and
+        chunks are read from the input only as workers become free, such
+        that neither the trees nor the strings are held in memory at once.
+
+        Parameters:
+        -----------
+        newicks: str or iterable
+            A file path, or an iterable of newick strings.
+        names: list or None
+            Tip names in the order of their bits. If None the names are
+            taken in the order of the tip labels of the first tree.
+        tree_format: int
+            ete format of the newick strings. Default is 0.
+        workers: int or None
+            Number of worker processes. If None or 1 trees are counted in
+            this process.
+        chunksize: int
+            Number of trees sent to a worker at a time.
+        """
+        # read lines lazily from a file
+        if isinstance(newicks, str):
+            if not os.path.exists(newicks):
+                raise ToytreeError(
+                    "newicks should be a file path or an iterable of newick "
+                    "strings.")
+            with open(newicks, 'r') as infile:
+                return cls.from_newicks(
+                    infile, names, tree_format, workers, chunksize)
+
+        # skip lines that do not contain trees
+        lines = (i for i in newicks if "(" in i)
+
+        # get names from the first tree
+        if names is None:
+            from .Toytree import ToyTree
+            try:
+                first = next(lines)
+            except StopIteration:
+                raise ToytreeError("no trees found in newicks.")
+            names = ToyTree(first, tree_format=tree_format).get_tip_labels()
+            counter = cls(names).add_newick(first, tree_format)
+        else:
+            counter = cls(names)
+
+        # count in this process
+        if not workers or workers < 2:
+            for line in lines:
+                counter.add_newick(line, tree_format)
+            return counter
+
+        # count chunks in workers, keeping at most two chunks per worker
+        # queued, and merge their counters as they return.
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(counter.names, tree_format),
+        ) as pool:
+            pending = set()
+            for chunk in _iter_chunks(lines, chunksize):
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        counter.merge(future.result())
+                pending.add(pool.submit(_worker_count, chunk))
+            for future in pending:
+                counter.merge(future.result())
+        return counter
+
+
+
+def _orient_split(mask, full):
+    """
+    Returns a clade mask oriented to the side of its split that excludes
+    the tip at bit 0, except for the root (all tips), and for the split
+    between tip 0 and all other tips, which is returned as tip 0.
+    """
+    if mask == full or mask == 1:
+        return mask
+    if mask & 1:
+        mask ^= full
+    if mask == full ^ 1:
+        return 1
+    return mask
+
+
+def _iter_chunks(lines, chunksize):
+    "yields lists of up to chunksize items from an iterator"
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _init_worker(names, tree_format):
+    "store the names and newick format once per worker process"
+    _SHARED["args"] = (names, tree_format)
+
+
+def _worker_count(chunk):
+    "count the clades of a chunk of newick strings in a worker process"
+    names, tree_format = _SHARED["args"]
+    counter = CladeCounter(names)
+    for newick in chunk:
+        counter.add_newick(newick, tree_format)
+    return counter
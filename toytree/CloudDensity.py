@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+"""
+A toyplot Mark to draw the edges of a cloud of trees as a density image.
+"""
+
+import xml.etree.ElementTree as xml
+
+import numpy as np
+import toyplot
+import toyplot.bitmap
+import toyplot.html
+
+from .raster import Raster
+
+
+class CloudDensity(toyplot.mark.Mark):
+    """
+    Stores the edge segments of many trees in data coordinates and draws
+    them as a single raster image when the canvas is rendered. The edges
+    of each tree are a layer with the same color and opacity, so overlaps
+    among trees accumulate density like overlaid semi-transparent trees,
+    but the output size depends on the canvas size and not on the number
+    of trees.
+
+    Parameters:
+    -----------
+    segments: ndarray
+        Array of shape (n, 4) with (x0, y0, x1, y1) data coordinates.
+    layers: ndarray
+        Index of the tree that each segment belongs to.
+    color: str
+        Edge color.
+    width: float
+        Edge width in pixels.
+    opacity: float
+        Opacity of the edges of each tree.
+    """
+    def __init__(self, segments, layers, color, width, opacity):
+        super(CloudDensity, self).__init__()
+        self.segments = segments
+        self.layers = layers
+        self.color = color
+        self.width = width
+        self.opacity = opacity
+
+
+    def domain(self, axis):
+        "Returns the (min, max) data range of segments along an axis"
+        if not self.segments.size:
+            return (None, None)
+        cols = self.segments[:, [0, 2]] if axis == "x" else self.segments[:, [1, 3]]
+        return (cols.min(), cols.max())
+
+
+
+@toyplot.html.dispatch(
+    toyplot.coordinates.Cartesian, CloudDensity, toyplot.html.RenderContext)
+def _render(axes, mark, context):
+    "project segments to the axes, rasterize them, and embed a PNG image"
+    mark_xml = xml.SubElement(
+        context.parent,
+        "g",
+        id=context.get_id(mark),
+        attrib={"class": "toyplot-mark-Image"},
+    )
+    if not mark.segments.size:
+        return
+
+    # segments in canvas pixel coordinates
+    pixels = np.column_stack([
+        axes.project("x", mark.segments[:, 0]),
+        axes.project("y", mark.segments[:, 1]),
+        axes.project("x", mark.segments[:, 2]),
+        axes.project("y", mark.segments[:, 3]),
+    ])
+
+    # an image covering the segments plus the line width
+    pad = mark.width / 2. + 1
+    xmin = np.floor(min(pixels[:, 0].min(), pixels[:, 2].min()) - pad)
+    ymin = np.floor(min(pixels[:, 1].min(), pixels[:, 3].min()) - pad)
+    xmax = np.ceil(max(pixels[:, 0].max(), pixels[:, 2].max()) + pad)
+    ymax = np.ceil(max(pixels[:, 1].max(), pixels[:, 3].max()) + pad)
+    pixels -= [xmin, ymin, xmin, ymin]
+
+    # accumulate the edges of each tree as a layer
+    raster = Raster(xmax - xmin, ymax - ymin)
+    raster.add_segments(
+        pixels, mark.color, mark.width, mark.opacity, layers=mark.layers)
+
+    xml.SubElement(
+        mark_xml,
+        "image",
+        x=str(xmin),
+        y=str(ymin),
+        width=str(raster.width),
+        height=str(raster.height),
+        attrib={"xlink:href": toyplot.bitmap.to_png_data_uri(raster.to_array())},
+    )
@@ -4,10 +4,17 @@
 A class object for generating and storing Toytree plotting coordinates.
 """
 
+from copy import copy
+from operator import attrgetter
 import numpy as np
 from .utils import ToytreeError
 
 
+# getters of the node attrs read by Coords.get_tree_key
+_get_dist = attrgetter("_dist")
+_get_children = attrgetter("_children")
+
+
 class Coords:
     """
     Generates and stores plotting coordinates for nodes and edges of a tree. 
@@ -27,6 +34,9 @@ class Coords:
         Used for drawing edges on phylograms, not for nodes.
     lines: ndarray
         ...
+    lines_eidx: ndarray
+        1-d array with the row index in .edges of the edge that each row of
+        .lines is drawn for. Used to expand per-edge styles to lines.
     """
     def __init__(self, ttree):
 
@@ -37,12 +47,20 @@ class Coords:
         self.edges = np.zeros((self.ttree.nnodes - 1, 2), dtype=int)
         self.verts = np.zeros((self.ttree.nnodes, 2), dtype=float)
         self.lines = []
+        self.lines_eidx = np.zeros(0, dtype=int)
         self.coords = []
 
         # the class object for transforming to radial coords ('r').
         # init'ing this is pretty lightweight, so might as well default it.
         self.circ = Circle(self.ttree)
 
+        # cached base geometry for re-applying the layout (see update_layout)
+        self._nodes = []
+        self._tree_key = None
+        self._xpos = None
+        self._ypos = None
+        self._cidxs = None
+
         # the class object for transforming to force-directed layout ('u') 
         # ...
 
@@ -58,9 +76,16 @@ class Coords:
         self.edges = np.zeros((self.ttree.nnodes - 1, 2), dtype=int)
         self.verts = np.zeros((self.ttree.nnodes, 2), dtype=float)
         self.lines = []
+        self.lines_eidx = np.zeros(0, dtype=int)
         self.coords = []
         self.circ = Circle(self.ttree)
 
+        # clear the cached base geometry
+        self._tree_key = None
+        self._xpos = None
+        self._ypos = None
+        self._cidxs = None
+
         # updates idxs and fixed_idx for any tree manipulations
         self.update_idxs()             # get dimensions of tree
         self.update_fixed_order()      # in case ntips changed
@@ -81,6 +106,66 @@ class Coords:
         self.assign_coordinates()      # get edge locations        
         self.reorient_coordinates()    # orientation can reorder dimensions
 
+        # store a key to the tree state that the base geometry was built from
+        # (with copies of the lists of children, which may be edited in place)
+        self._nodes = list(self.ttree.treenode.traverse("preorder"))
+        key = self.get_tree_key()
+        self._tree_key = key[:3] + ([list(i) for i in key[3]],)
+
+
+    def update_layout(self):
+        """
+        Re-applies only the layout (orientation) and use_edge_lengths style 
+        to the cached base geometry of the tree. Node idxs, fixed order, 
+        edges and lines are not rebuilt, which makes switching orientations
+        on large trees cheap. If the tree has been modified since the last 
+        full update(), or the cached geometry cannot be reused (e.g., for 
+        the circular layout), then a full update() is run instead.
+        """
+        # circular layouts are recomputed from the radial vertices
+        circular = ("c", "circ", "circular", "x", "unrooted")
+        if self.ttree.style.layout in circular:
+            self.update()
+
+        # base geometry is missing or was built from a different tree state
+        elif (self._xpos is None) or (self._tree_key != self.get_tree_key()):
+            self.update()
+
+        # only re-apply the orientation transform to the cached geometry
+        else:
+            self.reorient_coordinates()
+
+
+    def get_view(self, ttree):
+        """
+        Returns a shallow copy of this Coords object for a view of the tree 
+        (e.g., one with a different style for drawing). The copy shares the
+        cached base geometry, edges and lines, and builds new verts and 
+        coords arrays when the layout is applied, such that drawing with a 
+        different style does not modify or rebuild the coordinates here.
+        """
+        view = copy(self)
+        view.ttree = ttree
+        return view
+
+
+    def get_tree_key(self):
+        """
+        Returns a summary of the tree attributes that affect plot 
+        coordinates: the root, the version of the tree (incremented by 
+        ToyTree functions that modify it without update(), e.g., fixing the
+        tip order), and the dist and children of each node that the cached
+        geometry was built from. Any change in topology changes the children
+        of one of these nodes, so nodes are read from the stored list instead
+        of traversing the tree. Used to test whether cached geometry is valid.
+        """
+        return (
+            self.ttree.treenode,
+            self.ttree._version,
+            list(map(_get_dist, self._nodes)),
+            list(map(_get_children, self._nodes)),
+        )
+
 
     # # NOT YET IMPLEMENTED
     # def force_directed_verts(self):
@@ -129,8 +214,8 @@ class Coords:
 
         # check if fixed_order changed:
         if fixed_order:
-            fixed_order = [
-                i for i in fixed_order if i in self.ttree.get_tip_labels()]
+            tipnames = set(self.ttree.treenode.get_leaf_names())
+            fixed_order = [i for i in fixed_order if i in tipnames]
             self.ttree._set_fixed_order(fixed_order)
         else:
             self.ttree._fixed_idx = list(range(self.ttree.ntips))
@@ -151,6 +236,10 @@ class Coords:
                 self.edges[nidx, :] = [node.up.idx, node.idx]
                 nidx += 1
 
+        # node heights from a single pass instead of node.height on each node
+        rootdists = self.get_root_dists()
+        treeheight = rootdists.max()
+
         # used for fixed-order setting
         # tidx = len(self.ttree) - 1
 
@@ -163,7 +252,8 @@ class Coords:
                 # get positions of tips using radians and radius
                 node.radians = self.circ.tip_radians[node.idx]
                 if uselen:
-                    node.radius = self.circ.radius - node.height
+                    node.radius = self.circ.radius - (
+                        treeheight - rootdists[node.idx])
                     node.x, node.y = self.circ.get_node_coords(node)
                 else:
                     node.radius = self.circ.radius
@@ -183,7 +273,8 @@ class Coords:
 
                 # height is either distance or nodes from root
                 if uselen:
-                    node.radius = self.circ.radius - node.height
+                    node.radius = self.circ.radius - (
+                        treeheight - rootdists[node.idx])
                 else:
                     node.radius = max([i.radius for i in node.children]) - 1
 
@@ -199,11 +290,26 @@ class Coords:
                 self.verts[node.idx] = [node.x, node.y]
 
 
+    def get_root_dists(self):
+        """
+        Returns an array with the distance of each node from the root, 
+        indexed by node idx. Computed in a single preorder traversal rather
+        than calling .get_distance() or .height on each node.
+        """
+        rootdists = np.zeros(self.ttree.nnodes, dtype=float)
+        for node in self.ttree.treenode.traverse("preorder"):
+            if not node.is_root():
+                rootdists[node.idx] = rootdists[node.up.idx] + node.dist
+        return rootdists
+
+
     def assign_vertices(self):
         """
         Sets .edges, .verts for node positions. 
-        X and Y positions here refer to base assumption that tree is right
-        facing, reorient_coordinates() will handle re-translating this.        
+        X and Y positions here refer to base assumption that tree is down
+        facing, reorient_coordinates() will handle re-translating this.
+        The x positions and y positions (with and without edge lengths) are
+        cached so that a new layout can be re-applied without this step.
         """
         # shortname 
         uselen = bool(self.ttree.style.use_edge_lengths)
@@ -218,8 +324,17 @@ class Coords:
 
         # store verts array with x,y positions of nodes (lengths of branches)
         # we want tips to align at the right face (larger axis number)
-        _root = self.ttree.treenode.get_tree_root()
-        _treeheight = _root.get_distance(_root.get_farthest_leaf()[0])
+        rootdists = self.get_root_dists()
+        _treeheight = rootdists.max()
+
+        # y-positions (heights) with and w/o edge lengths and x-positions
+        ylen = _treeheight - rootdists
+        ytop = np.zeros(self.ttree.nnodes, dtype=float)
+        xpos = np.zeros(self.ttree.nnodes, dtype=float)
+
+        # fixed order as a dict to avoid list.index() on every tip
+        if self.ttree._fixed_order:
+            fixed = {j: i for (i, j) in enumerate(self.ttree._fixed_order)}
 
         # set node x, y
         tidx = len(self.ttree) - 1
@@ -228,37 +343,34 @@ class Coords:
             # Just leaves: x positions are evenly spread and ordered on axis
             if node.is_leaf() and (not node.is_root()):
 
-                # set y-positions (heights). Distance from root or zero
-                node.y = _treeheight - _root.get_distance(node)
-                if not uselen:
-                    node.y = 0.0
-
                 # set x-positions (order of samples)
                 if self.ttree._fixed_order:
-                    node.x = self.ttree._fixed_order.index(node.name)# - tidx
+                    xpos[node.idx] = fixed[node.name]
                 else:
-                    node.x = tidx
+                    xpos[node.idx] = tidx
                     tidx -= 1
 
-                # store the x,y vertex positions
-                self.verts[node.idx] = [node.x, node.y]
-
             # All internal node positions are not evenly spread or ordered
             else:
-                # height is either distance or nnodes from root
-                node.y = _treeheight - _root.get_distance(node)
-                if not uselen:
-                    node.y = max([i.y for i in node.children]) + 1
-
-                # x position is halfway between childrens x-positions
+                # height is nnodes from root when not using edge lengths
                 if node.children:
                     nch = node.children
-                    node.x = sum(i.x for i in nch) / float(len(nch))
+                    ytop[node.idx] = max(ytop[i.idx] for i in nch) + 1
+
+                    # x position is halfway between childrens x-positions
+                    xpos[node.idx] = (
+                        sum(xpos[i.idx] for i in nch) / float(len(nch)))
                 else:
-                    node.x = tidx
+                    xpos[node.idx] = tidx
 
-                # store the x,y vertex positions                    
-                self.verts[node.idx] = [node.x, node.y]
+            # store the x,y positions on nodes
+            node.x = xpos[node.idx]
+            node.y = (ylen[node.idx] if uselen else ytop[node.idx])
+
+        # cache the base geometry and store the x,y vertex positions
+        self._xpos = xpos
+        self._ypos = {True: ylen, False: ytop}
+        self.verts = np.column_stack([xpos, self._ypos[uselen]])
 
 
     # IN DEVELOPMENT: 
@@ -334,6 +446,12 @@ class Coords:
         coords = {i: tuple(j) for (i, j) in enumerate(self.verts)}
         nidx = self.ttree.treenode.idx + 1
 
+        # (child, parent) idxs from which each up node takes its (x, y)
+        cidxs = []
+
+        # idx of the child node whose edge each line is drawn for
+        lchild = []
+
         # add up nodes and edges
         for node in self.ttree.treenode.traverse():
             if not node.is_root():
@@ -341,7 +459,9 @@ class Coords:
                     coords[nidx] = self.circ.get_node_lines(node)
                 else:
                     coords[nidx] = (node.x, node.up.y)
+                    cidxs.append((node.idx, node.up.idx))
                 edges.append((nidx, node.idx))
+                lchild.append(node.idx)
                 node.nup = nidx
                 nidx += 1
 
@@ -350,6 +470,7 @@ class Coords:
             if not node.is_leaf():
                 for child in node.children:
                     edges.append((node.idx, child.nup))
+                    lchild.append(child.idx)
 
         # store the vertex coordinates as an array
         self.coords = np.array([coords[i] for i in range(len(coords))])
@@ -357,71 +478,65 @@ class Coords:
         # store the edges as an array
         self.lines = np.array(edges)
 
+        # map each line to the row of its child's edge in .edges
+        erows = np.zeros(self.ttree.nnodes, dtype=int)
+        erows[self.edges[:, 1]] = np.arange(self.edges.shape[0])
+        self.lines_eidx = erows[np.array(lchild, dtype=int)]
+
+        # cache up node sources for re-applying the layout
+        if cidxs:
+            self._cidxs = np.array(cidxs, dtype=int)
+
 
     def reorient_coordinates(self):
         """
         Returns a modified .verts array with new coordinates for nodes. 
         This does not need to modify .edges. The order of nodes, and therefore
         of verts rows is still the same because it is still based on the tree
-        branching order (ladderized usually). 
+        branching order (ladderized usually). The new arrays are built from 
+        the cached down-facing geometry, so this can be called again after
+        changing layout or use_edge_lengths without calling update().
         """
-        # if tree is empty then bail out
-        if len(self.ttree) < 2:
+        # if tree is empty (no cached geometry, see assign_coordinates) 
+        # then bail out, without traversing the tree.
+        if self._cidxs is None:
             return
 
         # TODO: orientation for non linear trees
-        if self.ttree.style.layout in ('c', 'circular', 'x', 'unrooted'):
+        if self.ttree.style.layout in (
+                'c', 'circ', 'circular', 'x', 'unrooted'):
             return 
 
+        # down-facing base geometry of verts followed by up nodes
+        xpos = self._xpos
+        ypos = self._ypos[bool(self.ttree.style.use_edge_lengths)]
+        basex = np.concatenate([xpos, xpos[self._cidxs[:, 0]]])
+        basey = np.concatenate([ypos, ypos[self._cidxs[:, 1]]])
+
         # default: Down-facing tips align at y=0, first ladderized tip at x=0
         if self.ttree.style.layout in ('d', 'down'):
-            pass
+            coords = np.column_stack([basex, basey])
 
         # right-facing tips align at x=0, last ladderized tip at y=0
         elif self.ttree.style.layout in ('r', 'right'):
-
-            # verts swap x and ys and make xs 0 to negative
-            tmp = np.zeros(self.verts.shape)
-            tmp[:, 1] = self.verts[:, 0]
-            tmp[:, 0] = self.verts[:, 1] * -1
-            self.verts = tmp
-
-            # coords...
-            tmp = np.zeros(self.coords.shape)
-            tmp[:, 1] = self.coords[:, 0]
-            tmp[:, 0] = self.coords[:, 1] * -1
-            self.coords = tmp
+            # swap x and ys and make xs 0 to negative
+            coords = np.column_stack([basey * -1, basex])
 
         elif self.ttree.style.layout in ('l', 'left'):
-
-            # verts swap x and ys and make xs 0 to negative
-            tmp = np.zeros(self.verts.shape)
-            tmp[:, 1] = self.verts[:, 0]
-            tmp[:, 0] = self.verts[:, 1] 
-            self.verts = tmp
-
-            # coords...
-            tmp = np.zeros(self.coords.shape)
-            tmp[:, 1] = self.coords[:, 0]
-            tmp[:, 0] = self.coords[:, 1]
-            self.coords = tmp
+            # swap x and ys
+            coords = np.column_stack([basey, basex])
 
         elif self.ttree.style.layout in ('u', 'up'):
-            # verts swap x and ys and make xs 0 to negative
-            tmp = np.zeros(self.verts.shape)
-            tmp[:, 1] = self.verts[:, 1] * -1
-            tmp[:, 0] = self.verts[:, 0] * -1
-            self.verts = tmp
-
-            # coords...
-            tmp = np.zeros(self.coords.shape)
-            tmp[:, 1] = self.coords[:, 1] * -1
-            tmp[:, 0] = self.coords[:, 0] * -1
-            self.coords = tmp
+            # make xs and ys 0 to negative
+            coords = np.column_stack([basex * -1, basey * -1])
 
         else:
             raise ToytreeError("layout not recognized")
 
+        # verts are the first nnodes rows of coords
+        self.coords = coords
+        self.verts = coords[:xpos.size].copy()
+
 
 
 class Circle:
@@ -3,12 +3,15 @@
 """
 A class creating Drawings from Toytrees.
 """
-from copy import deepcopy
+from copy import copy, deepcopy
 from decimal import Decimal
+import json
 import numpy as np
 import toyplot
 
 from .Admixture import AdmixEdges
+from .NodeHover import NodeHover
+from .TextMetrics import TipLabels
 from .utils import ToytreeError
 
 
@@ -21,12 +24,16 @@ ITERABLE = (list, tuple, np.ndarray)
 
 
 class Drawing:
-    def __init__(self, ttree, **kwargs):
-        # input objects
-        self._tree = ttree.copy()
-        self.ttree = ttree
-        self.coords = ttree._coords
-        self.style = ttree.style
+    def __init__(self, ttree, style=None, **kwargs):
+        # input objects. The tree is treated as read-only and is not copied,
+        # instead a shallow view of it gets its own style (a copy of the tree 
+        # style if None) and its own coordinate buffers (see Coords.get_view)
+        self._tree = ttree
+        self.ttree = copy(ttree)
+        self.ttree.style = (deepcopy(ttree.style) if style is None else style)
+        self.ttree._coords = ttree._coords.get_view(self.ttree)
+        self.coords = self.ttree._coords
+        self.style = self.ttree.style
         self.kwargs = kwargs
         self.nedges = self.ttree._coords.edges.shape[0]
 
@@ -59,7 +66,8 @@ class Drawing:
 
         # always update coords in case style params affect the node placement.
         # this will place nodes for 'n' or 'f' trees, but 'u' trees are auto.
-        self.coords.update()
+        # Only the layout is re-applied if the tree is unchanged since update.
+        self.coords.update_layout()
 
         # set up base canvas and axes, but we need tip labels first
         self.assign_tip_labels_and_colors()
@@ -169,7 +177,7 @@ class Drawing:
                 tstyle["-toyplot-anchor-shift"] = tstyle["-toyplot-anchor-shift"][1:]
             else:
                 tstyle["-toyplot-anchor-shift"] = "-" + tstyle["-toyplot-anchor-shift"]
-            self.axes.text(
+            self.axes.add_mark(TipLabels(
                 tipcoords[:, 0][mask],
                 tipcoords[:, 1][mask],                
                 np.array(self.tip_labels)[mask],
@@ -179,7 +187,7 @@ class Drawing:
                     None if not isinstance(self.style.tip_labels_colors, np.ndarray)
                     else self.style.tip_labels_colors[mask]
                     ),
-            )
+            ))
 
             mask = np.invert(mask)
             tstyle["text-anchor"] = "start"
@@ -187,7 +195,7 @@ class Drawing:
                 tstyle["-toyplot-anchor-shift"] = tstyle["-toyplot-anchor-shift"][1:]
             else:
                 tstyle["-toyplot-anchor-shift"] = "-" + tstyle["-toyplot-anchor-shift"]
-            self.axes.text(
+            self.axes.add_mark(TipLabels(
                 tipcoords[:, 0][mask],
                 tipcoords[:, 1][mask],                
                 np.array(self.tip_labels)[mask],
@@ -197,7 +205,7 @@ class Drawing:
                     None if not isinstance(self.style.tip_labels_colors, np.ndarray)
                     else self.style.tip_labels_colors[mask]
                     ),
-            )            
+            ))
 
         # unrooted orientations
         elif self.style.layout == "x":
@@ -251,14 +259,14 @@ class Drawing:
                             "-" + tstyle["-toyplot-anchor-shift"])
 
             # add tip names to coordinates calculated above
-            self.axes.text(
+            self.axes.add_mark(TipLabels(
                 xpos, 
                 ypos,
                 self.tip_labels,
                 angle=(0 if self.style.layout in ("r", "l") else -90),
                 style=tstyle,
                 color=self.style.tip_labels_colors,
-            )
+            ))
 
         # get stroke-width for aligned tip-label lines (optional)
         # copy stroke-width from the edge_style unless user set it
@@ -626,51 +634,31 @@ class Drawing:
     def expand_edges_to_lines(self, attr):
         """
         used for 'p' edge_type to expand edge styles to connecting edges.
+        Each line takes the value of the edge it is drawn for, which is 
+        stored as an index array in coords.lines_eidx.
         """
         # set default values
         if attr == "edge_colors":
-            arr = ["#262626"] * self.coords.lines.shape[0]
+            default = "#262626"
         else:
-            arr = [2] * self.coords.lines.shape[0]
-
-        # build dict from edges
-        cdict = {
-            self.coords.edges[i, 1]: getattr(self, attr)[i]
-            for i in range(len(self.coords.edges))
-        }
-
-        # build new values from lines
-        for idx in range(len(arr)):
-            edge = self.coords.lines[idx]
-
-            # this edge goes into x
-            into = edge[1]
-
-            # colors going into x in edges is
-            val = cdict.get(into)
+            default = 2
 
-            if val:
-                # apply this val to every line into x
-                lidx = np.where(self.coords.lines[:, 1] == into)
-                arr[lidx[0][0]] = val
-
-                # and into y
-                y = edge[0]
-                lidx = np.where(self.coords.lines[:, 1] == y)
-                arr[lidx[0][0]] = val
+        # edge values with empty entries set to the default
+        vals = np.empty(self.nedges, dtype=object)
+        vals[:] = [i if i else default for i in getattr(self, attr)]
 
         # update the value list        
-        setattr(self, attr, arr)  # edge_colors = arr
+        setattr(self, attr, list(vals[self.coords.lines_eidx]))
 
     # -----------------------------------------------------------------
     # Node and Node Labels 
     # -----------------------------------------------------------------   
     def add_nodes_to_axes(self):
         """
-        Creates a new marker for every node from idx indexes and lists of 
-        node_values, node_colors, node_sizes, node_style, node_labels_style.
-        Pulls from node_color and adds to a copy of the style dict for each 
-        node to create marker.
+        Adds all nodes as a single scatterplot mark. Per-node sizes and colors
+        are passed as arrays and node_style and node_labels_style are shared 
+        by all nodes, such that styles are not copied for every node. Only 
+        the distinct (shape, label) combinations are created as markers.
 
         Node_colors has priority to overwrite node_style['fill']
         """
@@ -678,41 +666,40 @@ class Drawing:
         if all([i == "" for i in self.node_labels]):
             return
 
-        # build markers for each node.
-        marks = []
-        for nidx in self.ttree.get_node_values('idx', 1, 1):
+        # node values are stored in plot order (reversed idx) 
+        nidxs = self.ttree.get_node_values('idx', 1, 1)
 
-            # select node value from deconstructed lists
+        # one marker per distinct shape and label; "" if node is hidden.
+        markers = {}
+        marks = []
+        for nidx in nidxs:
             nlabel = self.node_labels[nidx]
             nsize = self.node_sizes[nidx]
-            nmarker = self.node_markers[nidx]
-
-            # get styledict copies
-            nstyle = deepcopy(self.style.node_style)
-            nlstyle = deepcopy(self.style.node_labels_style)
-
-            # and mod style dict copies from deconstructed lists
-            nstyle["fill"] = self.node_colors[nidx]
-
-            # create mark if text or node
             if (nlabel or nsize):
-                mark = toyplot.marker.create(
-                    shape=nmarker, 
-                    label=str(nlabel),
-                    size=nsize,
-                    mstyle=nstyle,
-                    lstyle=nlstyle,
-                )
+                key = (self.node_markers[nidx], str(nlabel))
+                if key not in markers:
+                    markers[key] = toyplot.marker.create(
+                        shape=key[0], label=key[1])
+                marks.append(markers[key])
             else:
-                mark = ""
+                marks.append("")
 
-            # store the nodes/marks
-            marks.append(mark)
+        # per-node sizes and fill colors as arrays
+        sizes = np.array([self.node_sizes[i] for i in nidxs], dtype=float)
+        colors = [
+            "none" if self.node_colors[i] is None else self.node_colors[i]
+            for i in nidxs
+        ]
 
         # node_hover == True to show all features interactive
         if self.style.node_hover is True:
             title = self.get_hover()
 
+        # 'json' shows the same but stored as one table (see NodeHover)
+        elif isinstance(self.style.node_hover, str) and (
+                self.style.node_hover == "json"):
+            title = [str(i) for i in range(self.ttree.nnodes)]
+
         elif isinstance(self.style.node_hover, list):
             # todo: return advice if improperly formatted
             title = self.style.node_hover
@@ -729,14 +716,23 @@ class Drawing:
             xcoords = self.coords.verts[:, 0]
             ycoords = self.coords.verts[:, 1]
 
-        # add nodes
-        self.axes.scatterplot(
+        # add nodes with shared styles
+        mark = self.axes.scatterplot(
             xcoords, 
             ycoords, 
             marker=marks,
+            size=sizes,
+            color=colors,
+            mstyle=self.style.node_style,
+            mlstyle=self.style.node_labels_style,
             title=title,
         )
 
+        # store the hover table once for 'json' hover
+        if isinstance(self.style.node_hover, str) and (
+                self.style.node_hover == "json"):
+            self.axes.add_mark(NodeHover(mark, self.get_hover_json()))
+
     # -----------------------------------------------------------------
     # Axes styling / scale bar / padding
     # -----------------------------------------------------------------        
@@ -860,29 +856,59 @@ class Drawing:
         return tip_xpos, tip_ypos, align_edges, align_verts
 
 
-    def get_hover(self, ordered_features=["idx", "name", "dist", "support"]):
+    def get_hover_table(self, ordered_features=("idx", "name", "dist", "support")):
+        """
+        Returns a list of feature names and a list of columns with the 
+        formatted string values of each feature for nodes ordered by idx.
+        All features are collected in a single traversal and each column is
+        formatted at once, with the same int/float formatting rules as 
+        get_node_values().
+        """
         # build full features titles
-        lfeatures = list(set(self.ttree.features) - set(ordered_features))       
-        ordered_features += lfeatures
-
-        # build list of hoverstrings in order of idxs
-        title = [" "] * self.ttree.nnodes
-        for nidx in self.ttree.get_node_values('idx', True, True):
-            feats = []
-            for feature in ordered_features:
-                val = self.ttree.get_node_values(feature, True, True)[nidx]
-                if isinstance(val, float):
-                    feats.append("{}: {:.4f}".format(feature, val))
-                else:
-                    feats.append("{}: {}".format(feature, val))
-            title[nidx] = feats
+        features = list(ordered_features)
+        features += sorted(set(self.ttree.features) - set(features))
+
+        # nodes ordered by idx
+        nodes = [None] * self.ttree.nnodes
+        for node in self.ttree.treenode.traverse():
+            nodes[node.idx] = node
+
+        # heights from one pass instead of node.height on each node
+        rootdists = self.coords.get_root_dists()
+        heights = rootdists.max() - rootdists
+
+        # collect and format a column for each feature
+        columns = []
+        for feature in features:
+            if feature == "height":
+                vals = list(heights)
+            else:
+                vals = [getattr(i, feature) if hasattr(i, feature) else ""
+                        for i in nodes]
+            columns.append(format_hover_values(vals))
+        return features, columns
+
 
-        # concatenate into strings for each sample
-        title = ["\n".join(i) for i in title]
+    def get_hover(self, ordered_features=("idx", "name", "dist", "support")):
+        "Returns a list of hover strings for nodes ordered by idx"
+        features, columns = self.get_hover_table(ordered_features)
+        return [
+            "\n".join("{}: {}".format(*j) for j in zip(features, i))
+            for i in zip(*columns)
+        ]
 
-        # order of hover can depend on the orientation...
-        title = title[::-1]
-        return title
+
+    def get_hover_json(self, ordered_features=("idx", "name", "dist", "support")):
+        """
+        Returns hover data as a compact JSON string of the feature names and
+        a lookup of feature values keyed by node idx.
+        """
+        features, columns = self.get_hover_table(ordered_features)
+        table = {
+            "features": features,
+            "nodes": {str(idx): list(i) for idx, i in enumerate(zip(*columns))},
+        }
+        return json.dumps(table, separators=(",", ":"))
 
 
     def get_dims_from_tree_size(self):
@@ -983,3 +1009,35 @@ class Drawing:
             else:
                 deg += 0
         return deg
+
+
+
+def format_hover_values(vals):
+    """
+    Returns a list of strings for a column of node values. Like in
+    ToyTree.get_node_values() floats are shown as ints if all values are 
+    integers, otherwise floats are formatted with 4 decimals.
+    """
+    # fast checks on numeric columns
+    arr = np.array(vals)
+    if arr.dtype.kind in "iub":
+        return [str(i) for i in arr]
+    if arr.dtype.kind == "f":
+        nonzero = arr[arr != 0]
+        if np.all(np.isfinite(nonzero)) and np.all(nonzero % 1 == 0):
+            return [str(i) for i in arr.astype(int)]
+        return list(np.char.mod("%.4f", arr))
+
+    # convert float to ints for prettier printing unless all floats
+    # raise exception and skip if there are true strings (names)
+    try:
+        if all([Decimal(str(i)) % 1 == 0 for i in vals if i]):
+            vals = [int(i) if isinstance(i, float) else i for i in vals]
+    except Exception:
+        pass
+
+    # formats from the array type as in get_node_values()
+    arr = np.array(vals)
+    if arr.dtype.kind == "f":
+        return list(np.char.mod("%.4f", arr))
+    return [str(i) for i in arr]
@@ -7,22 +7,124 @@ from decimal import Decimal
 import numpy as np
 import toyplot
 from .TreeStyle import TreeStyle
+from .Toytree import ToyTree
+from .CloudDensity import CloudDensity
+from .TextMetrics import TipLabels
+from .html import to_pixels
 
 
 class TreeGrid(object):
     """
     Easily create Toyplot gridded canvases for plotting multiple trees.
+    Trees are copied and styled lazily when they are first drawn, and the
+    copies (and copies scaled to unit height for shared_axis plots) are
+    kept and reused, such that a large treelist can be browsed page by 
+    page with get_page() or by iterating over the TreeGrid, which draws
+    each page only once.
+
+    Parameters:
+    -----------
+    treelist: list
+        ToyTrees to draw. These are not modified.
+    fixed_order: list or None
+        A tip order applied to each tree when it is copied.
+    nrows, ncols: int
+        Grid dimensions of each page.
+    shared_axis: bool
+        Draw the trees of each page on a single shared axis.
+    kwargs: dict
+        Toytree .draw() arguments applied to the style of every tree.
     """
-    def __init__(self, treelist):
+    def __init__(
+        self, 
+        treelist, 
+        fixed_order=None, 
+        nrows=1, 
+        ncols=1, 
+        shared_axis=False, 
+        **kwargs):
 
         # plot objects are init on update()
         self.canvas = None
         self.treelist = treelist
         self.treeslice = []
+        self.fixed_order = fixed_order
+        self.shared_axis = shared_axis
+        self.kwargs = kwargs
 
         # to be filled
-        self.nrows = None
-        self.ncols = None
+        self.nrows = nrows
+        self.ncols = ncols
+
+        # styled tree copies and their scaled copies keyed by tree index
+        self._trees = {}
+        self._scaled = {}
+
+        # (canvas, axes) of drawn pages keyed by page index
+        self._pages = {}
+
+
+    def __len__(self):
+        return self.npages
+
+
+    def __iter__(self):
+        "yields (canvas, axes) of each page, drawing them as needed"
+        for page in range(self.npages):
+            yield self.get_page(page)
+
+
+    @property
+    def npages(self):
+        "the number of pages needed to draw all trees in the grid"
+        size = self.nrows * self.ncols
+        return (len(self.treelist) + size - 1) // size
+
+
+    def get_page(self, page):
+        """
+        Returns the (canvas, axes) for a page of trees, drawn once and then
+        returned from the page cache. Pages are indexed from 0 and each
+        contains the next nrows * ncols trees.
+        """
+        if page < 0:
+            page += self.npages
+        if not 0 <= page < self.npages:
+            raise IndexError("page {} out of range".format(page))
+        if page not in self._pages:
+            self._pages[page] = self.update(
+                None, 
+                self.nrows, 
+                self.ncols, 
+                page * self.nrows * self.ncols, 
+                self.shared_axis, 
+                **self.kwargs)
+        return self._pages[page]
+
+
+    def get_tree(self, idx):
+        "Returns a styled copy of a tree from treelist, made only once"
+        if idx not in self._trees:
+            tree = self.treelist[idx].copy()
+            if self.fixed_order:
+                tree = ToyTree(tree, fixed_order=self.fixed_order)
+
+            # apply kwargs styles to the individual tree style
+            if self.kwargs.get("ts"):
+                tree.style = TreeStyle(self.kwargs.get("ts"))
+            if self.kwargs.get("tree_style"):
+                tree.style = TreeStyle(self.kwargs.get("tree_style"))
+            tree.style.update(self.kwargs)
+            self._trees[idx] = tree
+        return self._trees[idx]
+
+
+    def get_scaled_tree(self, idx):
+        "Returns a copy of get_tree(idx) scaled to unit root height, made once"
+        if idx not in self._scaled:
+            self._scaled[idx] = (
+                self.get_tree(idx).mod.node_scale_root_height(1.0))
+        return self._scaled[idx]
 
 
     def update(self, axes, nrows, ncols, start, shared_axis, **kwargs):
@@ -31,7 +133,8 @@ class TreeGrid(object):
         self.axes = axes
         self.nrows = nrows
         self.ncols = ncols
-        self.treeslice = self.treelist[start:start + self.nrows * self.ncols]
+        tidxs = range(start, min(start + nrows * ncols, len(self.treelist)))
+        self.treeslice = [self.get_tree(i) for i in tidxs]
 
         # TODO: mess with padding and margins...
         if not self.axes:
@@ -94,8 +197,8 @@ class TreeGrid(object):
 
             # USUALLY TOPOLOGY COMPARISON PLOT
             else:
-                for tidx, tree in enumerate(self.treeslice):
-                    tree = tree.mod.node_scale_root_height(1.0)
+                for tidx in tidxs:
+                    tree = self.get_scaled_tree(tidx)
                     tree.draw(axes=axes, xbaseline=xbaseline, layout='r')
 
                     if kwargs.get('xbaseline'):
@@ -117,21 +220,34 @@ class TreeGrid(object):
 
 class CloudTree:
     """
-    Overlay many tree plots on the same Canvas and Axes. All ToyTrees in the 
-    treelist have already been fixed_order reordered. 
+    Overlay many tree plots on the same Canvas and Axes. In the default
+    'overlay' mode all ToyTrees in the treelist have already been 
+    fixed_order reordered and each is drawn as a separate mark. In the
+    'density' mode the trees are not copied or drawn, instead the edge
+    coordinates of all trees are computed in one batched pass using the 
+    fixed_order tip order and drawn as a single density image.
     """
-    def __init__(self, treelist, **kwargs):
+    def __init__(self, treelist, fixed_order=None, mode="overlay", **kwargs):
 
         # store list of ordered trees
         self.treelist = treelist
+        self.mode = mode
+        if mode not in ("overlay", "density"):
+            raise ValueError("mode must be 'overlay' or 'density'")
+
+        # tip order from the fixed order trees if not entered
+        if fixed_order:
+            self.fixed_order = list(fixed_order)
+        else:
+            self.fixed_order = self.treelist[0].get_tip_labels()
 
         # set tip names 
         if not kwargs.get("tip_labels"):
-            self.tip_labels = self.treelist[0].get_tip_labels()
+            self.tip_labels = list(self.fixed_order)
         else:
             self.tip_labels = [
                 kwargs.get("tip_labels")[name] 
-                for name in self.treelist[0].get_tip_labels()
+                for name in self.fixed_order
             ]
 
         # base style
@@ -151,8 +267,11 @@ class CloudTree:
 
         # plot trees on the same axes with shared style dict
         self.axes.show = False
-        for tre in self.treelist:
-            tre.draw(axes=self.axes, tip_labels=False)
+        if self.mode == "density":
+            self.add_density_to_axes()
+        else:
+            for tre in self.treelist:
+                tre.draw(axes=self.axes, tip_labels=False)
 
         # add a single call to tip labels
         self.add_tip_labels_to_axes()
@@ -160,6 +279,131 @@ class CloudTree:
         return self.canvas, self.axes
 
 
+    def add_density_to_axes(self):
+        """
+        Adds the edges of all trees as a single CloudDensity mark. Edges are
+        drawn with one color, width and opacity for all trees.
+        """
+        segments, layers = self.get_density_segments()
+
+        # a single edge color and width
+        estyle = self.style.edge_style
+        color = estyle["stroke"]
+        if isinstance(self.style.edge_colors, str):
+            color = self.style.edge_colors
+        width = estyle["stroke-width"]
+        if isinstance(self.style.edge_widths, (int, float, str)):
+            width = self.style.edge_widths
+        opacity = estyle.get("opacity")
+
+        self.axes.add_mark(CloudDensity(
+            segments, 
+            layers, 
+            color, 
+            to_pixels(width, 2.),
+            (1. if opacity is None else float(opacity)),
+        ))
+
+
+    def get_density_segments(self):
+        """
+        Returns edge segments of all trees in data coordinates and the index
+        of the tree each belongs to. A single traversal of each tree records
+        its nodes in flat arrays, and node positions are then computed for
+        all trees at once one level of depth at a time, using the same rules
+        as Coords.assign_vertices() and reorient_coordinates().
+        """
+        # tip positions from the fixed order
+        fixed = {j: i for (i, j) in enumerate(self.fixed_order)}
+
+        # parent row, edge length, tip position, depth and tree of each node
+        parents, dists, tips, depths, trees = [], [], [], [], []
+        for tidx, tree in enumerate(self.treelist):
+            rows = {}
+            for node in tree.treenode.traverse("preorder"):
+                rows[node] = len(parents)
+                if node.up is None:
+                    parents.append(-1)
+                    depths.append(0)
+                else:
+                    parents.append(rows[node.up])
+                    depths.append(depths[rows[node.up]] + 1)
+                dists.append(node.dist)
+                tips.append(fixed[node.name] if node.is_leaf() else -1)
+                trees.append(tidx)
+        parents = np.array(parents, dtype=int)
+        dists = np.array(dists, dtype=float)
+        tips = np.array(tips, dtype=float)
+        depths = np.array(depths, dtype=int)
+        trees = np.array(trees, dtype=int)
+
+        # nodes grouped by depth
+        order = np.argsort(depths, kind="stable")
+        levels = np.split(
+            order, np.searchsorted(depths[order], np.arange(1, depths.max() + 1)))
+
+        # distance from root from the top level down
+        rootdists = np.zeros(parents.size)
+        for level in levels[1:]:
+            rootdists[level] = rootdists[parents[level]] + dists[level]
+
+        # x position as the mean of children and height in nodes from the 
+        # bottom level up.
+        internal = tips < 0
+        nchildren = np.bincount(parents[parents >= 0], minlength=parents.size)
+        xsum = np.zeros(parents.size)
+        xpos = np.where(internal, 0., tips)
+        ytop = np.zeros(parents.size)
+        for didx in range(len(levels) - 1, 0, -1):
+            level = levels[didx]
+            np.add.at(xsum, parents[level], xpos[level])
+            np.maximum.at(ytop, parents[level], ytop[level] + 1)
+            above = levels[didx - 1][internal[levels[didx - 1]]]
+            xpos[above] = xsum[above] / nchildren[above]
+
+        # height as distance from the tips aligned at the tallest tip
+        if self.style.use_edge_lengths:
+            heights = np.zeros(len(self.treelist))
+            np.maximum.at(heights, trees, rootdists)
+            ypos = heights[trees] - rootdists
+        else:
+            ypos = ytop
+
+        # straight edges from parent to child, or an up and a side line
+        child = np.flatnonzero(parents >= 0)
+        parent = parents[child]
+        if self.style.edge_type == "c":
+            segments = np.column_stack(
+                [xpos[parent], ypos[parent], xpos[child], ypos[child]])
+            layers = trees[child]
+        else:
+            segments = np.concatenate([
+                np.column_stack(
+                    [xpos[child], ypos[parent], xpos[child], ypos[child]]),
+                np.column_stack(
+                    [xpos[parent], ypos[parent], xpos[child], ypos[parent]]),
+            ])
+            layers = np.concatenate([trees[child], trees[child]])
+
+        # reorient from the down-facing base geometry
+        xcols, ycols = segments[:, [0, 2]], segments[:, [1, 3]]
+        if self.style.layout == "r":
+            xcols, ycols = -ycols, xcols
+        elif self.style.layout == "l":
+            xcols, ycols = ycols, xcols
+        elif self.style.layout == "u":
+            xcols, ycols = -xcols, -ycols
+        elif self.style.layout != "d":
+            raise NotImplementedError(
+                "multitree layout {} not yet supported"
+                .format(self.style.layout))
+        xcols = xcols + (self.style.xbaseline or 0)
+        ycols = ycols + (self.style.ybaseline or 0)
+        segments = np.column_stack(
+            [xcols[:, 0], ycols[:, 0], xcols[:, 1], ycols[:, 1]])
+        return segments, layers
+
+
     def get_canvas_and_axes(self, axes):
         if axes: 
             self.canvas = None
@@ -220,14 +464,14 @@ class CloudTree:
             self.style.tip_labels_style["-toyplot-anchor-shift"] = "15px"
 
         # add tip names to coordinates calculated above
-        self.axes.text(
+        self.axes.add_mark(TipLabels(
             xpos, 
             ypos,
             self.tip_labels,
             angle=(0 if self.style.layout in ("r", "l") else -90),
             style=self.style.tip_labels_style,
             color=self.style.tip_labels_colors,
-        )
+        ))
         # get stroke-width for aligned tip-label lines (optional)
         # copy stroke-width from the edge_style unless user set it
         if not self.style.edge_align_style.get("stroke-width"):
@@ -252,7 +496,7 @@ class CloudTree:
         ratio = max(lname / 10, 0.15)
 
         # have tree figure make up 85% of plot
-        if self.treelist[0].style.use_edge_lengths:
+        if self.style.use_edge_lengths:
             addon = self.treelist[0].treenode.height
         else:
             addon = self.treelist[0].treenode.get_farthest_leaf(True)[1] + 1
@@ -5,12 +5,21 @@
 from __future__ import print_function, absolute_import
 from builtins import range, str
 
-from copy import deepcopy
+import os
+import re
+import time
+import shutil
+import warnings
+import xml.etree.ElementTree as xml
+from copy import copy, deepcopy
 from hashlib import md5
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 
 import toyplot
 import toyplot.config
+import toyplot.html
+import toyplot.svg
 import numpy as np
 
 # used in Consensus
@@ -18,8 +27,12 @@ from .TreeNode import TreeNode
 from .Toytree import ToyTree
 from .TreeParser import TreeParser
 from .TreeStyle import TreeStyle, STYLES
+from .Drawing import Drawing
 from .MultiDrawing import TreeGrid, CloudTree
-from .utils import bpp2newick
+from .CladeCounter import CladeCounter
+from .SupportMapper import SupportMapper
+from .Quartets import Quartets
+from .utils import bpp2newick, ToytreeError
 
 
 
@@ -147,6 +160,25 @@ class MultiTree(object):
             tre.style = TreeStyle('n')
 
 
+    def root_midpoint(self, edge_features=["support"]):
+        """
+        Returns a new MultiTree with each tree rooted at the midpoint of its
+        longest tip-to-tip path. See ToyTree.root_midpoint().
+        """
+        return MultiTree([
+            tre.root_midpoint(edge_features) for tre in self.treelist])
+
+
+    def root_min_var(self, edge_features=["support"]):
+        """
+        Returns a new MultiTree with each tree rooted at the position that
+        minimizes the variance of root-to-tip distances. See
+        ToyTree.root_min_var().
+        """
+        return MultiTree([
+            tre.root_min_var(edge_features) for tre in self.treelist])
+
+
     # -------------------------------------------------------------------
     # Tree List Statistics or Calculations
     # -------------------------------------------------------------------
@@ -167,7 +199,184 @@ class MultiTree(object):
     #     return self.treelist[0].get_tip_labels()
 
 
-    def get_consensus_tree(self, cutoff=0.0, best_tree=None):
+    def unique_topologies(self, unrooted=False):
+        """
+        Returns a list of (tree, count, idxs) for each unique topology in
+        the treelist, where tree is the first tree with the topology, count
+        is the number of trees with it, and idxs are their indices in the
+        treelist, sorted by decreasing count. Topologies are compared by
+        TreeNode.get_topology_hash(), which does not depend on the order 
+        of children. 
+
+        Parameters:
+        -----------
+        unrooted: bool
+            If True trees that differ only in their rooting are the same.
+        """
+        groups = {}
+        for idx, tree in enumerate(self.treelist):
+            hashed = tree.treenode.get_topology_hash(unrooted=unrooted)
+            groups.setdefault(hashed, []).append(idx)
+        groups = sorted(groups.values(), key=lambda x: (-len(x), x[0]))
+        return [(self.treelist[i[0]], len(i), i) for i in groups]
+
+
+    def rf_matrix(self, normalize=False, unrooted=False, workers=None):
+        """
+        Returns a condensed distance matrix (as in scipy.spatial.distance,
+        i.e., the upper triangle of the T x T matrix in row order) of the
+        Robinson-Foulds distance between each pair of trees, the same as 
+        returned by TreeNode.robinson_foulds() with default options. The 
+        clades (or unrooted splits) of each tree are hashed once (see 
+        TreeNode.get_split_hashes), and the number of splits shared by each
+        pair of trees is computed from matrix products of a tree x split 
+        table, filled in blocks of rows and columns from an index of the
+        trees with each split, in parallel if workers > 1. Splits that
+        are in all trees or in only one tree are not in the table since 
+        they add the same count to every pair, or to no pair.
+
+        Parameters:
+        -----------
+        normalize: bool
+            If True distances are divided by the max possible distance of
+            each pair, i.e., the number of splits in both trees.
+        unrooted: bool
+            If True trees are compared as unrooted. Otherwise all trees
+            must be rooted.
+        workers: int or None
+            Number of worker processes. If None or 1 blocks are computed
+            in this process.
+        """
+        ntrees = len(self.treelist)
+        if not self.all_tips_shared:
+            raise ToytreeError("All trees in treelist must share the same tips.")
+        if not unrooted and any(
+                len(i.treenode.children) > 2 for i in self.treelist):
+            raise ToytreeError(
+                "Unrooted tree found! Use unrooted=True to compare unrooted "
+                "trees.")
+
+        # hashed splits of each tree and the number of trees with each
+        splits = [
+            i.treenode.get_split_hashes(unrooted=unrooted)
+            for i in self.treelist]
+        counts = defaultdict(int)
+        for tsplits in splits:
+            for key in tsplits:
+                counts[key] += 1
+
+        # columns for splits in more than one but not all trees
+        columns = {}
+        for key, count in counts.items():
+            if 1 < count < ntrees:
+                columns[key] = len(columns)
+        nshared = sum(1 for i in counts.values() if i == ntrees)
+
+        # index of the trees with each split, i.e., the sparse columns of
+        # a table of trees x splits, which is only filled in blocks.
+        tidxs = []
+        cidxs = []
+        for tidx, tsplits in enumerate(splits):
+            cols = [columns[i] for i in tsplits if i in columns]
+            tidxs.extend([tidx] * len(cols))
+            cidxs.extend(cols)
+        order = np.argsort(cidxs, kind="stable")
+        tidxs = np.array(tidxs, dtype=np.int32)[order]
+        indptr = np.zeros(len(columns) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(cidxs, minlength=len(columns)))
+        index = (tidxs, indptr, ntrees)
+        sizes = np.array([len(i) for i in splits], dtype=np.int64)
+
+        # row blocks of shared counts, each with rows under RF_BLOCK values
+        nrows = max(1, RF_BLOCK // max(ntrees, 1))
+        starts = list(range(0, max(ntrees - 1, 0), nrows))
+        if workers and workers > 1 and len(starts) > 1:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_rf_worker,
+                initargs=(index,),
+            ) as pool:
+                blocks = pool.map(
+                    _worker_rf_block, starts, [nrows] * len(starts))
+                shared = list(blocks)
+        else:
+            shared = [_rf_block(index, i, nrows) for i in starts]
+
+        # fill the upper triangle row by row from the blocks
+        dists = np.zeros(
+            ntrees * (ntrees - 1) // 2, 
+            dtype=(np.float64 if normalize else np.int64))
+        pos = 0
+        for start, block in zip(starts, shared):
+            for ridx in range(block.shape[0]):
+                tidx = start + ridx
+                if tidx >= ntrees - 1:
+                    break
+                both = sizes[tidx] + sizes[tidx + 1:]
+                rfs = both - 2 * (block[ridx, ridx + 1:] + nshared)
+                if normalize:
+                    # (trees with a single tip have no max distance)
+                    maxs = (both if unrooted else both - 2)
+                    rfs = np.divide(
+                        rfs, maxs, out=np.zeros(rfs.size), where=maxs > 0)
+                dists[pos:pos + rfs.size] = rfs
+                pos += rfs.size
+        return dists
+
+
+    def quartet_distances(self, reference, normalize=False, workers=None):
+        """
+        Returns an array with the quartet distance between a reference tree
+        and each tree in the treelist (see ToyTree.quartet_distance). The
+        reference is prepared once, and trees are compared in parallel if 
+        workers > 1. All trees must be bifurcating and have the same tips.
+
+        Parameters:
+        -----------
+        reference: ToyTree or newick str
+            The tree that each tree is compared to.
+        normalize: bool
+            If True distances are divided by the number of quartets.
+        workers: int or None
+            Number of worker processes. If None or 1 trees are compared
+            in this process.
+        """
+        if not isinstance(reference, ToyTree):
+            reference = ToyTree(reference)
+        return Quartets(reference).get_distances(
+            (i.treenode for i in self.treelist), normalize, workers)
+
+
+    def get_concordance_factors(self, species_tree, workers=None):
+        """
+        Returns a copy of an unrooted species tree with concordance factors
+        of each internal edge among the trees in the treelist (e.g., gene
+        trees) as node features: 'gcf' is the % of trees that contain the
+        split of the edge, and 'qcf' is the % of the quartets around the 
+        edge (with one tip from each of its four sides) that are resolved
+        in trees and agree with it, while 'qdf1' and 'qdf2' are the % that
+        have either of the two other topologies. Quartets are counted 
+        without enumerating them (see Quartets). The species tree must be
+        bifurcating, while trees may have polytomies, in which unresolved
+        quartets are not counted.
+
+        Parameters:
+        -----------
+        species_tree: ToyTree or newick str
+            A tree with the same tips as the trees in the treelist.
+        workers: int or None
+            Number of worker processes. If None or 1 trees are counted
+            in this process.
+        """
+        if not isinstance(species_tree, ToyTree):
+            species_tree = ToyTree(species_tree)
+        quartets = Quartets(species_tree)
+        quartets.run((i.treenode for i in self.treelist), workers)
+        return quartets.get_tree()
+
+
+    def get_consensus_tree(
+        self, cutoff=0.0, best_tree=None, edge_lengths=False, tbe=False):
         """
         Returns an extended majority rule consensus tree as a Toytree object.
         Node labels include 'support' values showing the occurrence of clades 
@@ -186,11 +395,22 @@ class MultiTree(object):
             A tree that support values should be calculated for and added to. 
             For example, you want to calculate how often clades in your best 
             ML tree are supported in 100 bootstrap trees. 
+        edge_lengths (bool; default=False):
+            If True the edge length of each clade in the consensus tree is
+            its mean edge length among the trees that contain it. Otherwise
+            edge lengths are equal to support values.
+        tbe (bool; default=False):
+            If True and a best_tree is entered then nodes also have 'tbe'
+            values (%), the transfer bootstrap expectation of each clade,
+            which is higher than support for clades that are nearly but
+            not exactly present in other trees. See SupportMapper.
         """
         if best_tree is not None:
             if not isinstance(best_tree, ToyTree):
                 best_tree = ToyTree(best_tree)
-        cons = ConsensusTree(self.treelist, best_tree=best_tree, cutoff=cutoff)
+        cons = ConsensusTree(
+            self.treelist, best_tree=best_tree, cutoff=cutoff, 
+            edge_lengths=edge_lengths, tbe=tbe)
         cons.update()
         return cons.ttree
 
@@ -225,26 +445,69 @@ class MultiTree(object):
             print("Treelist is empty")
             return None, None
 
-        # make a copy of the treelist so we don't modify the original
-        if not fixed_order:
-            treelist = self.copy().treelist
-        else:
-            if fixed_order is True:
-                fixed_order = self.treelist[0].get_tip_labels()
-            treelist = [
-                ToyTree(i, fixed_order=fixed_order) 
-                for i in self.copy().treelist
-            ]
-
-        # apply kwargs styles to the individual tree styles
-        for tree in treelist:
-            if kwargs.get("ts"):
-                tree.style = TreeStyle(kwargs.get("ts"))
-            if kwargs.get("tree_style"):
-                tree.style = TreeStyle(kwargs.get("tree_style"))
-            tree.style.update(kwargs)
+        # tip order applied to the trees as they are copied
+        if fixed_order is True:
+            fixed_order = self.treelist[0].get_tip_labels()
 
         # get reasonable values for x,y given treelist length
+        nrows, ncols = self._get_grid_dims(nrows, ncols)
+
+        # Return TereGrid object for debugging. Trees are copied and styled 
+        # by the TreeGrid only when they are drawn.
+        draw = TreeGrid(
+            self.treelist, fixed_order, nrows, ncols, shared_axis, **kwargs)
+        if kwargs.get("debug"):
+            return draw
+
+        # Call update to draw plot. Kwargs still here for width, height, axes
+        canvas, axes = draw.update(
+            axes, nrows, ncols, start, shared_axis, **kwargs)
+        return canvas, axes
+
+
+    def get_tree_grid(
+        self, 
+        nrows=None, 
+        ncols=None, 
+        fixed_order=False, 
+        shared_axis=False, 
+        **kwargs):
+        """
+        Returns a TreeGrid for browsing the trees in .treelist page by page,
+        where each page is a grid of nrows x ncols trees. Pages are drawn 
+        lazily and cached, and each tree is copied and styled only once, 
+        such that large treelists can be drawn one page at a time.
+
+        Parameters:
+        -----------
+        nrows, ncols (int):
+            Grid dimensions of each page. Default=automatically set.
+        fixed_order (bool, list):
+            A tip order to apply to every tree, or True to use the order
+            of the first tree.
+        shared_axis (bool):
+            Draw the trees of each page on a single shared axis.
+        kwargs (dict):
+            Toytree .draw() arguments as a dictionary. 
+
+        Example:
+        --------
+        grid = mtre.get_tree_grid(nrows=2, ncols=5)
+        canvas, axes = grid.get_page(0)
+        for canvas, axes in grid:
+            ...
+        """
+        if not self.treelist:
+            raise ToytreeError("Treelist is empty")
+        if fixed_order is True:
+            fixed_order = self.treelist[0].get_tip_labels()
+        nrows, ncols = self._get_grid_dims(nrows, ncols)
+        return TreeGrid(
+            self.treelist, fixed_order, nrows, ncols, shared_axis, **kwargs)
+
+
+    def _get_grid_dims(self, nrows, ncols):
+        "Returns (nrows, ncols) with reasonable values filled for None"
         if not (ncols or nrows):
             nrows = 1
             if self.ntrees < 6:
@@ -277,18 +540,8 @@ class MultiTree(object):
                         ncols = 5
                     else:
                         ncols = 3
-        else:
-            pass
+        return nrows, ncols
 
-        # Return TereGrid object for debugging
-        draw = TreeGrid(treelist)
-        if kwargs.get("debug"):
-            return draw
-
-        # Call update to draw plot. Kwargs still here for width, height, axes
-        canvas, axes = draw.update(
-            axes, nrows, ncols, start, shared_axis, **kwargs)
-        return canvas, axes
 
 
 
@@ -297,6 +550,7 @@ class MultiTree(object):
         axes=None, 
         html=False,
         fixed_order=True,
+        mode="overlay",
         **kwargs):
         """
         Draw a series of trees overlapping each other in coordinate space.
@@ -308,6 +562,11 @@ class MultiTree(object):
         Parameters:
             axes (toyplot.Cartesian): toyplot Cartesian axes object.
             html (bool): whether to return the drawing as html (default=PNG).
+            mode (str): 'overlay' draws each tree as a separate mark. 
+                'density' computes the edges of all trees in one pass and 
+                draws them as a single image in which overlapping edges 
+                accumulate opacity. This is much faster for large numbers 
+                of trees, but edges are drawn with a single color and width.
             **kwargs (dict): styling options should be input as a dictionary.
         """
         # return nothing if tree is empty
@@ -333,9 +592,15 @@ class MultiTree(object):
         else:
             raise Exception(
                 "fixed_order argument must be True or a list with the tip order")
-        treelist = [
-            ToyTree(i, fixed_order=fixed_order) for i in self.copy().treelist
-        ]  
+
+        # density mode reads the trees without copying them
+        if mode == "density":
+            treelist = self.treelist
+        else:
+            treelist = [
+                ToyTree(i, fixed_order=fixed_order) 
+                for i in self.copy().treelist
+            ]  
 
         # give advice if user tries to enter tip_labels
         if kwargs.get("tip_labels"):
@@ -358,11 +623,12 @@ class MultiTree(object):
                 {i: j for (i, j) in kwargs.items() if 
                 (j is not None) & (i != "tip_labels")}
             )
-            for tree in treelist:
-                tree.style.update(mstyle)
+            if mode != "density":
+                for tree in treelist:
+                    tree.style.update(mstyle)
 
             # Send a copy of MultiTree to init Drawing object.
-            draw = CloudTree(treelist, **kwargs)
+            draw = CloudTree(treelist, fixed_order, mode, **kwargs)
 
             # and create drawing
             if kwargs.get("debug"):
@@ -377,6 +643,105 @@ class MultiTree(object):
                 toyplot.config.autoformat = "html"
 
 
+    def render_all(
+        self, 
+        outdir, 
+        fmt="svg", 
+        workers=None, 
+        prefix="tree-", 
+        tree_style=None, 
+        verbose=False,
+        **kwargs):
+        """
+        Draws every tree in .treelist with the same style and writes each 
+        to a file named {prefix}{index}.{fmt} in outdir. The style is built
+        once from tree_style and kwargs, the same as in ToyTree.draw() for
+        a tree with the default style, and sent once to each worker process.
+        Toyplot gives elements random ids, these are replaced by ids that 
+        depend only on the filename, such that the files are identical for 
+        any number of workers. Returns a list of the file paths.
+
+        Parameters:
+        -----------
+        outdir: str
+            Directory to write files to. It is created if it does not exist.
+        fmt: str
+            Output format, one of "svg", "html" or "png". PNG export uses 
+            toyplot.png, which requires ghostscript. Without it a warning 
+            is raised and PNGs are drawn by the raster renderer 
+            (toytree.raster), which does not draw text.
+        workers: int or None
+            Number of processes to draw and write trees in parallel. If None 
+            or 1 trees are drawn serially in this process.
+        prefix: str
+            Prefix of the filenames.
+        tree_style: str
+            A preset tree style applied before kwargs (see ToyTree.draw).
+        verbose: bool
+            If True print the number of files written and the throughput.
+        kwargs: dict
+            ToyTree.draw() styling arguments applied to every tree.
+        """
+        # check the format before drawing anything
+        if fmt not in ("svg", "html", "png"):
+            raise ToytreeError(
+                "fmt must be one of 'svg', 'html' or 'png': {}".format(fmt))
+
+        # build the style once, the same as draw() does for each tree
+        if kwargs.get("ts"):
+            tree_style = kwargs.pop("ts")
+        style = TreeStyle("n")
+        if tree_style:
+            style.update(TreeStyle(tree_style[0]))
+        unrecognized = [i for i in kwargs if i not in style.to_dict()]
+        if unrecognized:
+            raise ToytreeError(
+                "unrecognized style arguments: {}".format(unrecognized))
+        style.update({i: j for (i, j) in kwargs.items() if j is not None})
+
+        # toyplot.png requires ghostscript, without it PNGs are drawn by 
+        # the raster renderer, which does not draw text.
+        renderer = fmt
+        if fmt == "png" and not _has_ghostscript():
+            warnings.warn(
+                "ghostscript was not found, PNGs are drawn with the raster "
+                "renderer (toytree.raster), which does not draw tip labels, "
+                "node labels or other text.")
+            renderer = "raster"
+
+        # one filename per tree
+        if not os.path.exists(outdir):
+            os.makedirs(outdir)
+        ndigits = len(str(max(self.ntrees - 1, 0)))
+        paths = [
+            os.path.join(
+                outdir, "{}{}.{}".format(prefix, str(idx).zfill(ndigits), fmt))
+            for idx in range(self.ntrees)
+        ]
+
+        # draw and write trees, optionally in parallel
+        start = time.time()
+        if workers and workers > 1 and self.ntrees > 1:
+            chunksize = max(1, self.ntrees // (workers * 4))
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_render_worker,
+                initargs=(style, renderer),
+            ) as pool:
+                list(pool.map(
+                    _worker_render, self.treelist, paths, chunksize=chunksize))
+        else:
+            for tree, path in zip(self.treelist, paths):
+                _render_tree(tree, path, style, renderer)
+
+        # report throughput
+        if verbose:
+            elapsed = time.time() - start
+            print("wrote {} {} files in {:.1f}s ({:.1f} trees/s)".format(
+                self.ntrees, fmt, elapsed, self.ntrees / max(elapsed, 1e-9)))
+        return paths
+
+
     # # allow ts as a shorthand for tree_style
     # if kwargs.get("ts"):
     #     tree_style = kwargs.get("ts")
@@ -393,25 +758,53 @@ class ConsensusTree:
     Modelled on the similar function from scikit-bio tree module. If
     cutoff=0.5 then it is a normal majority rule consensus, while if
     cutoff=0.0 then subsequent non-conflicting clades are added to the tree.
+    Trees can also be added one at a time with add() or add_many(), which
+    update the clade counts, and update() can be called again at any time
+    to infer the consensus of all trees added so far. It reuses the clades
+    that were kept or rejected in the last update for the leading clades 
+    whose order by frequency has not changed.
     """
-    def __init__(self, treelist, best_tree=None, cutoff=0.0):
+    def __init__(
+        self, 
+        treelist=None, 
+        best_tree=None, 
+        cutoff=0.0, 
+        edge_lengths=False, 
+        counter=None,
+        tbe=False):
 
         # parse args
-        self.treelist = treelist
+        self.treelist = (treelist if treelist is not None else [])
+        self.edge_lengths = edge_lengths
         self.best_tree = best_tree
+        self.counter = counter
+        self.mapper = None
+        self.tbe = tbe
         if self.best_tree is not None:
-            self.best_tree = best_tree.copy().unroot()
+            if self.counter is not None:
+                raise ToytreeError(
+                    "best_tree cannot be used with precomputed clade counts.")
+            self.best_tree = best_tree.unroot()
             self.names = self.best_tree.get_tip_labels()
-        else:
+        elif self.counter is not None:
+            self.names = self.counter.names
+        elif self.treelist:
             self.names = self.treelist[0].get_tip_labels()
+        else:
+            self.names = None
         self.cutoff = float(cutoff)
 
         # attrs to fill
         self.namedict = None
         self.treedict = {}
         self.clade_counts = None
+        self.clade_dists = None
         self.fclade_counts = None
 
+        # ordered candidate clades and whether each was kept in the last
+        # call to filter_clades, reused while their order is unchanged.
+        self._filtered = ([], [])
+
         # results 
         self.ttree = None
         self.nodelist = None
@@ -420,8 +813,9 @@ class ConsensusTree:
 
     def update(self):
 
-        # hash a dict to remove duplicate trees
-        self.hash_trees()
+        # hash a dict to remove duplicate trees, unless already counted
+        if self.counter is None and self.mapper is None:
+            self.hash_trees()
 
         # map onto best_tree of infer majrule consensus
         if self.best_tree is not None:
@@ -442,12 +836,71 @@ class ConsensusTree:
             ## todo. make sure no singleton nodes were left behind ...
 
 
+    def add(self, tree):
+        """
+        Counts the clades of one more tree in O(n). Call update() to infer
+        the consensus tree of all trees added so far.
+
+        Parameters:
+        -----------
+        tree: ToyTree, TreeNode, or str
+            A tree, or a newick string, with the same tips as other trees.
+        """
+        # names in the order of the first tree if none were set
+        if self.names is None:
+            if not isinstance(tree, ToyTree):
+                tree = ToyTree(tree)
+            self.names = tree.get_tip_labels()
+
+        # count the trees in the treelist before any added trees
+        if self.best_tree is not None:
+            if self.mapper is None:
+                self.hash_trees()
+                self.map_onto_best_tree()
+            counter = self.mapper
+        else:
+            if self.counter is None:
+                self.hash_trees()
+                self.find_clades()
+            counter = self.counter
+
+        # count the new tree from its TreeNode
+        if isinstance(tree, ToyTree):
+            counter.add(tree.treenode)
+        elif isinstance(tree, TreeNode):
+            counter.add(tree)
+        else:
+            counter.add_newick(tree)
+        return self
+
+
+    def add_many(self, trees):
+        """
+        Counts the clades of each tree in an iterable of ToyTrees, TreeNodes,
+        or newick strings. Call update() to infer the consensus tree.
+
+        Parameters:
+        -----------
+        trees: iterable
+            Trees with the same tips as other trees.
+        """
+        for tree in trees:
+            self.add(tree)
+        return self
+
+
     def hash_trees(self):
-        "hash ladderized tree topologies"       
+        """
+        Count each unique unrooted topology once with its number of copies
+        using TreeNode.get_topology_hash(). If edge_lengths then every tree
+        is counted, since trees with the same topology differ in lengths.
+        """
+        if self.edge_lengths:
+            self.treedict = {idx: 1 for idx in range(len(self.treelist))}
+            return
         observed = {}
         for idx, tree in enumerate(self.treelist):
-            nwk = tree.write(tree_format=9)
-            hashed = md5(nwk.encode("utf-8")).hexdigest()
+            hashed = tree.treenode.get_topology_hash(unrooted=True)
             if hashed not in observed:
                 observed[hashed] = idx
                 self.treedict[idx] = 1
@@ -457,189 +910,308 @@ class ConsensusTree:
 
 
     def map_onto_best_tree(self):
-        "map clades from tree onto best_tree"
-
-        # index names from the first tree
-        ndict = {j: i for i, j in enumerate(self.names)}
-
-        # dictionary of bits describing all clades in the best tree
-        idict = {}
-        bitdict = {}
-        for node in self.best_tree.treenode.traverse("preorder"):
-
-            # get byte string representing split
-            bits = np.zeros(self.best_tree.ntips, dtype=np.bool_)
-            for child in node.iter_leaf_names():
-                bits[ndict[child]] = True
-            bitstring = bits.tobytes()
-
-            # record split (mirror image not relevant)
-            bitdict[bitstring] = 0
-            idict[bitstring] = node
-        # print(bitdict)
-
-        # count occurrence of clades in best_tree among other trees
-        for tidx, ncopies in self.treedict.items():
-            tre = self.treelist[tidx].unroot()
-            # print(tidx)
-            for node in tre.treenode.traverse("preorder"):
-                bits = np.zeros(tre.ntips, dtype=np.bool_)
-                for child in node.iter_leaf_names():
-                    bits[ndict[child]] = True
-                bitstring = bits.tobytes()
-                # print(bits.astype(int))
-                if bitstring in bitdict:
-                    bitdict[bitstring] += ncopies
-                else:
-                    revstring = np.invert(bits).tobytes()
-                    if revstring in bitdict:
-                        bitdict[revstring] += ncopies
-            # print("")
-
-        # convert to frequencies
-        for key, val in bitdict.items():
-            # print(key, val, idict[key].name)
-            idict[key].support = int(100 * val / float(len(self.treelist)))
-        self.ttree = self.best_tree
-        self.ttree._coords.update()
+        """
+        Map clades from trees onto best_tree with a SupportMapper, unless
+        trees were already mapped, counting each unique tree once with its
+        number of copies. See SupportMapper.
+        """
+        if self.mapper is None:
+            self.mapper = SupportMapper(self.best_tree, tbe=self.tbe)
+            for tidx, ncopies in self.treedict.items():
+                self.mapper.add(self.treelist[tidx].treenode, ncopies)
+        self.ttree = self.mapper.get_tree()
 
 
     def find_clades(self):
-        "Count clade occurrences."
-        # index names from the first tree
-        ndict = {j: i for i, j in enumerate(self.names)}
-        namedict = {i: j for i, j in enumerate(self.names)}
-
-        # store counts
-        clade_counts = {}
-        for tidx, ncopies in self.treedict.items():
-
-            # testing on unrooted trees is easiest but for some reason slow
-            ttree = self.treelist[tidx].unroot()
-
-            # traverse over tree
-            for node in ttree.treenode.traverse('preorder'):
-                bits = np.zeros(len(ttree), dtype=np.bool_)
-                for child in node.iter_leaf_names():
-                    bits[ndict[child]] = True
-
-                # get bit string and its reverse
-                bitstring = bits.tobytes()
-                revstring = np.invert(bits).tobytes()
-
-                # add to clades first time, then check for inverse next hits
-                if bitstring in clade_counts:
-                    clade_counts[bitstring] += ncopies
-                else:
-                    if revstring not in clade_counts:
-                        clade_counts[bitstring] = ncopies
-                    else:
-                        clade_counts[revstring] += ncopies
-
-        # convert to freq
-        for key, val in clade_counts.items():
-            clade_counts[key] = val / float(len(self.treelist))
+        """
+        Count clade occurrences with a CladeCounter, unless counts were
+        given, counting each unique tree once with its number of copies.
+        Clades are bitsets stored as python ints (bit i is set for tip 
+        self.names[i]) oriented to the side of each split that excludes 
+        the first tip. The tips and the root (all tips) are kept as clades
+        to build the tree from.
+        """
+        if self.counter is None:
+            self.counter = CladeCounter(self.names)
+            for tidx, ncopies in self.treedict.items():
+                self.counter.add(self.treelist[tidx].treenode, ncopies)
 
-        ## return in sorted order
-        self.namedict = namedict
-        self.clade_counts = sorted(
-            clade_counts.items(),
-            key=lambda x: x[1],
-            reverse=True)
+        ## return in sorted order with mean edge lengths
+        self.namedict = {i: j for i, j in enumerate(self.names)}
+        self.clade_counts, self.clade_dists = self.counter.get_clade_freqs()
 
 
     def filter_clades(self):
-        "Remove conflicting clades and those < cutoff to get majority rule"
-        passed = []
-        carrs = np.array([list(i[0]) for i in self.clade_counts], dtype=int)
-        freqs = np.array([i[1] for i in self.clade_counts])
+        """
+        Remove conflicting clades and those < cutoff to get majority rule.
+        Clades are visited in order of decreasing frequency and kept if they
+        are compatible with (nested in, containing, or disjoint from) every 
+        clade kept so far. Kept clades are stored as a tree in which the 
+        parent of each clade is the smallest kept clade containing it, so 
+        a candidate is compared only with kept clades on the paths from its
+        tips up to the smallest kept clade containing it, in order of 
+        increasing size, using bitset intersections. Once n-3 non-trivial
+        splits are kept the tree is fully resolved and no others can pass.
+        """
+        ntips = len(self.names)
+        full = (1 << ntips) - 1
+
+        # candidate clades above the cutoff in order of decreasing freq
+        cands = []
+        for mask, freq in self.clade_counts:
+            if freq < self.cutoff:
+                break
+            cands.append(mask)
+
+        # whether a clade is kept depends only on the clades before it, so
+        # the result of the last call is reused for the leading clades 
+        # that are in the same order.
+        prev, pkept = self._filtered
+        start = 0
+        for old, new in zip(prev, cands):
+            if old != new:
+                break
+            start += 1
+        kept = pkept[:start]
+
+        # kept clades, starting from the tips (0..n-1) and the root (n)
+        masks = [1 << i for i in range(ntips)] + [full]
+        parent = [ntips] * ntips + [None]
+        nsplits = 0
+
+        # insert the reused splits, which are known to be compatible
+        for mask, keep in zip(cands, kept):
+            if keep and mask != full and mask & (mask - 1):
+                _insert_clade(mask, masks, parent)
+                nsplits += 1
+
+        for mask in cands[start:]:
+
+            # tips and root never conflict
+            if mask == full or not mask & (mask - 1):
+                kept.append(True)
+
+            # a fully resolved set of splits cannot accept more
+            elif nsplits == ntips - 3:
+                kept.append(False)
 
-        for idx in range(carrs.shape[0]):
-            conflict = False
-            if freqs[idx] < self.cutoff:
-                continue
+            else:
+                keep = _insert_clade(mask, masks, parent)
+                nsplits += keep
+                kept.append(keep)
 
-            for pidx in passed:
-                intersect = np.max(carrs[idx] + carrs[pidx]) > 1
+        self._filtered = (cands, kept)
+        self.fclade_counts = [
+            i for (i, keep) in zip(self.clade_counts, kept) if keep]
 
-                # is either one a subset of the other?
-                subset_test0 = np.all(carrs[idx] - carrs[pidx] >= 0)
-                subset_test1 = np.all(carrs[pidx] - carrs[idx] >= 0)
-                if intersect:
-                    if (not subset_test0) and (not subset_test1):
-                        conflict = True
 
-            if not conflict:
-                passed.append(idx)
+    def build_trees(self):
+        """
+        Build an unrooted consensus tree from filtered clade counts. Clades
+        are visited once in order of increasing size, and each becomes the
+        parent of the largest clades built so far that are inside it. These
+        are found from its tips with union-find, where every built clade
+        points to its parent, such that the tree is built in near linear 
+        time as a TreeNode graph, without writing and parsing a newick.
+        Internal nodes have support (%) and edge lengths either equal to 
+        support, or to the mean edge length of the clade if edge_lengths.
+        """
+        ntips = len(self.names)
+
+        # nodes for tips, their edges have length 100 unless edge_lengths
+        nodes = []
+        for idx in range(ntips):
+            node = TreeNode(name=self.namedict[idx])
+            node.dist = (
+                self.clade_dists.get(1 << idx, 0.) if self.edge_lengths 
+                else 100.)
+            nodes.append(node)
+        masks = [1 << i for i in range(ntips)]
+        up = list(range(ntips))
+
+        # visit non-tip clades by increasing size, ending at the root
+        clades = sorted(
+            (i for i in self.fclade_counts if i[0] & (i[0] - 1)),
+            key=lambda x: bin(x[0]).count("1"))
+        for clade, freq in clades:
+
+            # the largest built clades within this clade become children
+            nidx = len(nodes)
+            node = TreeNode()
+            nodes.append(node)
+            masks.append(clade)
+            up.append(nidx)
+            remaining = clade
+            while remaining:
+                cidx = _find(up, _lowest_bit(remaining))
+                node.add_child(nodes[cidx])
+                remaining &= ~masks[cidx]
+                up[cidx] = nidx
+
+            # the root keeps the default support and edge length
+            if clade != (1 << ntips) - 1:
+                node.support = float(int(round(100 * freq)))
+                node.dist = (
+                    self.clade_dists[clade] if self.edge_lengths 
+                    else node.support)
+        tre = nodes[-1]
 
-        rclades = []
-        for idx in passed:
-            rclades.append((carrs[idx], freqs[idx]))
-        self.fclade_counts = rclades
+        ## return the tree and other trees if present
+        self.ttree = ToyTree(tre)
+        self.nodelist = [tre]
 
 
-    def build_trees(self):
-        "Build an unrooted consensus tree from filtered clade counts."
-
-        # storage
-        nodes = {}
-        idxarr = np.arange(len(self.fclade_counts[0][0]))
-        queue = []
-
-        # create dict of clade counts and set keys
-        countdict = defaultdict(int)
-        for clade, count in self.fclade_counts:
-            mask = np.int_(list(clade)).astype(np.bool)
-            ccx = idxarr[mask]
-            queue.append((len(ccx), frozenset(ccx)))
-            countdict[frozenset(ccx)] = count
-
-        while queue:
-            queue.sort()
-            (clade_size, clade) = queue.pop(0)
-            new_queue = []
-
-            # search for ancestors of clade
-            for (_, ancestor) in queue:
-                if clade.issubset(ancestor):
-                    # update ancestor such that, in the following example:
-                    # ancestor == {1, 2, 3, 4}
-                    # clade == {2, 3}
-                    # new_ancestor == {1, {2, 3}, 4}
-                    new_ancestor = (ancestor - clade) | frozenset([clade])
-                    countdict[new_ancestor] = countdict.pop(ancestor)
-                    ancestor = new_ancestor
-
-                new_queue.append((len(ancestor), ancestor))
-
-            # if the clade is a tip, then we have a name
-            if clade_size == 1:
-                name = list(clade)[0]
-                name = self.namedict[name]
-            else:
-                name = None
-
-            # the clade will not be in nodes if it is a tip
-            children = [nodes.pop(c) for c in clade if c in nodes]
-            node = TreeNode(name=name)
-            for child in children:
-                node.add_child(child)
-            if not node.is_leaf():
-                node.dist = int(round(100 * countdict[clade]))
-                node.support = int(round(100 * countdict[clade]))
-            else:
-                node.dist = int(100)
-                node.support = int(100)
 
-            nodes[clade] = node
-            queue = new_queue
-        nodelist = list(nodes.values())
-        tre = nodelist[0]
+def _insert_clade(mask, masks, parent):
+    """
+    Adds a clade to a tree of kept clades, in which the parent of each 
+    clade is the smallest kept clade containing it, if it is compatible 
+    with every kept clade. Returns True if the clade was added.
+    """
+    # smallest kept clade containing the candidate
+    node = _lowest_bit(mask)
+    while masks[node] & mask != mask:
+        node = parent[node]
+    top = node
+
+    # every kept child of top that the candidate intersects must 
+    # be inside it. Children are found from tips not yet covered.
+    children = []
+    remaining = mask
+    while remaining:
+        node = _lowest_bit(remaining)
+        while parent[node] != top:
+            node = parent[node]
+        if masks[node] & ~mask:
+            return False
+        children.append(node)
+        remaining &= ~masks[node]
 
-        ## return the tree and other trees if present
-        self.ttree = ToyTree(tre.write(format=0))
-        self.ttree._coords.update()
-        self.nodelist = nodelist
+    # keep the clade as a new child of top
+    new = len(masks)
+    masks.append(mask)
+    parent.append(top)
+    for child in children:
+        parent[child] = new
+    return True
+
+
+def _lowest_bit(mask):
+    "Returns the index of the lowest set bit of a clade mask"
+    return (mask & -mask).bit_length() - 1
+
+
+def _find(up, idx):
+    "Returns the top of the union-find tree of idx, compressing its path"
+    top = idx
+    while up[top] != top:
+        top = up[top]
+    while up[idx] != top:
+        up[idx], idx = top, up[idx]
+    return top
+
+
+
+# the style and format, or split index, shared with worker processes 
+# (see _init_render_worker and _init_rf_worker)
+_SHARED = {}
+
+# max number of values in a block of shared split counts (see rf_matrix)
+RF_BLOCK = 1 << 22
+
+
+def _init_rf_worker(index):
+    "stores the index of trees with each split in each worker process once"
+    _SHARED["index"] = index
+
+
+def _worker_rf_block(start, nrows):
+    "counts shared splits for a block of rows in a worker process"
+    return _rf_block(_SHARED["index"], start, nrows)
+
+
+def _rf_block(index, start, nrows):
+    """
+    Returns an int array with the number of splits shared by each tree in
+    rows start to start + nrows and every tree at or after start. The 
+    table of trees x splits is filled from the index of trees with each 
+    split (see rf_matrix) in blocks of columns with under RF_BLOCK values, 
+    such that its size does not grow with the number of trees and splits.
+    """
+    tidxs, indptr, ntrees = index
+    ntail = ntrees - start
+    nrows = min(nrows, ntail)
+    ncols = max(1, RF_BLOCK // ntail)
+    shared = np.zeros((nrows, ntail), dtype=np.int64)
+    for col in range(0, indptr.size - 1, ncols):
+        end = min(col + ncols, indptr.size - 1)
+        rows = tidxs[indptr[col]:indptr[end]]
+        cols = np.repeat(np.arange(end - col), np.diff(indptr[col:end + 1]))
+        mask = rows >= start
+        table = np.zeros((ntail, end - col), dtype=np.float32)
+        table[rows[mask] - start, cols[mask]] = 1
+        shared += np.rint(np.dot(table[:nrows], table.T)).astype(np.int64)
+    return shared
+
+
+def _has_ghostscript():
+    "returns True if a ghostscript executable for toyplot.png is found"
+    return any(shutil.which(i) for i in ("gs", "gswin64c", "gswin32c"))
+
+
+def _init_render_worker(style, fmt):
+    "stores the prepared style in each worker process once"
+    _SHARED["style"] = style
+    _SHARED["fmt"] = fmt
+
+
+def _worker_render(tree, path):
+    "draws and writes one tree using the style shared with the worker"
+    return _render_tree(tree, path, _SHARED["style"], _SHARED["fmt"])
+
+
+def _render_tree(tree, path, style, fmt):
+    """
+    Draws a tree with a copy of a prepared style and writes it to path.
+    Random toyplot element ids are replaced by ids hashed from the filename
+    and their order of appearance, so that output is reproducible.
+    """
+    # png output does not contain element ids. 'raster' is png drawn by 
+    # the raster renderer (see render_all) from a view of the tree.
+    if fmt == "raster":
+        from .raster import render
+        view = copy(tree)
+        view.style = style
+        render(view, path)
+        return path
+    if fmt == "png":
+        from toyplot import png
+        canvas, _ = Drawing(tree, style=deepcopy(style)).update()
+        png.render(canvas, path)
+        return path
+
+    draw = Drawing(tree, style=deepcopy(style))
+    canvas, _ = draw.update()
+
+    # render svg or html markup
+    if fmt == "svg":
+        markup = toyplot.svg.render(canvas)
+        markup = xml.tostring(markup, method="xml").decode()
+    else:
+        markup = toyplot.html.tostring(canvas)
+
+    # replace random ids in order of appearance
+    name = os.path.basename(path)
+    ids = {}
+    for match in re.findall(r"t[0-9a-f]{32}", markup):
+        if match not in ids:
+            key = "{}-{}".format(name, len(ids)).encode()
+            ids[match] = "t" + md5(key).hexdigest()
+    markup = re.sub(r"t[0-9a-f]{32}", lambda i: ids[i.group()], markup)
+
+    with open(path, "w", encoding="utf-8") as out:
+        out.write(markup)
+    return path
 
 
 
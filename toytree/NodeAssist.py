@@ -51,15 +51,17 @@ class NodeAssist:
                 self.names = [self.names]
 
             # report any names entered that seem like typos
-            bad = [i for i in self.names if i not in self.ttree.get_tip_labels()]
+            tipnames = set(self.ttree.get_tip_labels())
+            bad = [i for i in self.names if i not in tipnames]
             if any(bad):
                 raise ToytreeError(
                     "Sample {} is not in the tree".format(bad))
 
             # select *nodes* that match these names
+            names = set(self.names)
             tips = [
-                i for i in self.ttree.treenode.get_leaves() 
-                if i.name in self.names
+                i for i in self.ttree.treenode.get_leaves()
+                if i.name in names
             ]
 
         # use regex to match tipnames
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+"""
+A toyplot Mark to store node hover data as a JSON lookup table.
+"""
+
+import toyplot
+import toyplot.html
+
+
+class NodeHover(toyplot.mark.Mark):
+    """
+    Stores the hover text of nodes as a compact JSON lookup table keyed by
+    node idx, instead of writing the full text into a <title> element for
+    every node. The node marks are drawn with only the node idx as their
+    title, which is expanded from the table by a small script when the
+    HTML is loaded.
+
+    Parameters:
+    -----------
+    nodes: toyplot.mark.Point
+        The scatterplot mark of nodes with node idxs as titles.
+    table: str
+        JSON string of {"features": [...], "nodes": {idx: [values]}}.
+    """
+    def __init__(self, nodes, table):
+        super(NodeHover, self).__init__(annotation=True)
+        self.nodes = nodes
+        self.table = table
+
+
+
+@toyplot.html.dispatch(
+    toyplot.coordinates.Cartesian, NodeHover, toyplot.html.RenderContext)
+def _render(axes, mark, context):
+    "embed the lookup table and a script to expand node titles from it"
+    context.require(
+        dependencies=[],
+        arguments=[context.get_id(mark.nodes), mark.table],
+        code="""function(mark_id, table)
+        {
+            table = JSON.parse(table);
+            var titles = document.querySelectorAll("#" + mark_id + " title");
+            for(var i = 0; i != titles.length; ++i)
+            {
+                var values = table.nodes[titles[i].textContent];
+                if(values === undefined)
+                    continue;
+                var lines = [];
+                for(var j = 0; j != table.features.length; ++j)
+                    lines.push(table.features[j] + ": " + values[j]);
+                titles[i].textContent = lines.join("\\n");
+            }
+        }""",
+    )
@@ -0,0 +1,446 @@
+#!/usr/bin/env python
+
+"""
+Quartet distances and quartet concordance factors between trees.
+"""
+
+from math import comb
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from .utils import ToytreeError
+
+
+# the Quartets object shared with worker processes (see _init_worker)
+_SHARED = {}
+
+# for each of three sides the indices of the two other sides
+_OTHER1 = np.array([1, 0, 0])
+_OTHER2 = np.array([2, 2, 1])
+
+# the sides (p, q, r, s) of quartets pq|rs of the topologies LR|AB, LA|RB
+# and LB|RA of an edge with sides (L, R, A, B).
+_TOPOLOGIES = ((0, 1, 2, 3), (0, 2, 1, 3), (0, 3, 1, 2))
+
+
+class Quartets:
+    """
+    Compares the quartets (four-tip subtrees) of a reference tree to those
+    of other trees with the same tips without enumerating them, in O(n^2)
+    time per tree. Each node with k >= 3 neighbors divides the tips into
+    k sides, and a resolved quartet ab|cd is 'claimed' by the node at which
+    a and b are on different sides and c and d on the same third side. Each
+    resolved quartet has two such nodes in a tree (one for the pair ab and
+    one for cd), so quartets are counted as sums over pairs of nodes of
+    the two trees of products of the sizes of the intersections of their
+    sides (Bryant et al. 2000). These sizes are computed for all pairs of
+    clades at once in a (reference x other) node array by summing rows of
+    children in postorder, and the sides of a node are its child clades
+    and the complement of its own clade.
+
+    The quartet distance is the number of quartets with a different
+    topology in two bifurcating trees. Quartet concordance factors are
+    computed for each internal edge of the reference tree (e.g., a species
+    tree) from a set of other trees (e.g., gene trees), which may have
+    polytomies: an edge with sides L and R below it and A and B above it
+    defines the quartets with one tip from each side, and the qCF is the
+    proportion of those resolved in the other trees that have topology
+    LR|AB, while qDF1 and qDF2 are the proportions with LA|RB and LB|RA.
+    The gCF is the proportion of other trees that contain the split of the
+    edge. Counts are stored in arrays, and Quartets can be pickled without
+    the reference tree such that trees can be compared in worker processes.
+
+    Parameters:
+    -----------
+    ttree: ToyTree
+        The reference tree. It is unrooted.
+    """
+    def __init__(self, ttree):
+
+        # the unrooted reference tree and the index of each tip name
+        self.tree = (ttree.unroot() if ttree.is_rooted() else ttree)
+        self.names = self.tree.get_tip_labels()
+        self.ndict = {j: i for i, j in enumerate(self.names)}
+        self.ntips = len(self.names)
+        if len(self.ndict) != self.ntips:
+            raise ToytreeError("Duplicated tip names found in tree.")
+
+        # node arrays of the reference tree in preorder
+        nodes = list(self.tree.treenode.traverse("preorder"))
+        self.arrays = _get_arrays(self.tree.treenode, self.ndict, nodes)
+        parents, _, _, snodes, scomps = self.arrays
+        self.bifurcating = bool(snodes.shape[1] <= 3)
+
+        # the four sides (L, R, A, B) around each internal edge, as nodes
+        # whose clade (or its complement if comp) is the side, which are
+        # only defined if the tree is bifurcating.
+        children = {}
+        for nidx, pidx in enumerate(parents.tolist()):
+            children.setdefault(pidx, []).append(nidx)
+        edges = []
+        groups = []
+        comps = []
+        for nidx in range(1, len(nodes)):
+            if nidx not in children or not self.bifurcating:
+                continue
+            # the sibling and the complement of the parent, or the two
+            # siblings if the parent is the root.
+            pidx = parents[nidx]
+            others = [i for i in children[pidx] if i != nidx]
+            if pidx:
+                others.append(pidx)
+            edges.append(nodes[nidx].idx)
+            groups.append(children[nidx] + others)
+            comps.append([False, False, False, bool(pidx)])
+        self.idxs = np.array(edges, dtype=int)
+        self.groups = np.array(groups, dtype=int).reshape(-1, 4)
+        self.comps = np.array(comps, dtype=bool).reshape(-1, 4)
+
+        # number of trees, and the number containing each edge, and the
+        # number of quartets of each edge with topology LR|AB, LA|RB, LB|RA.
+        self.ntrees = 0
+        self.gcounts = np.zeros(len(edges), dtype=np.int64)
+        self.qcounts = np.zeros((len(edges), 3), dtype=np.int64)
+
+
+    def __getstate__(self):
+        "the reference tree is not sent to worker processes"
+        state = self.__dict__.copy()
+        state["tree"] = None
+        return state
+
+
+    def get_arrays(self, treenode):
+        """
+        Returns the node arrays of a tree with the same tips as the
+        reference tree (see _get_arrays), which are small to pickle.
+
+        Parameters:
+        -----------
+        treenode: TreeNode
+            The root TreeNode of a tree, e.g., ToyTree.treenode.
+        """
+        arrays = _get_arrays(treenode, self.ndict)
+        if np.count_nonzero(arrays[1] >= 0) != self.ntips:
+            raise ToytreeError("trees must have the same tips as the reference.")
+        return arrays
+
+
+    def get_overlaps(self, arrays):
+        """
+        Returns an int array with the number of tips shared by each clade
+        of the reference tree (rows) and each clade of another tree
+        (columns) in preorder. Rows of tips are the clade membership of
+        the tip in the other tree, and the rows of other clades are sums
+        of the rows of their children.
+        """
+        rparents, rtips, _, _, _ = self.arrays
+        oparents, otips, _, _, _ = arrays
+        dtype = (np.int16 if self.ntips < (1 << 15) else np.int32)
+
+        # tips in each clade of the other tree
+        members = np.zeros((oparents.size, self.ntips), dtype=bool)
+        leaves = np.flatnonzero(otips >= 0)
+        members[leaves, otips[leaves]] = True
+        for nidx in range(oparents.size - 1, 0, -1):
+            members[oparents[nidx]] |= members[nidx]
+
+        # sum rows of children into parents in reversed preorder
+        overlaps = np.zeros((rparents.size, oparents.size), dtype=dtype)
+        leaves = np.flatnonzero(rtips >= 0)
+        overlaps[leaves] = members[:, rtips[leaves]].T
+        for nidx in range(rparents.size - 1, 0, -1):
+            overlaps[rparents[nidx]] += overlaps[nidx]
+        return overlaps
+
+
+    def get_intersections(self, overlaps, arrays, nodes, comps):
+        """
+        Returns an int64 array (len(nodes), nsides, k) with the number of
+        tips shared by each reference side (a clade, or its complement if
+        comp) and each side of each node of another tree with >= 3 sides.
+        """
+        rsizes = self.arrays[2][nodes][:, None, None]
+        rcomps = comps[:, None, None]
+        _, _, osizes, snodes, scomps = arrays
+        valid = snodes >= 0
+        snodes = np.where(valid, snodes, 0)
+        ssizes = osizes[snodes][None]
+        shared = overlaps[nodes][:, snodes].astype(np.int64)
+        shared = np.where(
+            rcomps,
+            np.where(scomps, self.ntips - rsizes - ssizes + shared, ssizes - shared),
+            np.where(scomps, rsizes - shared, shared),
+        )
+        return shared * valid
+
+
+    def get_distance(self, treenode, normalize=False):
+        """
+        Returns the quartet distance between the reference tree and another
+        bifurcating tree (rooted or not) with the same tips, i.e., the
+        number of quartets with a different topology in the two trees.
+
+        Parameters:
+        -----------
+        treenode: TreeNode
+            The root TreeNode of a tree, e.g., ToyTree.treenode.
+        normalize: bool
+            If True the distance is divided by the number of quartets.
+        """
+        return self._get_distance(self.get_arrays(treenode), normalize)
+
+
+    def _get_distance(self, arrays, normalize=False):
+        "returns the quartet distance to a tree from its node arrays"
+        if not self.bifurcating or arrays[3].shape[1] > 3:
+            raise ToytreeError(
+                "Quartet distances can only be computed between bifurcating "
+                "trees.")
+        overlaps = self.get_overlaps(arrays)
+        _, _, _, snodes, scomps = self.arrays
+
+        # for each pair of sides (i, k) of two nodes, the pairs of tips of
+        # side i in the reference and k in the other tree, times the pairs
+        # of tips on different sides in both trees among the other sides.
+        claims = 0
+        for nodes, comps in zip(snodes, scomps):
+            shared = self.get_intersections(overlaps, arrays, nodes, comps)
+            pairs = shared * (shared - 1) // 2
+            one = shared[_OTHER1]
+            two = shared[_OTHER2]
+            cross = (
+                one[:, :, _OTHER1] * two[:, :, _OTHER2] +
+                one[:, :, _OTHER2] * two[:, :, _OTHER1])
+            claims += int((pairs * cross).sum())
+
+        # each shared quartet is claimed by two pairs of nodes
+        nquartets = comb(self.ntips, 4)
+        dist = nquartets - claims // 2
+        if normalize:
+            return dist / max(nquartets, 1)
+        return dist
+
+
+    def add(self, treenode, ncopies=1):
+        """
+        Counts the quartets of each internal edge of the reference tree
+        that are resolved in each way in another tree, and whether it has
+        the split of the edge.
+
+        Parameters:
+        -----------
+        treenode: TreeNode
+            The root TreeNode of a tree with the same tips as the reference.
+        ncopies: int
+            Number of times to count the tree, e.g., for duplicate trees.
+        """
+        gcounts, qcounts = self._get_counts(self.get_arrays(treenode))
+        self.gcounts += ncopies * gcounts
+        self.qcounts += ncopies * qcounts
+        self.ntrees += ncopies
+        return self
+
+
+    def merge(self, other):
+        """
+        Adds the counts of another Quartets of the same reference tree to
+        this one in place and returns this object.
+
+        Parameters:
+        -----------
+        other: Quartets
+            A Quartets object that counted other trees.
+        """
+        if other.names != self.names or not np.array_equal(
+                other.groups, self.groups):
+            raise ToytreeError(
+                "Quartets can only be merged if made from the same "
+                "reference tree.")
+        self.gcounts += other.gcounts
+        self.qcounts += other.qcounts
+        self.ntrees += other.ntrees
+        return self
+
+
+    def get_tree(self):
+        """
+        Returns a copy of the unrooted reference tree with 'gcf', 'qcf',
+        'qdf1' and 'qdf2' values (%) on the nodes below internal edges. 
+        The qCF and qDFs are 0 if no quartet of an edge was resolved.
+        Other nodes have empty values.
+        """
+        if self.tree is None:
+            raise ToytreeError("the reference tree is not stored in this copy.")
+        nself = self.tree.copy()
+        gcfs = 100 * self.gcounts / float(max(self.ntrees, 1))
+        resolved = np.maximum(self.qcounts.sum(axis=1, keepdims=True), 1)
+        qcfs = 100 * self.qcounts / resolved
+        values = dict(zip(
+            self.idxs.tolist(),
+            zip(gcfs.tolist(), qcfs.tolist())))
+        for node in nself.treenode.traverse():
+            gcf, qcf = values.get(node.idx, ("", ("", "", "")))
+            node.add_feature("gcf", gcf)
+            node.add_feature("qcf", qcf[0])
+            node.add_feature("qdf1", qcf[1])
+            node.add_feature("qdf2", qcf[2])
+        nself._coords.update()
+        return nself
+
+
+    def run(self, treenodes, workers=None, chunksize=10):
+        """
+        Adds the counts of each tree in an iterable of TreeNodes, in 
+        parallel if workers > 1, and returns this object. Only the node 
+        arrays of each tree are sent to worker processes.
+        """
+        arrays = (self.get_arrays(i) for i in treenodes)
+        if not workers or workers < 2:
+            results = map(self._get_counts, arrays)
+            return self._add_results(results)
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(self.__getstate__(),),
+        ) as pool:
+            results = pool.map(_worker_counts, arrays, chunksize=chunksize)
+            return self._add_results(results)
+
+
+    def get_distances(
+        self, treenodes, normalize=False, workers=None, chunksize=10):
+        """
+        Returns an array with the quartet distance between the reference
+        tree and each tree in an iterable of TreeNodes (see get_distance),
+        in parallel if workers > 1.
+        """
+        arrays = (self.get_arrays(i) for i in treenodes)
+        dtype = (np.float64 if normalize else np.int64)
+        if not workers or workers < 2:
+            return np.array(
+                [self._get_distance(i, normalize) for i in arrays], 
+                dtype=dtype)
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(self.__getstate__(),),
+        ) as pool:
+            dists = pool.map(
+                _worker_distance, arrays, repeat(normalize), 
+                chunksize=chunksize)
+            return np.array(list(dists), dtype=dtype)
+
+
+    def _add_results(self, results):
+        "adds (gcounts, qcounts) of trees and returns this object"
+        for gcounts, qcounts in results:
+            self.gcounts += gcounts
+            self.qcounts += qcounts
+            self.ntrees += 1
+        return self
+
+
+    def _get_counts(self, arrays):
+        """
+        Returns an array with 1 for each edge whose split is in a tree, and
+        an array with the number of quartets of each edge with topology
+        LR|AB, LA|RB and LB|RA in the tree, from its node arrays. Quartets
+        pq|rs are counted at the nodes of the tree where r and s are on the
+        same side and p and q on two different other sides.
+        """
+        if not self.bifurcating:
+            raise ToytreeError(
+                "Quartet concordance requires a bifurcating reference tree.")
+        overlaps = self.get_overlaps(arrays)
+        rsizes = self.arrays[2]
+        osizes = arrays[2]
+        ntips = self.ntips
+        gcounts = np.zeros(len(self.idxs), dtype=np.int64)
+        qcounts = np.zeros((len(self.idxs), 3), dtype=np.int64)
+        for eidx, (nodes, comps) in enumerate(zip(self.groups, self.comps)):
+
+            # the split is the clade of the parent of L, or its complement
+            nidx = self.arrays[0][nodes[0]]
+            size = rsizes[nidx]
+            shared = overlaps[nidx]
+            gcounts[eidx] = np.any(
+                ((shared == size) & (osizes == size)) |
+                ((shared == 0) & (osizes == ntips - size)))
+
+            # sides of the tree nodes intersected with L, R, A and B
+            sides = self.get_intersections(overlaps, arrays, nodes, comps)
+            totals = np.where(comps, ntips - rsizes[nodes], rsizes[nodes])
+            for col, (pidx, qidx, ridx, sidx) in enumerate(_TOPOLOGIES):
+                both = sides[pidx] * sides[qidx]
+                apart = (
+                    (totals[pidx] - sides[pidx]) * (totals[qidx] - sides[qidx])
+                    - both.sum(axis=1, keepdims=True) + both)
+                qcounts[eidx, col] = (sides[ridx] * sides[sidx] * apart).sum()
+        return gcounts, qcounts
+
+
+
+def _get_arrays(treenode, ndict, nodes=None):
+    """
+    Returns arrays of a tree in preorder with the index of the parent of
+    each node (-1 for the root), the index in ndict of the name of each tip
+    (-1 for internal nodes), and the number of tips in each clade. Also
+    returns (nnodes, k) arrays with the sides of each node with >= 3 sides,
+    as the index of a node whose clade is the side, or its complement if
+    comp is True, padded with -1 up to the max number of sides k. Nodes
+    with two sides (e.g., the root of a rooted tree) claim no quartets.
+    """
+    if nodes is None:
+        nodes = list(treenode.traverse("preorder"))
+    index = {node: idx for idx, node in enumerate(nodes)}
+    parents = np.array(
+        [-1] + [index[node.up] for node in nodes[1:]], dtype=int)
+
+    tips = np.full(len(nodes), -1, dtype=int)
+    for idx, node in enumerate(nodes):
+        if node.is_leaf():
+            try:
+                tips[idx] = ndict[node.name]
+            except KeyError:
+                raise ToytreeError(
+                    "tip '{}' is not in the reference tree".format(node.name))
+
+    sizes = (tips >= 0).astype(int)
+    for idx in range(len(nodes) - 1, 0, -1):
+        sizes[parents[idx]] += sizes[idx]
+
+    # the child clades and the complement of the node clade
+    sides = []
+    for idx, node in enumerate(nodes):
+        nsides = len(node.children) + (idx > 0)
+        if nsides > 2:
+            side = [(index[child], False) for child in node.children]
+            if idx:
+                side.append((idx, True))
+            sides.append(side)
+    width = max([len(i) for i in sides] + [3])
+    snodes = np.full((len(sides), width), -1, dtype=int)
+    scomps = np.zeros((len(sides), width), dtype=bool)
+    for row, side in enumerate(sides):
+        snodes[row, :len(side)] = [i[0] for i in side]
+        scomps[row, :len(side)] = [i[1] for i in side]
+    return parents, tips, sizes, snodes, scomps
+
+
+def _init_worker(state):
+    "store the Quartets state once per worker process"
+    quartets = Quartets.__new__(Quartets)
+    quartets.__dict__.update(state)
+    _SHARED["quartets"] = quartets
+
+
+def _worker_distance(arrays, normalize):
+    "returns the quartet distance to a tree in a worker process"
+    return _SHARED["quartets"]._get_distance(arrays, normalize)
+
+
+def _worker_counts(arrays):
+    "returns the quartet counts of a tree in a worker process"
+    return _SHARED["quartets"]._get_counts(arrays)
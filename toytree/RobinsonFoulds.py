@@ -5,20 +5,30 @@ Robinson-Foulds Distance Calculations modified from ete3 TreeNode subfunction.
 """
 
 from __future__ import print_function
+import numpy as np
 from .utils import TreeError
 # from .TreeParser import TreeParser
 
 
+# support of splits that are not clades of the tree (never discarded)
+NO_SUPPORT = 999999999
+
+
 class RobinsonFoulds(object):
     """
-    Simplified RF code for comparing TreeNodes.
+    Simplified RF code for comparing TreeNodes. Tips are encoded as bits
+    in the sorted order of their names (attrs) in t1, and the clades of
+    each tree are bitsets stored as python ints computed in one postorder
+    pass, such that splits are compared as sets of ints and only converted
+    to tuples of names for the returned edges. The clades of t1 are cached,
+    such that comparing t1 to other trees with compare() reuses them.
     """
-    def __init__(self, 
+    def __init__(self,
         t1,
-        t2, 
-        attr_t1="name", 
-        attr_t2="name", 
-        unrooted_trees=False, 
+        t2,
+        attr_t1="name",
+        attr_t2="name",
+        unrooted_trees=False,
         expand_polytomies=False,
         polytomy_size_limit=5,
         skip_large_polytomies=False,
@@ -47,6 +57,16 @@ class RobinsonFoulds(object):
         self.t2s = []
         self.min_comparison = None
 
+        # names of t1 in bit order and cached clades of t1
+        self.names = sorted(set(
+            getattr(i, self.attr_t1) for i in self.t1.iter_leaves()
+            if hasattr(i, self.attr_t1)
+        ))
+        self.ndict = {j: i for i, j in enumerate(self.names)}
+        self.name_array = np.empty(len(self.names), dtype=object)
+        self.name_array[:] = self.names
+        self.clades_t1 = self.get_clades(self.t1, self.attr_t1)
+
         # run functions
         self.check_args()
         self.check_attrs()
@@ -55,12 +75,30 @@ class RobinsonFoulds(object):
         #self.compare_trees()
 
 
+    def compare(self, t2, min_support_t2=None, named_edges=True):
+        """
+        Compares t1 to another tree reusing the cached clades of t1 and
+        returns the same as compare_trees(). Trees must not be modified in
+        place between comparisons.
+        """
+        self.t2 = t2
+        if min_support_t2 is not None:
+            self.min_support_t2 = min_support_t2
+        self.polytomy_correction = 0
+        self.min_comparison = None
+        self.check_args()
+        self.check_attrs()
+        self.get_trees()
+        self.get_corrections()
+        return self.compare_trees(named_edges)
+
+
     def check_args(self):
         # check whether to bail out
         if self.unrooted_trees:
             if self.expand_polytomies:
                 raise TreeError(
-                    "Cannot use 'expand_polytomies' and 'unrooted_trees'")                    
+                    "Cannot use 'expand_polytomies' and 'unrooted_trees'")
         else:
             if (len(self.t1.children) > 2) or (len(self.t2.children) > 2):
                 raise TreeError(
@@ -72,26 +110,20 @@ class RobinsonFoulds(object):
 
 
     def check_attrs(self):
-        # get common attributes of the two trees, use generators
-        attrs_t1 = (
-            getattr(i, self.attr_t1) for i in self.t1.iter_leaves() 
+        # get common attributes of the two trees from lists of tip attrs
+        attrs_t1 = [
+            getattr(i, self.attr_t1) for i in self.t1.iter_leaves()
             if hasattr(i, self.attr_t1)
-        )
-        attrs_t2 = (
-            getattr(i, self.attr_t2) for i in self.t2.iter_leaves() 
+        ]
+        attrs_t2 = [
+            getattr(i, self.attr_t2) for i in self.t2.iter_leaves()
             if hasattr(i, self.attr_t2)
-        )
+        ]
         self.common_attrs = set(attrs_t1) & set(attrs_t2)
 
         # Check for duplicated items (is this necessary?)
-        size1 = sum((
-            1 for i in self.t1.iter_leaves() if 
-            getattr(i, self.attr_t1, None) in self.common_attrs
-        ))
-        size2 = sum((
-            1 for i in self.t2.iter_leaves() if 
-            getattr(i, self.attr_t2, None) in self.common_attrs
-        ))
+        size1 = sum(1 for i in attrs_t1 if i in self.common_attrs)
+        size2 = sum(1 for i in attrs_t2 if i in self.common_attrs)
         if size1 > len(self.common_attrs):
             raise TreeError('Duplicated items found in source tree')
         if size2 > len(self.common_attrs):
@@ -100,46 +132,26 @@ class RobinsonFoulds(object):
 
     def get_trees(self):
         """
-        TODO: rewrite this so it doesn't have to re-parse newicks.
+        Polytomies are not expanded (see expand_polytomies), such that
+        each tree is compared as is without re-parsing newicks.
         """
         # expand polytomies to get all resolutions possible, but fail if > max
         if self.expand_polytomies:
             raise NotImplementedError(
                 "RF dist of unresolved trees not implemented currently. TODO: contact developers.")
-
-            self.t1s = (
-                TreeParser(nw).treenodes[0] for nw in
-                self.t1.expand_polytomies(
-                    map_attr=self.attr_t1,
-                    polytomy_size_limit=self.polytomy_size_limit,
-                    skip_large_polytomies=self.skip_large_polytomies
-                    )
-                )
-            self.t2s = (
-                # toytree.tree(nw).treenode for nw in                                 
-                TreeParser(nw).treenodes[0] for nw in 
-                self.t2.expand_polytomies(
-                    map_attr=self.attr_t2,
-                    polytomy_size_limit=self.polytomy_size_limit,
-                    skip_large_polytomies=self.skip_large_polytomies,
-                    )
-                )
-            # why ...?
-            self.attr_t1, self.attr_t2 = "name", "name"
-        else:
-            self.t1s = [self.t1]
-            self.t2s = [self.t2]
+        self.t1s = [self.t1]
+        self.t2s = [self.t2]
 
 
     def get_corrections(self):
         # correct for the N polytomies
         if self.correct_by_polytomy_size:
-            corr1 = (
-                len(i.children) - 2 for i in self.t1.traverse() 
+            corr1 = sum(
+                len(i.children) - 2 for i in self.t1.traverse()
                 if len(i.children) > 2
             )
-            corr2 = (
-                len(i.children) - 2 for i in self.t2.traverse() 
+            corr2 = sum(
+                len(i.children) - 2 for i in self.t2.traverse()
                 if len(i.children) > 2
             )
             if corr1 and corr2:
@@ -149,143 +161,124 @@ class RobinsonFoulds(object):
                 self.polytomy_correction = max((corr1, corr2))
 
 
-    def get_edges(self, tx_content, tx_leaves, attr):
+    def get_clades(self, tree, attr):
+        """
+        Returns a list of the clades of all nodes of a tree in postorder,
+        as bitsets of tips in self.ndict, and an array of their supports.
+        Tips that are not in t1 or do not have the attr are not set.
+        """
+        masks = {}
+        supports = []
+        for node in tree.traverse("postorder"):
+            if node.is_leaf():
+                bit = self.ndict.get(getattr(node, attr, None))
+                masks[node] = (0 if bit is None else 1 << bit)
+            else:
+                mask = 0
+                for child in node.children:
+                    mask |= masks[child]
+                masks[node] = mask
+            supports.append(node.support)
+        return list(masks.values()), np.array(supports, dtype=float)
 
+
+    def get_edges(self, clades, common):
+        """
+        Returns the set of edges of a tree restricted to the common tips,
+        as clade bitsets for rooted trees, or for unrooted trees as the
+        smaller of the two bitsets on either side of each split.
+        """
         if self.unrooted_trees:
             edges = set()
-            for content in tx_content.values():  
-                    
-                # get name from nodes if they have a name and its in common
-                names1 = tuple(sorted(
-                    getattr(node, attr) for node in content if 
-                    (
-                        hasattr(node, attr) and \
-                        (getattr(node, attr) in self.common_attrs)
-                    )
-                ))
-
-                # get names of all leaves minus this node's descendants
-                names2 = tuple(sorted(
-                    getattr(node, attr) for node in tx_leaves - content if 
-                    (
-                        hasattr(node, attr) and \
-                        (getattr(node, attr) in self.common_attrs)
-                    )
-                ))
-
-                # add the split to the edges set
-                edges.add(tuple(sorted(set([names1, names2]))))
-            edges.discard(((), ()))
-
-        # get edges of a rooted tree: just tuples of tips descended
+            for mask in clades:
+                mask &= common
+                other = common ^ mask
+                edges.add(mask if mask < other else other)
         else:
-            edges = set()
-            for content in tx_content.values():
-                names1 = tuple(sorted(
-                    getattr(node, attr) for node in content if 
-                    (
-                        hasattr(node, attr) and \
-                        (getattr(node, attr) in self.common_attrs)
-                    )
-                ))
-                edges.add(tuple(sorted(set(names1))))
-            edges.discard(())
+            edges = set(mask & common for mask in clades)
+            edges.discard(0)
         return edges
 
 
-    def get_support_dict(self, tx_content, attr):
-        cdict = {}
-        for branch, content in tx_content.items():
-            key = tuple(sorted(
-                getattr(node, attr) for node in content if 
-                (
-                    hasattr(node, attr) and \
-                    (getattr(node, attr) in self.common_attrs)
-                )
-            ))
-            cdict[key] = branch.support
-        return cdict
-
-
-    def get_discards(self, t1_edges, t1_sdict, t2_edges, t2_sdict):
-
-        # initial empty
-        discard_t1, discard_t2 = set(), set()
-
-        # get discards from t1
-        if self.min_support_t1 and self.unrooted_trees:
-            discard_t1 = set()
-            for split in t1_edges:
-                split_support = t1_sdict.get(
-                    split[0], 
-                    t1_sdict.get(split[1], 999999999)
-                )
-                if split_support < self.min_support_t1:
-                    discard_t1.add(split)
-
-        elif self.min_support_t1:
-            discard_t1 = set([
-                split for split in t1_edges 
-                if t1_sdict[split] < self.min_support_t1
-            ])
-
-        # get discards from t2
-        if self.min_support_t2 and self.unrooted_trees:
-            discard_t2 = set()
-            for split in t2_edges:
-                split_support = t2_sdict.get(
-                    split[0], 
-                    t2_sdict.get(split[1], 999999999)
-                )
-                if split_support < self.min_support_t2:
-                    discard_t2.add(split)
-
-        elif self.min_support_t2:
-            discard_t2 = set([
-                split for split in t2_edges 
-                if t2_sdict[split] < self.min_support_t2
-            ])
-        return discard_t1, discard_t2
-
-
-    def compare_trees(self):
+    def get_discards(self, clades, supports, common, min_support):
         """
-        Iterate over trees in t1 and t2 to count splits present in both
+        Returns the set of edges with support below min_support. The
+        support of a split is that of the first side of the split in name
+        order (the empty side, or the side with the first name) if that
+        side is a clade of the tree, else that of the other side if it is
+        a clade, else it is never discarded.
         """
-        for t1 in self.t1s:
-            # a dictionary of {node: node.get_leaves()}
-            t1_content = t1.get_cached_content()
-
-            # a list of nodes descended from this one: [node0, node1, node2]
-            t1_leaves = t1_content[t1]
-            
-            # get edges of the tree: set of tuples on either side of splits
-            t1_edges = self.get_edges(t1_content, t1_leaves, self.attr_t1)
+        if not min_support:
+            return set()
+
+        # support of each clade (the last, i.e., highest, of duplicates)
+        masks = [i & common for i in clades]
+        sdict = dict(zip(masks, supports.tolist()))
+        if not self.unrooted_trees:
+            low = np.flatnonzero(supports < min_support)
+            return set(
+                i for i in (masks[j] for j in low) if i and
+                sdict[i] < min_support)
+
+        # the first side of each split in name order
+        first = common & -common
+        edges = self.get_edges(clades, common)
+        keys = list(edges)
+        values = np.zeros(len(keys))
+        for idx, key in enumerate(keys):
+            other = common ^ key
+            if key and other and other & first:
+                key, other = other, key
+            values[idx] = sdict.get(key, sdict.get(other, NO_SUPPORT))
+        return set(keys[i] for i in np.flatnonzero(values < min_support))
+
+
+    def get_names(self, mask):
+        "Returns a tuple of sorted names of the tips in a clade bitset"
+        nbytes = (len(self.names) + 7) // 8
+        bits = np.unpackbits(
+            np.frombuffer(mask.to_bytes(nbytes, "little"), dtype=np.uint8),
+            bitorder="little")
+        return tuple(self.name_array[np.flatnonzero(bits)].tolist())
+
+
+    def get_named_edges(self, edges, common):
+        "Returns a set of edges as tuples of names (see get_edges)"
+        if not self.unrooted_trees:
+            return set(self.get_names(i) for i in edges)
+        named = set()
+        for mask in edges:
+            names = set([self.get_names(mask), self.get_names(common ^ mask)])
+            named.add(tuple(sorted(names)))
+        return named
+
+
+    def compare_trees(self, named_edges=True):
+        """
+        Iterate over trees in t1 and t2 to count splits present in both.
+        Edges are returned as tuples of names, or if not named_edges as 
+        bitsets of the tips in self.names, which is faster for large trees.
+        """
+        # common tips as a bitset in the bit order of t1
+        common = 0
+        for name in self.common_attrs:
+            common |= 1 << self.ndict[name]
 
-            # get support on tree ...
-            t1_sdict = None
-            if self.min_support_t1:
-                t1_sdict = self.get_support_dict(t1_content, self.attr_t1)
+        for t1 in self.t1s:
+            # clades of t1 in postorder and their support
+            clades1, supports1 = self.clades_t1
+            t1_edges = self.get_edges(clades1, common)
 
             # iterate over target trees
             for t2 in self.t2s:
-                # a dictionary of {node: node.get_leaves()}
-                t2_content = t2.get_cached_content()
-                
-                # nodes descended from this one: [node0, node1, node2, ...]
-                t2_leaves = t2_content[t2]
-
-                # get edges of the tree: set of tuples on either side of splits
-                t2_edges = self.get_edges(t2_content, t2_leaves, self.attr_t2)
-
-                # get support dict
-                t2_sdict = None
-                if self.min_support_t2:
-                    t2_sdict = self.get_support_dict(t2_content, self.attr_t2)
+                clades2, supports2 = self.get_clades(t2, self.attr_t2)
+                t2_edges = self.get_edges(clades2, common)
 
                 # if support constraint, discard lowly supported splits
-                discard_t1, discard_t2 = self.get_discards(
-                    t1_edges, t1_sdict, t2_edges, t2_sdict)
+                discard_t1 = self.get_discards(
+                    clades1, supports1, common, self.min_support_t1)
+                discard_t2 = self.get_discards(
+                    clades2, supports2, common, self.min_support_t2)
 
                 # the two root edges are never counted here, as they are always
                 # present in both trees because of the common attr filters
@@ -298,28 +291,31 @@ class RobinsonFoulds(object):
 
                 if self.unrooted_trees:
                     max_parts = sum((
-                        sum(1 for split in cedges1 if split[0] and split[1]),
-                        sum(1 for split in cedges2 if split[0] and split[1]),
+                        sum(1 for split in cedges1 if split and split != common),
+                        sum(1 for split in cedges2 if split and split != common),
                     ))
                 else:
                     # Otherwise we need to count the actual number of valid
                     # partitions in each tree -2 is to avoid counting the root
                     # partition of the two trees (only needed in rooted trees)
-                    max_parts = sum((
-                        sum(1 for split in cedges1 if split),
-                        sum(1 for split in cedges2 if split),
-                    )) - 2
+                    max_parts = len(cedges1) + len(cedges2) - 2
 
                 # update min_comparison if this compare was worse
                 if not self.min_comparison or (self.min_comparison[0] > rf):
-                    min_comparison = [
-                        rf, 
-                        max_parts, 
-                        self.common_attrs, 
-                        t1_edges, 
-                        t2_edges, 
-                        discard_t1, 
+                    self.min_comparison = [
+                        rf,
+                        max_parts,
+                        self.common_attrs,
+                        t1_edges,
+                        t2_edges,
+                        discard_t1,
                         discard_t2,
                     ]
 
-        return min_comparison
\ No newline at end of file
+        # return edges as tuples of names
+        result = list(self.min_comparison)
+        if not named_edges:
+            return result
+        for idx in range(3, 7):
+            result[idx] = self.get_named_edges(result[idx], common)
+        return result
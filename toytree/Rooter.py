@@ -4,6 +4,7 @@
 Rooting class
 """
 
+import numpy as np
 from .NodeAssist import NodeAssist
 from .utils import ToytreeError
 
@@ -278,3 +279,355 @@ class Rooter:
                 raise ToytreeError(
                     "Matched query is paraphyletic: {}"
                     .format(sorted([clade1, clade2], key=len)[0]))
+
+
+
+def reroot(tree, node, dist=None, edge_features=("support",)):
+    """
+    Moves the root of a ToyTree in place to the edge above 'node', at a 
+    distance 'dist' from node (default is the midpoint of the edge). Only
+    the nodes on the path between the current root and node are modified,
+    so the cost is proportional to the path length. If the current root is 
+    bifurcating it is removed and re-used as the new root node, otherwise
+    (unrooted tree) a new root node is created. Edge features (e.g., 
+    support) are moved along with edges whose direction is reversed. This 
+    does not ladderize or update coordinates, call tree._coords.update() 
+    before drawing.
+
+    Parameters:
+    -----------
+    tree: ToyTree
+        The tree to re-root in place.
+    node: TreeNode
+        A node of the tree. The root is placed on the edge above it.
+    dist: float or None
+        Distance from node to the new root along the edge.
+    edge_features: list
+        Node features that are treated as edge features.
+    """
+    root = tree.treenode
+    if node is root or node.up is None:
+        raise ToytreeError("cannot root on the edge above the root node.")
+
+    # default is midpoint of the edge
+    if dist is None:
+        dist = node.dist / 2.
+    if dist < 0 or dist > node.dist:
+        raise ToytreeError(
+            "dist must be within the edge being split. The edge above "
+            "node {} is {}.".format(node.name, node.dist))
+    features = [i for i in edge_features if i != "dist"]
+
+    # nodes on the path from node.up up to (not incl.) the root
+    path = []
+    tnode = node.up
+    while tnode is not root:
+        path.append(tnode)
+        tnode = tnode.up
+
+    # node is already a child of a bifurcating root: only shift the split
+    if len(root.children) == 2 and not path:
+        sister = [i for i in root.children if i is not node][0]
+        sister.dist += node.dist - dist
+        node.dist = dist
+        return root
+
+    # remove a bifurcating root by joining its children into one edge 
+    if len(root.children) == 2:
+        top = path[-1]
+        sister = [i for i in root.children if i is not top][0]
+        sister.dist += top.dist
+        sister.up = top
+        top.children.append(sister)
+        newroot = root
+
+    # or treat the root of an unrooted tree as a normal node on the path
+    else:
+        path.append(root)
+        newroot = root.__class__()
+
+    # reverse the direction of edges on the path, moving edge features.
+    for pidx in range(len(path) - 1, 0, -1):
+        upper = path[pidx]
+        lower = path[pidx - 1]
+        upper.children.remove(lower)
+        lower.children.append(upper)
+        upper.up = lower
+        upper.dist = lower.dist
+        for feature in features:
+            setattr(upper, feature, getattr(lower, feature))
+
+    # split the edge above node with the new root
+    first = path[0]
+    first.children.remove(node)
+    first.up = newroot
+    first.dist = node.dist - dist
+    for feature in features:
+        setattr(first, feature, getattr(node, feature))
+    node.dist = dist
+    node.up = newroot
+    newroot.up = None
+    newroot.children = [node, first]
+    tree.treenode = newroot
+    return newroot
+
+
+
+def iter_root_edges(tree, edge_features=("support",)):
+    """
+    Generator that visits every edge of a ToyTree as a root position. The
+    root is moved in place (with reroot) across one edge at a time in a 
+    depth-first order, such that each step only modifies a few nodes. At
+    each edge it yields (node, rootdists), where the tree is rooted on the
+    edge above node with the root at zero distance from node, and rootdists 
+    is an array with the distance from the root to each tip, ordered by tip
+    idx. The distances are updated at each step by adding or subtracting 
+    the edge length crossed for tips on either side of it, using the ranges 
+    of tips in preorder. The original tree is restored when the generator 
+    finishes or is closed.
+
+    Parameters:
+    -----------
+    tree: ToyTree
+        The tree whose root positions will be visited.
+    edge_features: list
+        Node features that are treated as edge features.
+    """
+    root = tree.treenode
+    if len(root.children) < 2:
+        return
+
+    # store the original structure to restore it at the end
+    saved = {}
+    for node in root.traverse("preorder"):
+        saved[node] = (
+            node.up, 
+            list(node.children), 
+            node.dist, 
+            {i: getattr(node, i) for i in edge_features if i != "dist"},
+        )
+
+    # tips in preorder have contiguous (lo, hi) ranges for each clade
+    leaves = root.get_leaves()
+    ranges = {}
+    for pos, leaf in enumerate(leaves):
+        ranges[leaf] = (pos, pos + 1)
+    for node in root.traverse("postorder"):
+        if node.children:
+            ranges[node] = (
+                ranges[node.children[0]][0], ranges[node.children[-1]][1])
+
+    # order of tip idxs in preorder positions
+    perm = np.zeros(len(leaves), dtype=int)
+    for pos, leaf in enumerate(leaves):
+        perm[leaf.idx] = pos
+
+    # distances from the current root to each tip in preorder
+    rootdists = np.zeros(len(leaves))
+    dists = {root: 0.}
+    for node in root.traverse("preorder"):
+        if node is not root:
+            dists[node] = dists[node.up] + node.dist
+    for pos, leaf in enumerate(leaves):
+        rootdists[pos] = dists[leaf]
+
+    # neighbors of each node as (node, length, range, neighbor in range)
+    # a bifurcating root is not a node but is the middle of one edge.
+    rooted = len(root.children) == 2
+    adjacent = {node: [] for node in saved}
+    for node in root.traverse("preorder"):
+        if node is root:
+            continue
+        parent = node.up
+        if rooted and parent is root:
+            continue
+        adjacent[parent].append((node, node.dist, ranges[node], True))
+        adjacent[node].append((parent, node.dist, ranges[node], False))
+    if rooted:
+        side0, side1 = root.children
+        length = side0.dist + side1.dist
+        adjacent[side0].append((side1, length, ranges[side1], True))
+        adjacent[side1].append((side0, length, ranges[side0], True))
+
+    def move(nnode, length, nrange, inside):
+        # update distances for moving root to nnode across edge of length
+        if inside:
+            rootdists[:] += length
+            rootdists[nrange[0]:nrange[1]] -= 2 * length
+        else:
+            rootdists[:] -= length
+            rootdists[nrange[0]:nrange[1]] += 2 * length
+        reroot(tree, nnode, 0., edge_features)
+
+    try:
+        # start on the edge above the first child of the root
+        start = root.children[0]
+        other = (root.children[1] if rooted else root)
+        rootdists += start.dist
+        rootdists[slice(*ranges[start])] -= 2 * start.dist
+        reroot(tree, start, 0., edge_features)
+        yield start, rootdists[perm]
+
+        # depth-first search moving one edge at a time
+        stack = [(start, None, iter(adjacent[start]))]
+        while stack:
+            cnode, pnode, neighbors = stack[-1]
+            for nnode, length, nrange, inside in neighbors:
+                if nnode is pnode:
+                    continue
+                move(nnode, length, nrange, inside)
+                if not (cnode is start and nnode is other):
+                    yield nnode, rootdists[perm]
+                stack.append((nnode, cnode, iter(adjacent[nnode])))
+                break
+            else:
+                # all neighbors visited: move back across the edge
+                stack.pop()
+                if pnode is not None:
+                    for nnode, length, nrange, inside in adjacent[cnode]:
+                        if nnode is pnode:
+                            move(nnode, length, nrange, inside)
+                            break
+
+    # restore the original tree structure
+    finally:
+        for node, (up, children, dist, feats) in saved.items():
+            node.up = up
+            node.children = children
+            node.dist = dist
+            for key, val in feats.items():
+                setattr(node, key, val)
+        tree.treenode = root
+
+
+
+def get_midpoint_edge(tree):
+    """
+    Returns (node, dist) for the midpoint of the longest path between two 
+    tips, which is on the edge above node at dist from node. Found in O(n)
+    with a postorder pass for the farthest tip below each node and a 
+    preorder pass for the farthest tip on the other side of each edge.
+    """
+    root = tree.treenode
+    postorder = list(root.traverse("postorder"))
+
+    # postorder: distance to the farthest tip below each node
+    below = {}
+    for node in postorder:
+        below[node] = max(
+            [below[i] + i.dist for i in node.children] or [0.])
+
+    # preorder: distance from node.up to the farthest tip not below node
+    above = {}
+    for node in postorder[::-1]:
+        if node.children:
+            # the top two values among children, to exclude each child 
+            vals = sorted(
+                ((below[i] + i.dist, idx) for (idx, i) in 
+                    enumerate(node.children)), reverse=True)
+            if node is root:
+                upval = -np.inf
+            else:
+                upval = above[node] + node.dist
+            for idx, child in enumerate(node.children):
+                others = [i[0] for i in vals[:2] if i[1] != idx]
+                above[child] = max([upval] + others)
+
+    # the longest path through each edge
+    lengths = {}
+    for node in postorder:
+        if node is not root:
+            lengths[node] = below[node] + node.dist + above[node]
+    diameter = max(lengths.values())
+
+    # the midpoint is on an edge of a longest path where it is between the
+    # farthest tips on either side, within float rounding if it is on a node.
+    half = diameter / 2.
+    tol = 1e-9 * max(1., diameter)
+    for node in postorder:
+        if node is root or (diameter - lengths[node]) > tol:
+            continue
+        if below[node] - tol <= half <= below[node] + node.dist + tol:
+            return node, min(max(half - below[node], 0.), node.dist)
+
+    # in case of float rounding: clamp to an edge of a longest path
+    node = max(lengths, key=lengths.get)
+    return node, min(max(half - below[node], 0.), node.dist)
+
+
+
+def get_min_var_edge(tree):
+    """
+    Returns (node, dist) for the root position that minimizes the variance
+    of root-to-tip distances, which is on the edge above node at dist from 
+    node. Found in O(n) using the number of tips, and the sums and sums of
+    squares of distances to tips, computed below each node in a postorder
+    pass and over all tips for each node in a preorder pass. For each edge
+    the variance is a quadratic function of the root position.
+    """
+    root = tree.treenode
+    postorder = list(root.traverse("postorder"))
+
+    # postorder: ntips, sum and sum of squares of distances to tips below
+    ntips = {}
+    sums = {}
+    sqrs = {}
+    for node in postorder:
+        if not node.children:
+            ntips[node], sums[node], sqrs[node] = 1, 0., 0.
+            continue
+        ntips[node], sums[node], sqrs[node] = 0, 0., 0.
+        for child in node.children:
+            dist = child.dist
+            ntips[node] += ntips[child]
+            sums[node] += sums[child] + ntips[child] * dist
+            sqrs[node] += (
+                sqrs[child] + 2 * dist * sums[child] + 
+                ntips[child] * dist ** 2)
+
+    # preorder: sum and sum of squares of distances to all tips
+    total = ntips[root]
+    allsums = {root: sums[root]}
+    allsqrs = {root: sqrs[root]}
+    best = (np.inf, None, 0.)
+    for node in postorder[::-1]:
+        if node is root:
+            continue
+        parent = node.up
+        dist = node.dist
+
+        # sums of distances from parent to tips below and not below node
+        n1 = ntips[node]
+        n2 = total - n1
+        s1 = sums[node] + n1 * dist
+        q1 = sqrs[node] + 2 * dist * sums[node] + n1 * dist ** 2
+        s2 = allsums[parent] - s1
+        q2 = allsqrs[parent] - q1
+
+        # sums over all tips from node
+        allsums[node] = allsums[parent] + (n2 - n1) * dist
+        allsqrs[node] = (
+            allsqrs[parent] + 2 * dist * (s2 - s1) + total * dist ** 2)
+
+        # a root at x from node (dist - x from parent) has variance 
+        # (a x**2 + b x + c) / total - ((d x + e) / total) ** 2
+        if not n2:
+            continue
+        sa = sums[node]
+        qa = sqrs[node]
+        a = n1 + n2
+        b = 2 * sa - 2 * s2 - 2 * n2 * dist
+        c = qa + q2 + 2 * dist * s2 + n2 * dist ** 2
+        d = n1 - n2
+        e = sa + s2 + n2 * dist
+        aa = a / total - (d / total) ** 2
+        bb = b / total - 2 * d * e / total ** 2
+        cc = c / total - (e / total) ** 2
+        if aa > 0:
+            x = min(max(-bb / (2 * aa), 0.), dist)
+        else:
+            x = (0. if bb >= 0 else dist)
+        var = aa * x ** 2 + bb * x + cc
+        if var < best[0]:
+            best = (var, node, x)
+    return best[1], best[2]
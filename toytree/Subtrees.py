@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+
+"""
+A class object for extracting many induced subtrees from one tree.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from .TreeNode import TreeNode
+from .utils import ToytreeError
+
+
+# sparse table and root dists shared with worker processes (see _init_worker)
+_SHARED = {}
+
+
+class InducedSubtrees:
+    """
+    Precomputes preorder arrays and a sparse table for lowest common ancestor
+    (LCA) queries on a tree once, such that the subtree induced by any subset
+    of k tips can be found in O(k log k). The induced subtree is the minimal
+    tree connecting the selected tips, with unary nodes removed and their
+    edge lengths summed, i.e., the same as the result of drop_tips() on the
+    tips that are not in the subset, but without copying the full tree.
+
+    Parameters:
+    -----------
+    ttree: ToyTree
+        The reference tree from which subtrees will be extracted.
+    """
+    def __init__(self, ttree):
+
+        # the reference tree
+        self.ttree = ttree
+
+        # nodes in preorder, such that ancestors precede descendants
+        self.nodes = list(self.ttree.treenode.traverse("preorder"))
+        self.nnodes = len(self.nodes)
+
+        # arrays indexed by preorder position: parent, depth and root dist
+        self.parent = np.zeros(self.nnodes, dtype=int)
+        self.depth = np.zeros(self.nnodes, dtype=int)
+        self.rootdist = np.zeros(self.nnodes, dtype=float)
+
+        # tipnames map to preorder positions
+        self.tipidx = {}
+
+        # fill the arrays in a single preorder traversal
+        pidx = {}
+        for idx, node in enumerate(self.nodes):
+            pidx[node] = idx
+            if node.is_leaf():
+                self.tipidx[node.name] = idx
+            if node.up is not None and idx:
+                par = pidx[node.up]
+                self.parent[idx] = par
+                self.depth[idx] = self.depth[par] + 1
+                self.rootdist[idx] = self.rootdist[par] + node.dist
+        self.parent[0] = -1
+
+        # sparse table of the position of the min depth over ranges of 2**i
+        self.table = _build_sparse_table(self.depth)
+
+
+    def get_tipidxs(self, tipnames):
+        """
+        Returns sorted unique preorder positions for a list of tipnames.
+        """
+        bad = [i for i in tipnames if i not in self.tipidx]
+        if bad:
+            raise ToytreeError("Sample {} is not in the tree".format(bad))
+        tips = np.unique([self.tipidx[i] for i in tipnames])
+        if tips.size < 2:
+            raise ToytreeError(
+                "An induced subtree requires at least 2 tips: {}"
+                .format(list(tipnames)))
+        return tips
+
+
+    def get_arrays(self, tipnames):
+        """
+        Returns arrays (nodes, parents, dists) describing the subtree induced
+        by a set of tipnames. 'nodes' are preorder positions in the reference
+        tree; 'parents' are the index in 'nodes' of each node's parent (-1
+        for the root); and 'dists' are the summed edge lengths to the parent.
+        """
+        tips = self.get_tipidxs(tipnames)
+        return _induced_arrays(
+            tips, self.parent, self.depth, self.rootdist, self.table)
+
+
+    def get_treenode(self, nodes, parents, dists):
+        """
+        Returns a new TreeNode built from arrays returned by get_arrays().
+        Node features are copied from the reference tree nodes.
+        """
+        newnodes = []
+        for nidx, pidx, dist in zip(nodes, parents, dists):
+            onode = self.nodes[nidx]
+            nnode = TreeNode(name=onode.name, support=onode.support)
+            for feature in onode.features - {"dist", "support", "height"}:
+                if feature != "name":
+                    nnode.add_feature(feature, getattr(onode, feature))
+            if pidx >= 0:
+                nnode.dist = dist
+                newnodes[pidx].add_child(nnode)
+            newnodes.append(nnode)
+        return newnodes[0]
+
+
+    def run(self, tipsets, workers=None):
+        """
+        Returns a list of TreeNodes for the subtrees induced by each tipset.
+        If workers > 1 the arrays for each subtree are computed in parallel
+        in a process pool and the TreeNodes are built from them here.
+        """
+        # convert names to sorted preorder positions and check them
+        tipidxs = [self.get_tipidxs(list(i)) for i in tipsets]
+
+        # compute the subtree arrays, optionally in parallel
+        if workers and workers > 1 and len(tipidxs) > 1:
+            chunksize = max(1, len(tipidxs) // (workers * 4))
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(self.parent, self.depth, self.rootdist, self.table),
+            ) as pool:
+                arrays = list(
+                    pool.map(_worker_arrays, tipidxs, chunksize=chunksize))
+        else:
+            arrays = [
+                _induced_arrays(
+                    tips, self.parent, self.depth, self.rootdist, self.table)
+                for tips in tipidxs
+            ]
+
+        # build trees from the arrays
+        return [self.get_treenode(*i) for i in arrays]
+
+
+
+def _build_sparse_table(depth):
+    """
+    Returns a list of arrays where table[j][i] is the position of the min
+    depth in the range [i, i + 2**j).
+    """
+    table = [np.arange(depth.size)]
+    span = 1
+    while 2 * span <= depth.size:
+        prev = table[-1]
+        left = prev[:-span]
+        right = prev[span:]
+        table.append(np.where(depth[left] <= depth[right], left, right))
+        span *= 2
+    return table
+
+
+def _lca(uidx, vidx, parent, depth, table):
+    """
+    Vectorized LCA of preorder positions uidx < vidx. The shallowest node in
+    the preorder range (u, v] is a child of the LCA on the path to v.
+    """
+    left = uidx + 1
+    size = vidx - left + 1
+    level = np.floor(np.log2(size)).astype(int)
+    lcas = np.zeros(uidx.size, dtype=int)
+    for lev in np.unique(level):
+        mask = level == lev
+        lmin = table[lev][left[mask]]
+        rmin = table[lev][vidx[mask] - (1 << lev) + 1]
+        mins = np.where(depth[lmin] <= depth[rmin], lmin, rmin)
+        lcas[mask] = parent[mins]
+    return lcas
+
+
+def _induced_arrays(tips, parent, depth, rootdist, table):
+    """
+    Returns (nodes, parents, dists) of the subtree induced by the sorted
+    unique preorder positions of tips. The nodes are the tips plus the LCAs
+    of adjacent tips in preorder, and the parent of each node (in preorder)
+    is its LCA with the preceding node.
+    """
+    lcas = _lca(tips[:-1], tips[1:], parent, depth, table)
+    nodes = np.unique(np.concatenate([tips, lcas]))
+    pars = _lca(nodes[:-1], nodes[1:], parent, depth, table)
+    parents = np.concatenate([[-1], np.searchsorted(nodes, pars)])
+    dists = np.concatenate([[0.], rootdist[nodes[1:]] - rootdist[pars]])
+    return nodes, parents, dists
+
+
+def _init_worker(parent, depth, rootdist, table):
+    "store the shared arrays once per worker process"
+    _SHARED["args"] = (parent, depth, rootdist, table)
+
+
+def _worker_arrays(tips):
+    "compute induced subtree arrays in a worker process"
+    return _induced_arrays(tips, *_SHARED["args"])
@@ -0,0 +1,401 @@
+#!/usr/bin/env python
+
+"""
+A class object for mapping support from replicate trees onto a best tree.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+
+from .TreeParser import Newick2TreeNode
+from .CladeCounter import _iter_chunks
+from .utils import ToytreeError
+
+
+# the mapper shared with worker processes (see _init_worker)
+_SHARED = {}
+
+# max number of int32 values in the arrays of one chunk of TBE splits
+MAX_CHUNK = 1 << 22
+
+
+class SupportMapper:
+    """
+    Maps the support of each split of a best tree among replicate trees
+    (e.g., bootstrap trees). Every tree is traversed as if it were rooted
+    on the same tip r, so that each split is the clade on the side that
+    excludes r, and its tips are contiguous in the preorder of the tree.
+    The tips of the best tree are numbered in this order, such that each
+    of its splits is an interval (lo, hi) of tip numbers. A split of a
+    replicate tree is in the best tree if the min and max number of its
+    tips span exactly its size, and then its interval is looked up in a
+    dict, which takes O(n) per replicate tree regardless of its rooting.
+
+    Optionally the transfer bootstrap expectation (TBE; Lemoine et al.
+    2018) is also computed. The transfer distance of a best split to a
+    replicate tree is the min number of tips that must be moved to make
+    it equal to one of its splits. It is computed for all pairs of splits
+    at once from array prefix sums, in chunks, and the TBE of a split with
+    p tips on its smaller side is 1 - distance / (p - 1), averaged among
+    replicates. This takes O(n^2) per replicate but in numpy operations.
+
+    A mapper holds counts in arrays and can be pickled without its best
+    tree, such that replicates can be mapped in chunks by worker processes
+    and the results summed with merge().
+
+    Parameters:
+    -----------
+    best_tree: ToyTree
+        The tree to map support onto. It is unrooted.
+    tbe: bool
+        If True the transfer bootstrap expectation is also computed.
+    """
+    def __init__(self, best_tree, tbe=False):
+
+        # the unrooted best tree, the tip to root on, and its tip numbers
+        self.tree = (best_tree.unroot() if best_tree.is_rooted() else best_tree)
+        self.tbe = tbe
+        self.names = self.tree.get_tip_labels()
+        self.rname = self.names[0]
+        self.ntips = len(self.names)
+        order = [
+            i.name for (i, _) in _rerooted_preorder(
+                self.tree.treenode, self.rname)
+            if i.is_leaf() and i.name != self.rname]
+        self.ndict = {j: i for i, j in enumerate(order)}
+        self.ndict[self.rname] = self.ntips - 1
+
+        # index of each non-trivial split by its interval, and the idx of
+        # the node in the best tree whose edge is the split.
+        self.index = {}
+        idxs = []
+        splits, _ = _get_splits(self.tree.treenode, self.rname, self.ndict)
+        for node, rparent, lo, hi, _, _, _ in splits:
+            self.index[(lo, hi)] = len(idxs)
+            idxs.append(node.idx if node.up is rparent else rparent.idx)
+        self.idxs = np.array(idxs, dtype=int)
+        keys = sorted(self.index, key=self.index.get)
+        self.los = np.array([i[0] for i in keys], dtype=int)
+        self.his = np.array([i[1] for i in keys], dtype=int)
+
+        # number of replicates, and counts and TBE sums of each split
+        self.ntrees = 0
+        self.counts = np.zeros(len(keys), dtype=int)
+        self.tbes = np.zeros(len(keys), dtype=float)
+
+
+    def __getstate__(self):
+        "the best tree is not sent to worker processes"
+        state = self.__dict__.copy()
+        state["tree"] = None
+        return state
+
+
+    def add(self, treenode, ncopies=1):
+        """
+        Maps the splits of one replicate tree onto the best tree.
+
+        Parameters:
+        -----------
+        treenode: TreeNode
+            The root TreeNode of a tree with the same tips as the best tree.
+        ncopies: int
+            Number of times to count the tree, e.g., for duplicate trees.
+        """
+        splits, pos = _get_splits(treenode, self.rname, self.ndict)
+        if len(splits) and len(self.index):
+
+            # splits whose tips span an interval of the same size
+            for _, _, lo, hi, size, _, _ in splits:
+                if hi - lo + 1 == size:
+                    sidx = self.index.get((lo, hi))
+                    if sidx is not None:
+                        self.counts[sidx] += ncopies
+
+            if self.tbe:
+                self.tbes += ncopies * self.get_tbe(splits, pos)
+        self.ntrees += ncopies
+        return self
+
+
+    def add_newick(self, newick, tree_format=0):
+        """
+        Parses a newick string to a TreeNode, without making a ToyTree,
+        and maps its splits onto the best tree.
+
+        Parameters:
+        -----------
+        newick: str
+            A newick string of one tree.
+        tree_format: int
+            ete format of the newick string. Default is 0.
+        """
+        treenode = Newick2TreeNode(newick.strip(), fmt=tree_format)
+        return self.add(treenode.newick_from_string())
+
+
+    def get_tbe(self, splits, pos):
+        """
+        Returns an array with the transfer support (1 - transfer distance
+        / (p - 1)) of each best split to a replicate tree. The tips of each
+        best split are marked by their preorder positions in the replicate
+        tree, and prefix sums over these positions give the size of the
+        intersection of every best split with every replicate split.
+        """
+        ntips = self.ntips
+
+        # replicate splits as intervals of positions
+        firsts = np.array([i[5] for i in splits], dtype=int)
+        lasts = np.array([i[6] for i in splits], dtype=int)
+        rsizes = lasts - firsts + 1
+
+        # best splits sizes and the size of their smaller side
+        sizes = self.his - self.los + 1
+        minor = np.minimum(sizes, ntips - sizes)
+        dists = minor - 1
+
+        tips = np.arange(ntips - 1)
+        nrows = max(1, MAX_CHUNK // max(ntips, len(splits)))
+        for start in range(0, len(sizes), nrows):
+            end = start + nrows
+
+            # mark the tips of each best split at their replicate positions
+            inside = (
+                (tips >= self.los[start:end, None]) &
+                (tips <= self.his[start:end, None]))
+            marks = np.zeros((inside.shape[0], ntips), dtype=np.int32)
+            marks[:, pos + 1] = inside
+            cums = np.cumsum(marks, axis=1)
+
+            # symmetric difference to each replicate split or its complement
+            shared = cums[:, lasts + 1] - cums[:, firsts]
+            diffs = sizes[start:end, None] + rsizes[None, :] - 2 * shared
+            diffs = np.minimum(diffs, ntips - diffs).min(axis=1)
+            dists[start:end] = np.minimum(dists[start:end], diffs)
+        return 1 - dists / (minor - 1)
+
+
+    def merge(self, other):
+        """
+        Adds the counts of another SupportMapper of the same best tree to
+        this one in place and returns this mapper.
+
+        Parameters:
+        -----------
+        other: SupportMapper
+            A mapper of other replicate trees.
+        """
+        if other.index != self.index or other.tbe != self.tbe:
+            raise ToytreeError(
+                "SupportMappers can only be merged if made from the same "
+                "best tree.")
+        self.counts += other.counts
+        self.tbes += other.tbes
+        self.ntrees += other.ntrees
+        return self
+
+
+    def get_tree(self):
+        """
+        Returns a copy of the unrooted best tree with 'support' values (%)
+        on nodes, and 'tbe' values (%) if tbe. Tips and the root have
+        support 100.
+        """
+        if self.tree is None:
+            raise ToytreeError("the best tree is not stored in this copy.")
+        nself = self.tree.copy()
+        ntrees = float(max(self.ntrees, 1))
+        support = dict(zip(self.idxs.tolist(), (100 * self.counts / ntrees)))
+        tbes = dict(zip(self.idxs.tolist(), (100 * self.tbes / ntrees)))
+        for node in nself.treenode.traverse():
+            node.support = int(support.get(node.idx, 100))
+            if self.tbe:
+                node.add_feature("tbe", float(tbes.get(node.idx, 100.)))
+        nself._coords.update()
+        return nself
+
+
+    @classmethod
+    def from_newicks(
+        cls,
+        best_tree,
+        newicks,
+        tree_format=0,
+        tbe=False,
+        workers=None,
+        chunksize=100):
+        """
+        Returns a SupportMapper of replicate trees read one at a time from
+        a file with one newick string per line, or from an iterable of
+        newick strings. Lines without a tree (e.g., nexus headers) are
+        skipped. Trees are parsed and mapped in chunks, in parallel if
+        workers > 1, and chunks are read from the input only as workers
+        become free.
+
+        Parameters:
+        -----------
+        best_tree: ToyTree
+            The tree to map support onto.
+        newicks: str or iterable
+            A file path, or an iterable of newick strings.
+        tree_format: int
+            ete format of the newick strings. Default is 0.
+        tbe: bool
+            If True the transfer bootstrap expectation is also computed.
+        workers: int or None
+            Number of worker processes. If None or 1 trees are mapped in
+            this process.
+        chunksize: int
+            Number of trees sent to a worker at a time.
+        """
+        mapper = cls(best_tree, tbe=tbe)
+
+        # read lines lazily from a file
+        if isinstance(newicks, str):
+            if not os.path.exists(newicks):
+                raise ToytreeError(
+                    "newicks should be a file path or an iterable of newick "
+                    "strings.")
+            with open(newicks, 'r') as infile:
+                return mapper.map_newicks(
+                    infile, tree_format, workers, chunksize)
+        return mapper.map_newicks(newicks, tree_format, workers, chunksize)
+
+
+    def map_newicks(self, newicks, tree_format=0, workers=None, chunksize=100):
+        """
+        Maps each newick string in an iterable onto the best tree, in
+        chunks across worker processes if workers > 1, and returns this
+        mapper. See from_newicks().
+        """
+        lines = (i for i in newicks if "(" in i)
+
+        # map in this process
+        if not workers or workers < 2:
+            for line in lines:
+                self.add_newick(line, tree_format)
+            return self
+
+        # map chunks in workers, keeping at most two chunks per worker
+        # queued, and merge their counts as they return.
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(self.__getstate__(), tree_format),
+        ) as pool:
+            pending = set()
+            for chunk in _iter_chunks(lines, chunksize):
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self.merge(future.result())
+                pending.add(pool.submit(_worker_map, chunk))
+            for future in pending:
+                self.merge(future.result())
+        return self
+
+
+
+def _rerooted_preorder(treenode, rname):
+    """
+    Returns a list of (node, parent) in preorder of a tree traversed as if
+    it were rooted on the tip named rname, where the parent of a node is
+    its neighbor on the path to that tip.
+    """
+    start = None
+    for node in treenode.iter_leaves():
+        if node.name == rname:
+            start = node
+            break
+    if start is None:
+        raise ToytreeError("tip '{}' is not in the tree".format(rname))
+
+    order = []
+    stack = [(start, None)]
+    while stack:
+        node, parent = stack.pop()
+        order.append((node, parent))
+        if node.up is not None and node.up is not parent:
+            stack.append((node.up, node))
+        for child in reversed(node.children):
+            if child is not parent:
+                stack.append((child, node))
+    return order
+
+
+def _get_splits(treenode, rname, ndict):
+    """
+    Returns a list of (node, parent, lo, hi, size, first, last) for each
+    non-trivial split of a tree traversed as if it were rooted on the tip
+    named rname, where lo and hi are the min and max of the numbers of
+    its tips in ndict, and first and last are the min and max of their
+    preorder positions. Nodes with one child in this rooting (e.g., the
+    root of a rooted tree) have the same split as their child and are
+    skipped. Also returns an array with the preorder position of each tip
+    number other than that of rname.
+    """
+    order = _rerooted_preorder(treenode, rname)
+    start = order[0][0]
+    ntips = len(ndict)
+
+    # tip numbers in the order of their preorder positions
+    nums = []
+    for node, _ in order[1:]:
+        if node.is_leaf():
+            try:
+                nums.append(ndict[node.name])
+            except KeyError:
+                raise ToytreeError(
+                    "tip '{}' is not in the best tree".format(node.name))
+    if len(nums) != ntips - 1:
+        raise ToytreeError("trees must have the same tips as the best tree.")
+    pos = np.zeros(ntips - 1, dtype=int)
+    pos[nums] = np.arange(ntips - 1)
+
+    # [lo, hi, size, first, last, nchildren] of each node in postorder
+    stats = {}
+    splits = []
+    npos = ntips - 1
+    for node, parent in reversed(order[1:]):
+        if node.is_leaf():
+            npos -= 1
+            num = nums[npos]
+            stat = [num, num, 1, npos, npos, 0]
+            stats[node] = stat
+        else:
+            stat = stats[node]
+            if stat[5] > 1 and 1 < stat[2] < ntips - 1:
+                splits.append((node, parent) + tuple(stat[:5]))
+
+        # add to the stats of the parent
+        if parent is not start:
+            pstat = stats.get(parent)
+            if pstat is None:
+                stats[parent] = stat[:5] + [1]
+            else:
+                pstat[0] = min(pstat[0], stat[0])
+                pstat[1] = max(pstat[1], stat[1])
+                pstat[2] += stat[2]
+                pstat[3] = min(pstat[3], stat[3])
+                pstat[4] = max(pstat[4], stat[4])
+                pstat[5] += 1
+    return splits, pos
+
+
+def _init_worker(state, tree_format):
+    "store the mapper state and newick format once per worker process"
+    _SHARED["args"] = (state, tree_format)
+
+
+def _worker_map(chunk):
+    "map a chunk of newick strings onto the best tree in a worker process"
+    state, tree_format = _SHARED["args"]
+    mapper = SupportMapper.__new__(SupportMapper)
+    mapper.__dict__.update(state)
+    mapper.ntrees = 0
+    mapper.counts = np.zeros_like(mapper.counts)
+    mapper.tbes = np.zeros_like(mapper.tbes)
+    for newick in chunk:
+        mapper.add_newick(newick, tree_format)
+    return mapper
@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+
+"""
+Cached and vectorized text metrics for tip labels.
+"""
+
+import numpy as np
+import toyplot
+import toyplot.font
+import toyplot.style
+import toyplot.text
+import toyplot.transform
+import toyplot.units
+
+
+# style properties that affect the layout of a single line of text
+LAYOUT_KEYS = (
+    "-toyplot-anchor-shift", "-toyplot-vertical-align", "alignment-baseline",
+    "baseline-shift", "font-family", "font-size",
+    "font-weight", "line-height", "text-anchor",
+)
+
+# max number of cached string widths before the cache is cleared
+MAX_CACHE = 1000000
+
+
+
+class TextMetrics:
+    """
+    Computes text extents the same as toyplot.text.extents(), which lays
+    out every string with reportlab font metrics, but in a few array
+    operations for plain text. The layout of a line of plain text differs
+    among strings only by its width, so the height and anchor offsets are
+    taken from one layout per style, and widths of ASCII strings are sums
+    over a per-character width table of the font. Widths of other strings
+    are measured with the font and cached by (font, size, string), and
+    strings with markup are laid out by toyplot.
+    """
+    def __init__(self):
+        self.fonts = toyplot.font.ReportlabLibrary()
+
+        # (top, bottom, anchor, shift, font style) keyed by style
+        self.layouts = {}
+
+        # integer character widths keyed by font and size
+        self.tables = {}
+
+        # widths in pixels keyed by (font, size, string)
+        self.widths = {}
+
+
+    def get_extents(self, text, angle, style):
+        """
+        Returns (left, right, top, bottom) arrays of text extents relative
+        to the anchor of each string, the same as toyplot.text.extents().
+
+        Parameters:
+        -----------
+        text: list or ndarray
+            Strings to measure.
+        angle: float or ndarray
+            Rotation of each string in degrees.
+        style: dict
+            A toyplot text style.
+        """
+        text = [str(i) for i in text]
+        angle = np.broadcast_to(np.asarray(angle, dtype=float), (len(text),))
+        style = toyplot.style.require(style, toyplot.style.allowed.text)
+        top, bottom, anchor, shift, fstyle = self.get_layout(style)
+
+        # plain text extents from the width of each string
+        width = self.get_widths(text, fstyle)
+        offset = {"start": 0 * width, "middle": -width * 0.5, "end": -width}[anchor]
+        left = offset + shift
+        right = left + width
+        top = np.repeat(top, len(text))
+        bottom = np.repeat(bottom, len(text))
+
+        # empty strings have no extent, markup is laid out by toyplot
+        for idx, string in enumerate(text):
+            if not string:
+                left[idx] = right[idx] = top[idx] = bottom[idx] = 0
+            elif "<" in string or "&" in string:
+                layout = toyplot.text.layout(string, style, self.fonts)
+                left[idx], right[idx] = layout.left, layout.right
+                top[idx], bottom[idx] = layout.top, layout.bottom
+
+        # rotate the corners of each box by its angle
+        corners = np.stack([
+            np.column_stack((left, top)),
+            np.column_stack((right, top)),
+            np.column_stack((right, bottom)),
+            np.column_stack((left, bottom)),
+        ])
+        for theta in np.unique(angle):
+            mask = angle == theta
+            corners[:, mask] = np.matmul(
+                corners[:, mask], toyplot.transform.rotation(theta))
+
+        left = corners[:, :, 0].min(axis=0)
+        right = corners[:, :, 0].max(axis=0)
+        top = -corners[:, :, 1].max(axis=0)
+        bottom = -corners[:, :, 1].min(axis=0)
+        return (left, right, top, bottom)
+
+
+    def get_layout(self, style):
+        """
+        Returns the top, bottom, text anchor, and anchor shift of a line of
+        plain text in this style, and the computed style of its text, from
+        a toyplot layout of a sample string.
+        """
+        key = tuple((i, str(style.get(i))) for i in LAYOUT_KEYS)
+        if key not in self.layouts:
+            layout = toyplot.text.layout("x", style, self.fonts)
+
+            # anchor shift in pixels relative to the font size
+            size = toyplot.units.convert(
+                style.get("font-size", "12px"), target="px", default="px")
+            shift = toyplot.units.convert(
+                style.get("-toyplot-anchor-shift", "0"),
+                target="px", default="px", reference=size)
+            self.layouts[key] = (
+                layout.top,
+                layout.bottom,
+                style.get("text-anchor", "middle"),
+                shift,
+                layout.children[0].children[0].style,
+            )
+        return self.layouts[key]
+
+
+    def get_widths(self, text, style):
+        """
+        Returns an array with the width in pixels of each string in the
+        font of a computed text style.
+        """
+        font = self.fonts.font(style)
+        fkey = (
+            style["font-family"], style.get("font-weight"), style["font-size"])
+
+        # integer widths (1/1000 em) of ASCII characters in this font
+        if fkey not in self.tables:
+            size = toyplot.units.convert(
+                style["font-size"], target="pt", default="px")
+            scale = toyplot.units.convert(
+                0.001 * size, target="px", default="pt")
+            self.tables[fkey] = (size, np.array([
+                int(round(font.width(chr(i)) / scale)) for i in range(128)
+            ]))
+        size, table = self.tables[fkey]
+
+        # sum widths of ASCII strings over the characters of each string
+        encoded = [i.encode("utf-8") for i in text]
+        lengths = np.array([len(i) for i in encoded], dtype=int)
+        codes = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        plain = np.array(
+            [len(i) == len(j) for (i, j) in zip(text, encoded)], dtype=bool)
+        codes = np.minimum(codes, 127)
+        starts = np.cumsum(lengths) - lengths
+        totals = np.add.reduceat(
+            np.append(table[codes], 0), np.minimum(starts, codes.size))
+        totals[lengths == 0] = 0
+
+        # convert from font units to pixels as done by the font
+        widths = np.zeros(len(text))
+        points, inverse = np.unique(totals, return_inverse=True)
+        pixels = np.array([
+            toyplot.units.convert(i * 0.001 * size, target="px", default="pt")
+            for i in points.tolist()
+        ])
+        widths[:] = pixels[inverse]
+
+        # measure other strings with the font and cache them
+        if len(self.widths) > MAX_CACHE:
+            self.widths.clear()
+        for idx in np.flatnonzero(~plain):
+            key = fkey + (text[idx],)
+            if key not in self.widths:
+                self.widths[key] = font.width(text[idx])
+            widths[idx] = self.widths[key]
+        return widths
+
+
+
+# a shared instance so that repeated draws reuse cached metrics
+TEXT_METRICS = TextMetrics()
+
+
+
+class TipLabels(toyplot.mark.Text):
+    """
+    A toyplot Text mark for tip labels that computes its extents, which
+    toyplot uses to fit the axes around the text, with TEXT_METRICS
+    instead of laying out every label. It is rendered as a Text mark.
+
+    Parameters:
+    -----------
+    x, y: ndarray
+        Coordinates of the text anchors.
+    text: list or ndarray
+        Tip label strings.
+    angle: float or ndarray
+        Rotation of the labels in degrees.
+    color: None, str, or ndarray
+        Fill color of each label. If None the style fill is used.
+    style: dict
+        A toyplot text style.
+    """
+    def __init__(self, x, y, text, angle=0, color=None, style=None):
+
+        # a data table with the same columns as made by axes.text()
+        table = toyplot.data.Table()
+        table["x"] = toyplot.require.scalar_vector(x)
+        table["y"] = toyplot.require.scalar_vector(y, table.shape[0])
+        table["text"] = toyplot.broadcast.pyobject(text, table.shape[0])
+        for column in ("x", "y", "text"):
+            table.metadata(column)["toyplot:exportable"] = True
+        table["angle"] = toyplot.broadcast.scalar(angle, table.shape[0])
+        table["opacity"] = toyplot.broadcast.scalar(1.0, table.shape[0])
+        table["title"] = toyplot.broadcast.pyobject(None, table.shape[0])
+
+        # the style fill is drawn over the default color anyway
+        style = toyplot.style.require(style, allowed=toyplot.style.allowed.text)
+        default = style.get("fill")
+        table["fill"] = toyplot.color.broadcast(
+            colors=color,
+            shape=(table.shape[0], 1),
+            default=(toyplot.color.black if default is None else default),
+        )[:, 0]
+
+        super(TipLabels, self).__init__(
+            coordinate_axes=["x", "y"],
+            table=table,
+            coordinates=["x", "y"],
+            text=["text"],
+            angle=["angle"],
+            fill=["fill"],
+            opacity=["opacity"],
+            title=["title"],
+            style=style,
+            annotation=True,
+            filename=None,
+        )
+
+
+    def extents(self, axes):
+        "Returns anchor coordinates and text extents using TEXT_METRICS"
+        axis_map = {j: i for (i, j) in enumerate(self._coordinate_axes)}
+        coordinates = tuple([
+            self._table[self._coordinates[axis_map[axis]]] for axis in axes])
+        extents = TEXT_METRICS.get_extents(
+            self._table[self._text[0]],
+            self._table[self._angle[0]],
+            self._style,
+        )
+        return coordinates, extents
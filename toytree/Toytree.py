@@ -15,8 +15,11 @@ from .TreeParser import TreeParser, FastTreeParser
 from .TreeWriter import NewickWriter
 from .Treemod import TreeMod
 from .PCM import PCM
-from .Rooter import Rooter
+from .Rooter import (
+    Rooter, reroot, iter_root_edges, get_midpoint_edge, get_min_var_edge)
 from .NodeAssist import NodeAssist
+from .Subtrees import InducedSubtrees
+from .Quartets import Quartets
 from .utils import ToytreeError, fuzzy_match_tipnames, normalize_values
 
 
@@ -67,6 +70,9 @@ class ToyTree(object):
         else:
             self.treenode = TreeNode()
 
+        # incremented by modifications that do not call _coords.update()
+        self._version = 0
+
         # set tips order if fixing for multi-tree plotting (default None)
         self._fixed_order = None
         self._fixed_idx = list(range(self.ntips))
@@ -118,7 +124,9 @@ class ToyTree(object):
                     "fixed_order must include same tipnames as tree")
             self._fixed_order = fixed_order
             names = self.treenode.get_leaf_names()[::-1]
-            self._fixed_idx = [names.index(i) for i in self._fixed_order]
+            nidxs = {j: i for (i, j) in enumerate(names)}
+            self._fixed_idx = [nidxs[i] for i in self._fixed_order]
+            self._version += 1
 
     # --------------------------------------------------------------------
     # properties are not changeable by the user
@@ -481,8 +489,8 @@ class ToyTree(object):
         if idx:
             treenode = self.treenode.search_nodes(idx=idx)[0]
             if self._fixed_order:
-                return [i for i in self._fixed_order if i in 
-                        treenode.get_leaf_names()]
+                names = set(treenode.get_leaf_names())
+                return [i for i in self._fixed_order if i in names]
             else:
                 return treenode.get_leaf_names()[::-1]                
         else:
@@ -579,6 +587,9 @@ class ToyTree(object):
                 for key, val in values.items():
                     node = ndict[key]
                     node.add_feature(feature, val)
+
+        # values such as 'dist' or 'name' can change the cached coords
+        nself._version += 1
         return nself
 
 
@@ -610,6 +621,23 @@ class ToyTree(object):
             return bool(ctn2 == -1 + sum(1 for i in self.treenode.traverse()))
         return bool(ctn2 == sum(1 for i in self.treenode.traverse()))
 
+    def quartet_distance(self, other, normalize=False):
+        """
+        Returns the quartet distance between this tree and another
+        bifurcating tree with the same tips, i.e., the number of four-tip
+        subtrees with a different topology in the two trees. Rooting is
+        ignored. Quartets are counted without enumerating them, in O(n^2)
+        time (see Quartets).
+
+        Parameters:
+        -----------
+        other: ToyTree
+            A tree with the same tip labels.
+        normalize: bool
+            If True the distance is divided by the number of quartets.
+        """
+        return Quartets(self).get_distance(other.treenode, normalize)
+
     # --------------------------------------------------------------------
     # functions to modify the ete3 tree - MUST CALL ._coords.update()
     # --------------------------------------------------------------------
@@ -656,16 +684,13 @@ class ToyTree(object):
         # example:
         ptre = tre.drop_tips(['a', 'b'])
         """
-        # make a deepcopy of the tree
-        nself = self.copy()
-
-        # return if nothing to drop
+        # return a deepcopy if nothing to drop
         if not any([names, wildcard, regex]):
-            return nself
+            return self.copy()
 
         # get matching names list with fuzzy match
-        nas = NodeAssist(nself, names, wildcard, regex)
-        tipnames = nas.get_tipnames()
+        nas = NodeAssist(self, names, wildcard, regex)
+        tipnames = set(nas.get_tipnames())
         # tipnames = fuzzy_match_tipnames(
         #     ttree=nself,
         #     names=names,
@@ -675,18 +700,56 @@ class ToyTree(object):
         #     mono=False,
         # )
 
-        if len(tipnames) == len(nself):
+        if len(tipnames) == len(self):
             raise ToytreeError("You cannot drop all tips from the tree.")
 
         if not tipnames:
             raise ToytreeError("No tips selected.")
 
-        keeptips = [i for i in nself.get_tip_labels() if i not in tipnames]
+        # copy only the part of the treenode that connects the kept tips 
+        # and the rest of the ToyTree, then prune in a single pass.
+        keeptips = [
+            i for i in self.treenode.get_leaves() if i.name not in tipnames]
+        treenode = self.treenode._induced_copy(keeptips)
+        nself = deepcopy(self, {id(self.treenode): treenode})
+        keeptips = [i for i in nself.treenode.get_leaves()]
         nself.treenode.prune(keeptips, preserve_branch_length=True)
         nself._coords.update()
         return nself
 
 
+    def induced_subtrees(self, tipsets, workers=None):
+        """
+        Returns a MultiTree with the subtree induced by each set of tipnames
+        in tipsets, i.e., the tree connecting only those tips with edge 
+        lengths preserved. This gives the same topology and edge lengths as
+        calling drop_tips() for each set, but the tree is only traversed 
+        once, and each subtree is then built in O(k log k) for k tips.
+
+        Parameters:
+        -----------
+        tipsets: list
+            A list of lists of tipnames. Each must contain at least 2 tips.
+        workers: int or None
+            If > 1 then subtrees are computed in parallel on this many 
+            processes. 
+
+        # example:
+        mtre = tre.induced_subtrees([['a', 'b', 'c'], ['a', 'c', 'd']])
+        """
+        from .Multitree import MultiTree
+
+        # the new treenodes are not connected to self, so no need to copy
+        trees = []
+        for treenode in InducedSubtrees(self).run(tipsets, workers):
+            tree = ToyTree()
+            tree.treenode = treenode
+            tree.treenode.ladderize()
+            tree._coords.update()
+            trees.append(tree)
+        return MultiTree(trees)
+
+
     # TODO: could swap or reverse .children node attr to swap_children & update
     def rotate_node(
         self, 
@@ -838,6 +901,80 @@ class ToyTree(object):
         return rooter.tree    
 
 
+    def root_midpoint(self, edge_features=["support"]):
+        """
+        Returns a copy of the tree rooted at the midpoint of the longest path
+        between any two tips. The midpoint is found in linear time with a
+        postorder and a preorder pass over the tree.
+
+        Parameters:
+        -----------
+        edge_features: (list) (default=["support"])
+            Node labels treated as edge labels, see root().
+        """
+        return self._root_on_edge(get_midpoint_edge, edge_features)
+
+
+    def root_min_var(self, edge_features=["support"]):
+        """
+        Returns a copy of the tree rooted at the position that minimizes the 
+        variance of root-to-tip distances (minimum variance rooting). This 
+        is found in linear time from the sums and sums of squares of tip 
+        distances computed in a postorder and a preorder pass over the tree.
+
+        Parameters:
+        -----------
+        edge_features: (list) (default=["support"])
+            Node labels treated as edge labels, see root().
+        """
+        return self._root_on_edge(get_min_var_edge, edge_features)
+
+
+    def _root_on_edge(self, func, edge_features):
+        "Returns a copy rooted at (node, dist) returned by func(tree)."
+        if not edge_features:
+            edge_features = []
+        if isinstance(edge_features, (str, int, float)):
+            edge_features = [edge_features]
+        if self.ntips < 2:
+            raise ToytreeError("Tree must have at least 2 tips to be rooted.")
+
+        # reroot a copy in place at the selected point
+        nself = self.copy()
+        node, dist = func(nself)
+        reroot(nself, node, dist, edge_features)
+        nself.treenode.ladderize()
+        nself._coords.update()
+        return nself
+
+
+    def iter_root_edges(self, edge_features=["support"]):
+        """
+        Generator that visits every edge of the tree as a root position, for 
+        example to evaluate rooting criteria over all 2n-3 root placements.
+        The root is moved across one edge at a time, modifying this tree in 
+        place (it is restored when finished), and at each edge it yields a 
+        tuple (node, rootdists) where the tree is rooted on the edge above
+        node at zero distance from node, and rootdists is an array of the 
+        distances from the root to each tip ordered by tip idx. Coordinates
+        are not updated during iteration, so copy the tree to keep or draw it.
+
+        Parameters:
+        -----------
+        edge_features: (list) (default=["support"])
+            Node labels treated as edge labels, see root().
+
+        Example:
+        for node, rootdists in tre.iter_root_edges():
+            print(node.idx, rootdists.var())
+        """
+        if not edge_features:
+            edge_features = []
+        if isinstance(edge_features, (str, int, float)):
+            edge_features = [edge_features]
+        return iter_root_edges(self, edge_features)
+
+
     # --------------------------------------------------------------------
     # Draw functions imported, but docstring here
     # --------------------------------------------------------------------
@@ -944,7 +1081,9 @@ class ToyTree(object):
             values. If False then no hover is shown. If a list or dict
             is provided (which should be in node order) then the values
             will be shown in order. If a dict then labels can be provided
-            as well.
+            as well. If 'json' then the same values as for True are stored
+            once as a compact JSON table keyed by node idx instead of as
+            text on every node, which reduces the size of the HTML.
 
         admixture_edges: [tuple, list]
             Admixture edges will add colored edges to the plot in the style 
@@ -956,10 +1095,11 @@ class ToyTree(object):
         if kwargs.get("ts"):
             tree_style = kwargs.get("ts")
 
-        # pass a copy of this tree so that any mods to .style are not saved
-        nself = deepcopy(self)
+        # copy only the style so that any mods to .style are not saved. The
+        # tree is not copied, Drawing uses a read-only view of it.
+        style = deepcopy(self.style)
         if tree_style:
-            nself.style.update(TreeStyle(tree_style[0]))
+            style.update(TreeStyle(tree_style[0]))
 
         # update kwargs to merge it with user-entered arguments:
         userargs = {
@@ -994,7 +1134,7 @@ class ToyTree(object):
         # update kwargs with userargs, update style w/ kwargs except empty ones
         kwargs.update(userargs)
         censored = {i: j for (i, j) in kwargs.items() if j is not None}
-        nself.style.update(censored)
+        style.update(censored)
 
         # warn user if they entered kwargs that weren't recognized:
         allkeys = list(userargs.keys()) + ["debug", "ts"]
@@ -1004,7 +1144,7 @@ class ToyTree(object):
             print("check the docs, argument names may have changed.")
 
         # Init Drawing class object.
-        draw = Drawing(nself)
+        draw = Drawing(self, style=style)
 
         # Debug returns the object to test with.
         if kwargs.get("debug"):
@@ -8,10 +8,10 @@ from builtins import range, str
 
 import random
 import itertools
+from copy import deepcopy
 
-from hashlib import md5
+from hashlib import blake2b
 from collections import deque
-from functools import cmp_to_key
 
 # from .newick import write_newick  # , read_newick
 from .TreeWriter import NewickWriter
@@ -21,6 +21,11 @@ from .utils import TreeError
 DEFAULT_EDGE_LENGTH = 1.
 DEFAULT_SUPPORT = 0.
 
+# 64-bit values of tip names for topology hashes (see get_topology_hash)
+MASK64 = (1 << 64) - 1
+ROOT_SALT = 0x5BD1E9955BD1E995
+_TIP_VALUES = {}
+
 
 
 
@@ -464,57 +469,102 @@ class TreeNode(object):
 
         """
 
-        def cmp_nodes(x, y):
-            # if several nodes are in the same path of two kept nodes,
-            # only one should be maintained. This prioritize internal
-            # nodes that are already in the to_keep list and then
-            # deeper nodes (closer to the leaves).
-            if n2depth[x] > n2depth[y]:
-                return -1
-            elif n2depth[x] < n2depth[y]:
-                return 1
+        # the selected nodes (seeds) and all nodes to be retained.
+        seeds = set(_translate_nodes(self, *nodes))
+        to_keep = seeds | {self}
+
+        # postorder: count the number of seeds below (not incl.) each node.
+        postorder = list(self.traverse("postorder"))
+        nbelow = {}
+        for node in postorder:
+            nbelow[node] = sum(
+                nbelow[i] + (i in seeds) for i in node.children)
+
+        # Nodes in the path of exactly the same set of (2 or more) seeds form 
+        # a chain, in which a child continues the chain of its parent if it 
+        # is not a seed and has the same number of seeds below it. Only one
+        # node from each chain is retained: none if it already contains a 
+        # node in to_keep, else the deepest (closest to the leaves).
+        chain = {}
+        chain_kept = {}
+        chain_deepest = {}
+        for node in self.traverse("preorder"):
+            if nbelow[node] < 2:
+                continue
+            parent = node.up
+            if (node is not self) and (node not in seeds) and (
+                    nbelow[parent] == nbelow[node]):
+                chain[node] = chain[parent]
             else:
-                return 0
-
-        to_keep = set(_translate_nodes(self, *nodes))
-        start, node2path = self.get_common_ancestor(to_keep, get_path=True)
-        to_keep.add(self)
-
-        # Calculate which kept nodes are visiting the same nodes in
-        # their path to the common ancestor.
-        n2count = {}
-        n2depth = {}
-        for seed, path in node2path.items():
-            for visited_node in path:
-                if visited_node not in n2depth:
-                    depth = visited_node.get_distance(start, topology_only=True)
-                    n2depth[visited_node] = depth
-                if visited_node is not seed:
-                    n2count.setdefault(visited_node, set()).add(seed)
-
-        # if several internal nodes are in the path of exactly the same kept
-        # nodes, only one (the deepest) should be maintain.
-        visitors2nodes = {}
-        for node, visitors in n2count.items():
-            # keep nodes connection at least two other nodes
-            if len(visitors)>1:
-                visitor_key = frozenset(visitors)
-                visitors2nodes.setdefault(visitor_key, set()).add(node)
-
-        for visitors, nodes in visitors2nodes.items():
-            if not (to_keep & nodes):
-                sorted_nodes = sorted(nodes, key=cmp_to_key(cmp_nodes))
-                to_keep.add(sorted_nodes[0])
-
-        for n in self.get_descendants('postorder'):
-            if n not in to_keep:
-                if preserve_branch_length:
-                    if len(n.children) == 1:
-                        n.children[0].dist += n.dist
-                    elif len(n.children) > 1 and n.up:
-                        n.up.dist += n.dist
-
-                n.delete(prevent_nondicotomic=False)
+                chain[node] = node
+            cid = chain[node]
+            chain_kept[cid] = chain_kept.get(cid, False) or (node in to_keep)
+            chain_deepest[cid] = node
+
+        for cid, kept in chain_kept.items():
+            if not kept:
+                to_keep.add(chain_deepest[cid])
+
+        # postorder: rebuild children lists in bulk. Children of removed nodes
+        # are transferred to the next retained parent (appended after its 
+        # retained children), and edge lengths of removed nodes are summed 
+        # into the edge of their single child, or of their parent.
+        for node in postorder:
+            kept = [i for i in node.children if i in to_keep]
+            moved = []
+            for child in node.children:
+                if child not in to_keep:
+                    moved.extend(child.children)
+                    child.up = None
+            for child in moved:
+                child.up = node
+            node.children = kept + moved
+
+            if node not in to_keep and preserve_branch_length:
+                if len(node.children) == 1:
+                    node.children[0].dist += node.dist
+                elif len(node.children) > 1 and node.up:
+                    node.up.dist += node.dist
+
+
+    def _induced_copy(self, nodes):
+        """
+        Returns a copy of this node (as root) and of only the nodes that lie
+        on the paths connecting it to the entered nodes, i.e., subtrees that
+        do not contain any of the nodes are skipped. This is much faster 
+        than a deepcopy of a large tree when the copy will then be pruned 
+        to the entered nodes, since the skipped subtrees would be removed.
+
+        Parameters:
+        -----------
+        nodes: 
+            a list of node instances that are descendants of this node.
+        """
+        # mark nodes on the paths from each node up to self
+        onpath = {self}
+        for node in nodes:
+            while node not in onpath:
+                onpath.add(node)
+                node = node.up
+
+        # copy node attributes (except parent and children) in preorder 
+        copies = {}
+        skip = (lambda x: x not in onpath)
+        for node in self.traverse("preorder", is_leaf_fn=skip):
+            if node not in onpath:
+                continue
+            nnode = node.__class__()
+            for key, val in node.__dict__.items():
+                if key in ("_up", "_children"):
+                    continue
+                if not isinstance(val, (str, int, float, type(None))):
+                    val = deepcopy(val)
+                nnode.__dict__[key] = val
+            copies[node] = nnode
+            if node is not self:
+                nnode.up = copies[node.up]
+                nnode.up.children.append(nnode)
+        return copies[self]
 
 
     def swap_children(self):
@@ -1448,6 +1498,9 @@ class TreeNode(object):
         --------
         (rf, rf_max, common_attrs, names, edges_t1, edges_t2, 
          discarded_edges_t1, discarded_edges_t2)
+
+        To compare one tree to many others use RobinsonFoulds(t1, t2)
+        and its compare() function, which reuses the splits of t1.
         """
         rf = RobinsonFoulds(
             self, t2, 
@@ -1682,6 +1735,103 @@ class TreeNode(object):
     #                      preserve_branch_length=preserve_branch_length)
 
 
+    def _get_clade_values(self, attr="name"):
+        """
+        Returns dicts with the sum (mod 2^64) of the pseudo-random 64-bit
+        values of the tips of each node, hashed from their attr, and with
+        the number of tips of each node, computed in one pass over nodes
+        in reverse preorder, such that children come first.
+        """
+        values = {}
+        sizes = {}
+        for node in reversed(list(self.traverse("preorder"))):
+            children = node._children
+            if children:
+                value = size = 0
+                for child in children:
+                    value += values[child]
+                    size += sizes[child]
+                values[node] = value & MASK64
+                sizes[node] = size
+            else:
+                values[node] = _get_tip_value(getattr(node, attr))
+                sizes[node] = 1
+        return values, sizes
+
+
+    def get_split_hashes(self, unrooted=False, attr="name"):
+        """
+        Returns a set of 64-bit int hashes of the clades of all nodes in 
+        the tree, including tips and the root, or if unrooted, of the splits
+        of all edges, including tip edges, where each split is keyed by the
+        smaller of the hashes of its two sides. Two trees share a clade or
+        split if they share its hash. The hash of a clade is the sum of the 
+        pseudo-random 64-bit values of its tips hashed from their attr.
+
+        Parameters:
+        -----------
+        unrooted: bool
+            If True return hashes of unrooted splits.
+        attr: str
+            Node attribute of tips to hash. Default is "name".
+        """
+        values, sizes = self._get_clade_values(attr)
+        if not unrooted:
+            return set(values.values())
+
+        total = values[self]
+        ntips = sizes[self]
+        keys = set()
+        for node, value in values.items():
+            if sizes[node] < ntips:
+                other = (total - value) & MASK64
+                keys.add(value if value < other else other)
+        return keys
+
+
+    def get_topology_hash(self, unrooted=False, attr="name"):
+        """
+        Returns a 64-bit int hash of the topology of the tree, computed in
+        one postorder pass. Each tip has a pseudo-random 64-bit value hashed
+        from its attr, and the value of a clade is the sum of the values of
+        its tips (mod 2^64). A split is keyed by the smaller of the values
+        of its two sides, and the hash is the sum of the mixed keys of the 
+        unique non-trivial splits and of the set of tips. It does not depend
+        on the order of children, on unary nodes, or on where a polytomy at
+        the root is placed. If the root is bifurcating the split at the root
+        is also added, such that trees rooted on different edges differ,
+        unless unrooted=True.
+
+        Parameters:
+        -----------
+        unrooted: bool
+            If True the rooting of the tree is ignored.
+        attr: str
+            Node attribute of tips to hash. Default is "name".
+        """
+        values, sizes = self._get_clade_values(attr)
+        total = values[self]
+        ntips = sizes[self]
+
+        # unique non-trivial splits keyed by their smaller side value
+        keys = set()
+        for node, value in values.items():
+            if 1 < sizes[node] < ntips - 1:
+                other = (total - value) & MASK64
+                keys.add(value if value < other else other)
+
+        hashed = _mix64(total)
+        for key in keys:
+            hashed += _mix64(key)
+
+        # the split at a bifurcating root
+        if len(self._children) == 2 and not unrooted:
+            value = values[self._children[0]]
+            key = min(value, (total - value) & MASK64)
+            hashed += _mix64(key ^ ROOT_SALT)
+        return hashed & MASK64
+
+
     def get_topology_id(self, attr="name"):
         """
         Returns the unique ID representing the topology of the current tree. 
@@ -1693,14 +1843,10 @@ class TreeNode(object):
         of trees, without requiring full distance methods.
 
         The id is, by default, calculated based on the terminal node's names. 
-        Any other node attribute could be used instead.
+        Any other node attribute could be used instead. It is a hex string of
+        the hash from get_topology_hash().
         """
-        edge_keys = []
-        for s1, s2 in self.get_edges():
-            k1 = sorted([getattr(e, attr) for e in s1])
-            k2 = sorted([getattr(e, attr) for e in s2])
-            edge_keys.append(sorted([k1, k2]))
-        return md5(str(sorted(edge_keys)).encode('utf-8')).hexdigest()
+        return "{:016x}".format(self.get_topology_hash(attr=attr))
 
 
     # ################# useful
@@ -2026,3 +2172,22 @@ def _translate_nodes(root, *nodes):
         return valid_nodes[0]
     else:
         return valid_nodes
+
+
+
+def _get_tip_value(name):
+    "Returns a pseudo-random 64-bit int for a tip name, cached by name"
+    value = _TIP_VALUES.get(name)
+    if value is None:
+        digest = blake2b(str(name).encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        _TIP_VALUES[name] = value
+    return value
+
+
+def _mix64(value):
+    "Returns a 64-bit int with the bits of value mixed (splitmix64)"
+    value = (value + 0x9E3779B97F4A7C15) & MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK64
+    return value ^ (value >> 31)
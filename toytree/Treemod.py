@@ -141,4 +141,5 @@ class TreeMod:
                 "Strategy {} not yet implemented. Seeking developers."
                 .format(strategy))
 
+        ctree._coords.update()
         return ctree
@@ -7,6 +7,7 @@ from .Toytree import ToyTree as tree
 from .Toytree import RawTree as _rawtree
 from .Randomtree import RandomTree as rtree
 from .Multitree import MultiTree as mtree
+from .CladeCounter import CladeCounter as cladecounter
 from .Container import Container as container
 from .PCM import PCM as pcm
 
@@ -1,951 +1,569 @@
 #!/usr/bin/env python
 
-from __future__ import division, absolute_import
-
-import xml.etree.ElementTree as xml
-import functools
-import itertools
-import numpy
-
-from multipledispatch import dispatch
-from .Toytree import ToyTree
-import toyplot.coordinates
-import toyplot.canvas
-import toyplot.color
-import toyplot.mark
-import toyplot.marker
-from toyplot.html import RenderContext, _color_fixup
-from toyplot.html import _render_table
-
-
-"""Functions to render HTML markup."""
-
 """
-See sandbox/ArcEdges
-
-        # plan for storing tuple coords as in toyplot
-         M (x, y)  A (r, s), (x, y)
-
-        # formatting a string with dict seems easiest
-         M x y A r  r  - - s  x   y   
-
-# the arc format
-<path d="M 0 0 A 50 50 0 0 1 100 100"/>
-
+A native SVG renderer for drawing very large trees.
+
+Drawing a tree with toyplot creates one SVG element per edge and tip
+label. The renderer here resolves the same drawing attributes as Drawing
+(layout, edge and node colors, sizes, tip label styles) but writes the
+SVG markup itself: edges are merged into a few <path> elements grouped by
+style, node markers are merged into paths grouped by shape and color, tip
+labels are written as runs of <tspan> elements inside a single <text>
+element per color, and shared styles are written once as CSS classes.
+The markup is streamed to a file handle in chunks.
+
+Node hover, admixture edges and the scalebar are not drawn by this
+renderer, use ToyTree.draw() for these.
 """
 
-_namespace = dict()
-
-#: Decorator for registering custom rendering code.
-#:
-#: This is only of use when creating your own custom Toyplot marks.  It is
-#: not intended for end-users.
-#:
-#: Example
-#: -------
-#: To register your own rendering function::
-#:
-#:     @toyplot.html.dispatch(toyplot.coordinates.Cartesian, MyCustomMark, toyplot.html.RenderContext)
-#:     def _render(axes, mark, context):
-#:         # Rendering implementation here
-dispatch = functools.partial(dispatch, namespace=_namespace)
-
-
-# ## get canvas instance
-# canvas = toyplot.require.instance(c, toyplot.canvas.Canvas)
-# canvas.autorender(False)
-# # make top-level HTML element
-# root_xml = xml.Element(
-#     'div',
-#     attrib={"class": "toyplot"},
-#     id="t" + uuid.uuid4().hex,
-#     )
-# # Register a Javascript module to keep track of the root id
-# context = RenderContext(root=root_xml)
-# context.define("toyplot/root/id", value=root_xml.get("id"))
-# context.define(
-#     "toyplot/root",
-#     ["toyplot/root/id"],
-#     factory="""function(root_id){return document.querySelector("#" + root_id)};""")
-# mark = M
-# axes = a
-
-
-
-# toytree Marker object which has a custom render function below.
-# The init function for creating a Toytree Mark is similar to what
-# used to be in the draw() function.
-class Toytree(toyplot.mark.Mark):
-    def __init__(self, newick):
-        #super(Toytree, self).__init__()
-        toyplot.mark.Mark.__init__(self)
-
-        self.toytree = ToyTree(newick)
-        self.markers = []
-        edge_marker = get_edge_mark(self.toytree)
-        #text_marker = get_text_mark(self.toytree)
-        #node_marker = get_node_mark(self.toytree)
-        #etip_marker = get_etip_mark(self.toytree)
-        for marker in [edge_marker, ]:  # text_marker, node_marker, etip_marker]:
-            if marker:
-                self.markers.append(marker)
-
-
-        self._coordinates = toyplot.require.string_vector(coordinate_axes)
-
-    # domain is the tree/edge domain
-    def domain(self, axis):
-        return self.markers[0].domain(axis)
-        # if axis == "x":
-        #   ## max should fit tip names
-        #       return toyplot.data.minimax(self._toytree.verts[:, 0])
-        # else:
-        #   return toyplot.data.minimax(self._toytree.verts[:, 1])
-
-    # Entents depends on tree orientation, since we extend for text direction
-    def extents(self, axes):
-        extents = toyplot.text.extents(
-            self._table[self._text[0]],
-            self._table[self._angle[0]],
-            self._style)
-        return coordinates, extents
-
-
-
-## tip names text
-def get_text_mark(ttree):
-    """ makes a simple Text Mark object"""
-    
-    if ttree._layout in ["right"]:
-        angle = 0.
-        ypos = ttree.verts[-1*len(ttree.tree):, 1]
-        if ttree._kwargs["tip_labels_align"]:
-            xpos = [ttree.verts[:, 0].max()] * len(ttree.tree)
-            start = xpos
-            finish = ttree.verts[-1*len(ttree.tree):, 0]
-            align_edges = np.array([(i, i+len(xpos)) for i in range(len(xpos))])
-            align_verts = np.array(zip(start, ypos) + zip(finish, ypos))
-        else:
-            xpos = ttree.verts[-1*len(ttree.tree):, 0]
-            
-    elif ttree._layout in ['down']:
-        angle = -90.
-        xpos = ttree.verts[-1*len(ttree.tree):, 0]
-        if ttree._kwargs["tip_labels_align"]:
-            ypos = [ttree.verts[:, 1].min()] * len(ttree.tree)
-            start = ypos
-            finish = ttree.verts[-1*len(ttree.tree):, 1]
-            align_edges = np.array([(i, i+len(ypos)) for i in range(len(ypos))])
-            align_verts = np.array(zip(xpos, start) + zip(xpos, finish))
+import io
+import uuid
+from copy import deepcopy
+from xml.sax.saxutils import escape
+
+import numpy as np
+import toyplot
+
+from .Drawing import Drawing
+from .TextMetrics import TEXT_METRICS
+from .TreeStyle import TreeStyle
+from .utils import ToytreeError
+
+
+# number of edges or labels formatted per write to the file handle
+CHUNKSIZE = 20000
+
+
+
+class TreeRenderer:
+    """
+    Resolves the drawing attributes of a tree for a style and projects its
+    edges, nodes and tip labels to pixel coordinates, which are then written
+    as SVG by write_svg(). The tree is not copied or modified.
+
+    Parameters:
+    -----------
+    ttree: ToyTree
+        The tree to render.
+    style: TreeStyle (optional)
+        A style to render the tree with, default is a copy of ttree.style.
+    """
+    def __init__(self, ttree, style=None):
+
+        # a Drawing resolves styles and colors on a read-only tree view
+        self.drawing = Drawing(ttree, style=style)
+        self.style = self.drawing.style
+
+        # canvas size in pixels
+        self.width = 0
+        self.height = 0
+
+        # projected geometry filled by update()
+        self.edges = None
+        self.edge_groups = []
+        self.align = None
+        self.nodes = None
+        self.node_groups = []
+        self.node_labels = []
+        self.tips = None
+        self.tip_angles = None
+        self.tip_anchors = None
+        self.tip_labels = []
+        self.tip_colors = []
+
+        # resolve all attributes
+        self.update()
+
+
+    def update(self):
+        "Resolves drawing attributes and projects the geometry to pixels"
+        draw = self.drawing
+
+        # the same attribute steps as Drawing.update(), without toyplot marks
+        draw.check_layout()
+        if self.style.layout not in ("r", "l", "u", "d", "c"):
+            raise ToytreeError(
+                "unsupported layout: {}. The SVG renderer draws layouts "
+                "'r', 'l', 'u', 'd' and 'c'.".format(self.style.layout))
+        draw.coords.update_layout()
+        draw.assign_tip_labels_and_colors()
+        draw.get_dims_from_tree_size()
+        if not draw.ttree.treenode.children:
+            raise ToytreeError("Tree is empty")
+        draw.set_baselines()
+        draw.assign_node_labels_and_sizes()
+        draw.assign_node_colors_and_style()
+        draw.assign_edge_colors_and_widths()
+        self.width = int(self.style.width)
+        self.height = int(self.style.height)
+
+        # edge segments in data coordinates and the edge row of each one
+        coords = draw.coords
+        if self.style.edge_type == "c":
+            segments = coords.verts[coords.edges]
+            eidxs = np.arange(coords.edges.shape[0])
         else:
-            ypos = ttree.verts[-1*len(ttree.tree):, 1]
-    
-    table = toyplot.data.Table()
-    table['x'] = toyplot.require.scalar_vector(xpos)
-    table['y'] = toyplot.require.scalar_vector(ypos, table.shape[0])
-    table['text'] = toyplot.broadcast.pyobject(ttree.get_tip_labels(), table.shape[0])
-    table["angle"] = toyplot.broadcast.scalar(angle, table.shape[0])
-    table["opacity"] = toyplot.broadcast.scalar(1.0, table.shape[0])
-    table["title"] = toyplot.broadcast.pyobject(None, table.shape[0])
-    style = toyplot.style.require(ttree._kwargs["tip_labels_style"],
-                                  allowed=toyplot.style.allowed.text)
-    default_color = [toyplot.color.black]
-    color = toyplot.color.broadcast(
-        colors=ttree._kwargs["tip_labels_color"],
-        shape=(table.shape[0], 1),
-        default=default_color,
+            segments = coords.coords[coords.lines]
+            eidxs = coords.lines_eidx
+
+        # aligned tip label lines
+        _, _, aedges, averts = draw.get_tip_label_coords()
+        align = (None if aedges is None else averts[aedges])
+
+        # tip label anchors in data coordinates
+        tips, angles, anchors = self.get_tip_anchors()
+
+        # project all geometry to pixels
+        project = self.get_projection(segments, tips)
+        self.edges = project(segments.reshape(-1, 2)).reshape(-1, 4)
+        if align is not None:
+            self.align = project(align.reshape(-1, 2)).reshape(-1, 4)
+        self.nodes = project(coords.verts)
+        self.tips = project(tips)
+        self.tip_angles = angles
+        self.tip_anchors = anchors
+
+        # group edge segments by (color, width)
+        self.edge_groups = group_by(
+            list(zip(
+                [to_css(i) for i in draw.edge_colors],
+                draw.edge_widths,
+            )),
+            eidxs,
         )
-    table["fill"] = color[:, 0]
-    
-    text_mark = toyplot.mark.Text(
-        coordinate_axes=['x', 'y'],
-        table=table,
-        coordinates=['x', 'y'],
-        text=["text"],
-        angle=["angle"],
-        fill=["fill"],
-        opacity=["opacity"],
-        title=["title"],
-        style=style,
-        annotation=True,
-        filename=None
-        )
-    return text_mark
-
 
-## toytree uses edges, no need for vertices
-def get_edge_mark(ttree):
-    """ makes a simple Graph Mark object"""
-
-    # tree style
-    if ttree.style.edge_type == "c":
-        a = ttree._coords.edges
-        vcoordinates = ttree._coords.verts
-    else:
-        a = ttree._coords.lines               
-        vcoordinates = ttree._coords.coords 
-   
-    # fixed args
-    along = 'x'
-    vmarker = 'o'
-    vcolor=None
-    vlshow=False            
-    vsize=0.         
-    estyle=ttree._kwargs["edge_style"]
-
-
-    # get axes
-    layout = toyplot.layout.graph(a, vcoordinates=vcoordinates)
-    along = toyplot.require.value_in(along, ["x", "y"])
-    if along == "x":
-        coordinate_axes = ["x", "y"]
-    elif along == "y":
-        coordinate_axes = ["y", "x"]
-        
-    ## broadcast args along axes
-    vlabel = layout.vids
-    vmarker = toyplot.broadcast.pyobject(vmarker, layout.vcount)
-    vsize = toyplot.broadcast.scalar(vsize, layout.vcount)
-    estyle = toyplot.style.require(estyle, allowed=toyplot.style.allowed.line)
-
-    ## fixed args
-    vcolor = toyplot.color.broadcast(colors=None, shape=layout.vcount, default=toyplot.color.black)
-    vopacity = toyplot.broadcast.scalar(1.0, layout.vcount)
-    vtitle = toyplot.broadcast.pyobject(None, layout.vcount)
-    vstyle = None
-    vlstyle = None
-    
-    ## this could be modified in the future to allow diff color edges
-    ecolor = toyplot.color.broadcast(colors=None, shape=layout.ecount, default=toyplot.color.black)
-    ewidth = toyplot.broadcast.scalar(1.0, layout.ecount)
-    eopacity = toyplot.broadcast.scalar(1.0, layout.ecount)
-    hmarker = toyplot.broadcast.pyobject(None, layout.ecount)
-    mmarker = toyplot.broadcast.pyobject(None, layout.ecount)
-    mposition = toyplot.broadcast.scalar(0.5, layout.ecount)
-    tmarker = toyplot.broadcast.pyobject(None, layout.ecount)
-    
-    ## tables are required if I don't want to edit the class
-    vtable = toyplot.data.Table()
-    vtable["id"] = layout.vids
-    for axis, coordinates in zip(coordinate_axes, layout.vcoordinates.T):
-        vtable[axis] = coordinates
-        #_mark_exportable(vtable, axis)
-    vtable["label"] = vlabel
-    vtable["marker"] = vmarker
-    vtable["size"] = vsize
-    vtable["color"] = vcolor
-    vtable["opacity"] = vopacity
-    vtable["title"] = vtitle
-
-    etable = toyplot.data.Table()
-    etable["source"] = layout.edges.T[0]
-    #_mark_exportable(etable, "source")
-    etable["target"] = layout.edges.T[1]
-    #_mark_exportable(etable, "target")
-    etable["shape"] = layout.eshapes
-    etable["color"] = ecolor
-    etable["width"] = ewidth
-    etable["opacity"] = eopacity
-    etable["hmarker"] = hmarker
-    etable["mmarker"] = mmarker
-    etable["mposition"] = mposition
-    etable["tmarker"] = tmarker
-    
-    edge_mark = toyplot.mark.Graph(
-        coordinate_axes=['x', 'y'],
-        ecolor=["color"],
-        ecoordinates=layout.ecoordinates,
-        efilename=None,
-        eopacity=["opacity"],
-        eshape=["shape"],
-        esource=["source"],
-        estyle=estyle,
-        etable=etable,
-        etarget=["target"],
-        ewidth=["width"],
-        hmarker=["hmarker"],
-        mmarker=["mmarker"],
-        mposition=["mposition"],
-        tmarker=["tmarker"],
-        vcolor=["color"],
-        vcoordinates=['x', 'y'],
-        vfilename=None,
-        vid=["id"],
-        vlabel=["label"],
-        vlshow=False,
-        vlstyle=None,
-        vmarker=["marker"],
-        vopacity=["opacity"],
-        vsize=["size"],
-        vstyle=None,
-        vtable=vtable,
-        vtitle=["title"],
-        )
-    return edge_mark
-
-
-## nodes on tree
-def get_node_mark(ttree):
-    return
-
-
-
-
-# this is a hybrid of Toyplot's Graph, Text, and Scatterplot _render
-# functions with just the elements I want selected out. It also
-# makes minifying calls to simplify style dictionaries for shared styles
-@dispatch(toyplot.coordinates.Cartesian, Toytree, RenderContext)
-def _render(axes, mark, context):
-
-    # get dimensions from the Table elements of the Mark
-    dimension1 = numpy.ma.column_stack([
-        mark._table[key] for key in mark._coordinates[0::2]
-    ])
-    dimension2 = numpy.ma.column_stack([
-        mark._table[key] for key in mark._coordinates[1::2]
-    ])
-    X = axes.project("x", dimension1)
-    Y = axes.project("y", dimension2)
-    if mark._coordinate_axes[0] == "y":
-        X = axes.project("x", dimension2)
-        Y = axes.project("y", dimension1)
-
-    # group styles with common values
-    shared_styles, unique_styles = split_styles(mark)
-
-    # create root Mark element
-    mark_xml = xml.SubElement(
-        context.root,  # root_xml,
-        "g",
-        id=context.get_id(mark),
-        attrib={"class": "toyplot-mark-Toytree"},
-    )
-    print(xml.tostring(mark_xml))
-
-    # make list of tuples for each point: (x, y, marker, title)
-    mvectors = [
-        X.T,
-        Y.T,
-        [mark._table[key] for key in mark._marker],
-        [mark._table[key] for key in mark._mtitle],
-    ]
-
-    # for each marker, if not null, make a <g> element 
-    for x, y, marker, mtitle in zip(*mvectors):
-        not_null = numpy.invert(numpy.logical_or(
-            numpy.ma.getmaskarray(x), numpy.ma.getmaskarray(y)))
-
-        # create a Series element to hold all data points
-        series_xml = xml.SubElement(
-            mark_xml,
-            "g",
-            attrib={
-                "class": "toyplot-Series",
-                "style": shared_styles,
-            },
-        )
-        print(xml.tostring(series_xml))
-        print("")
-
-        # subselect markers for missing data
-        vals = [
-            itertools.count(step=1),
-            x[not_null],
-            y[not_null],
-            marker[not_null],
-            mtitle[not_null],
+        # group visible nodes by (shape, color)
+        nidxs = draw.ttree.get_node_values("idx", 1, 1)
+        visible = [
+            i for i in range(len(nidxs))
+            if draw.node_labels[nidxs[i]] or draw.node_sizes[nidxs[i]]
+        ]
+        keys = [
+            (draw.node_markers[nidxs[i]], to_css(draw.node_colors[nidxs[i]]))
+            for i in range(len(nidxs))
         ]
-        for idx, dx, dy, dmarker, dtitle in zip(*vals):
-            marker = toyplot.marker.create(
-                size=dmarker.size,
-                shape=dmarker.shape,
-                mstyle=unique_styles["node"][idx],
-                lstyle={},
-                label=dmarker.label)
-            marker_xml = _draw_marker(
-                root=series_xml,
-                marker=marker,
-                cx=dx,
-                cy=dy,
-                extra_class="toyplot-Datum",
-                title=dtitle,
-            )
-            # print xml.tostring(marker_xml)
-            # print ""
-            if marker.label:
-                _draw_text(
-                    root=marker_xml,
-                    text=marker.label,
-                    style=unique_styles['text'][idx],
-                )
-            print(xml.tostring(marker_xml))
-            print("")
-            # create new simplified marker... working off Line 3177 in html.py
-
-
-
-
-
-
-## Currently this clobbers some text styling (e.g., alignment-baseline)
-## during the 'toyplot.text.layout' restyling. Not sure why.
-def split_styles(mark):
-    """ get shared styles """
-    
-    markers = [mark._table[key] for key in mark._marker][0]
-    nstyles = []
-    for m in markers:
-        ## fill and stroke are already rgb() since already in markers
-        msty = toyplot.style.combine({
-            "fill": m.mstyle['fill'],
-            "stroke": m.mstyle['stroke'],
-            "opacity": m.mstyle["fill-opacity"],
-        }, m.mstyle)
-        msty = _color_fixup(msty)
-        nstyles.append(msty)
-    
-    ## uses 'marker.size' so we need to loop over it
-    lstyles = []
-    for m in markers:
-        lsty = toyplot.style.combine({
-            "font-family": "Helvetica",
-            "-toyplot-vertical-align": "middle",
-            "fill": toyplot.color.black,
-            "font-size": "%rpx" % (m.size * 0.75),
-            "stroke": "none",
-            "text-anchor": "middle",
-        }, m.lstyle)
-        ## update fonts
-        fonts = toyplot.font.ReportlabLibrary()
-        layout = toyplot.text.layout(m.label, lsty, fonts)
-        lsty = _color_fixup(layout.style)
-        lstyles.append(lsty)
-    
-    nallkeys = set(itertools.chain(*[i.keys() for i in nstyles]))
-    lallkeys = set(itertools.chain(*[i.keys() for i in lstyles]))
-    nuniquekeys = []
-    nsharedkeys = []
-    for key in nallkeys:
-        vals = [nstyles[i].get(key) for i in range(len(nstyles))]
-        if len(set(vals)) > 1:
-            nuniquekeys.append(key)
+        visible = np.array(visible, dtype=int)
+        self.node_groups = [
+            (key, visible[i]) for (key, i) in group_by(keys, visible)]
+        self.node_sizes = np.array(
+            [float(draw.node_sizes[i]) for i in nidxs], dtype=float)
+        self.node_labels = [str(draw.node_labels[i]) for i in nidxs]
+
+        # tip labels and their colors
+        self.tip_labels = [str(i) for i in draw.tip_labels]
+        if isinstance(self.style.tip_labels_colors, np.ndarray):
+            self.tip_colors = [
+                to_css(i) for i in self.style.tip_labels_colors]
         else:
-            nsharedkeys.append(key)
-    luniquekeys = []
-    lsharedkeys = []
-    for key in lallkeys:
-        vals = [lstyles[i].get(key) for i in range(len(lstyles))]
-        if len(set(vals)) > 1:
-            luniquekeys.append(key)
+            self.tip_colors = [None] * len(self.tip_labels)
+
+
+    def get_tip_anchors(self):
+        """
+        Returns tip label positions in data coordinates, and the text angle
+        and anchor ("start" or "end") of each label, using the same layout
+        rules as Drawing.add_tip_labels_to_axes().
+        """
+        draw = self.drawing
+        ntips = draw.ttree.ntips
+        layout = self.style.layout
+
+        # circular layout: labels radiate out and flip on the left side
+        if layout == "c":
+            if self.style.tip_labels_align:
+                tipcoords = draw.coords.circ.get_tip_end_coords()
+            else:
+                tipcoords = draw.coords.verts[:ntips].copy()
+            tipcoords[:, 0] += self.style.xbaseline
+            tipcoords[:, 1] += self.style.ybaseline
+            angles = draw.coords.circ.get_tip_end_angles() - 0.05
+            radians = abs(draw.coords.circ.tip_radians)
+            mask = (radians > np.pi / 2.) & (radians < 3 * np.pi / 2.)
+            angles[mask] += 180
+            anchors = np.where(mask, "end", "start")
+            return tipcoords, angles, anchors
+
+        # rooted layouts
+        xpos = draw.ttree.get_tip_coordinates("x")
+        ypos = draw.ttree.get_tip_coordinates("y")
+        if layout in ("u", "d"):
+            if draw.ttree._fixed_order:
+                xpos = np.arange(ntips) + self.style.xbaseline
+                ypos = ypos[draw.ttree._fixed_idx]
+            if self.style.tip_labels_align:
+                ypos = np.zeros(ntips)
+            angle = -90.
         else:
-            lsharedkeys.append(key)
-
-    ## keys shared between mark and text markers
-    repeated = set(lsharedkeys).intersection(set(nsharedkeys))
-    for repeat in repeated:
-        ## if same then keep only one copy of it
-        lidx = lsharedkeys.index(repeat)
-        nidx = nsharedkeys.index(repeat)
-        if lsharedkeys[lidx] == nsharedkeys[nidx]:
-            lsharedkeys.remove(repeat)
+            if draw.ttree._fixed_order:
+                xpos = xpos[draw.ttree._fixed_idx]
+                ypos = np.arange(ntips) + self.style.ybaseline
+            if self.style.tip_labels_align:
+                xpos = np.zeros(ntips)
+            angle = 0.
+        anchor = ("end" if layout in ("u", "l") else "start")
+        tipcoords = np.column_stack([xpos, ypos]).astype(float)
+        angles = np.repeat(angle, ntips)
+        anchors = np.repeat(anchor, ntips)
+        return tipcoords, angles, anchors
+
+
+    def get_projection(self, segments, tips):
+        """
+        Returns a function that projects (x, y) data coordinates to pixels.
+        The data range is fit inside the canvas minus padding, space for
+        node markers, and the measured width of the tip labels on the
+        side(s) of the tree that they extend towards.
+        """
+        # the data range of all drawn points
+        points = np.concatenate([segments.reshape(-1, 2), tips])
+        xmin, ymin = points.min(axis=0)
+        xmax, ymax = points.max(axis=0)
+
+        # space for tip labels and for node markers
+        shift, _ = self.get_tip_shift_and_size()
+        widths = self.get_tip_widths()
+        text = (shift + widths.max() if widths.any() else 0)
+        nodes = max(list(self.drawing.node_sizes) + [0]) / 2.
+        pad = float(self.style.padding) + nodes
+
+        # margins (left, right, top, bottom) in pixels
+        margins = [pad, pad, pad, pad]
+        side = {"r": 1, "l": 0, "u": 2, "d": 3}.get(self.style.layout)
+        if side is None:
+            margins = [i + text for i in margins]
         else:
-            lsharedkeys.remove(repeat)
-            luniquekeys.append(repeat)
-            nsharedkeys.remove(repeat)
-            nuniquekeys.append(repeat)
-            
-    ## check node values
-    natt = ["%s:%s" % (key, nstyles[0][key]) for key in sorted(nsharedkeys)]
-    latt = ["%s:%s" % (key, lstyles[0][key]) for key in sorted(lsharedkeys)]
-    shared_styles = ";".join(natt + latt)
-    unique_styles = {
-        "node": [{k: v for k, v in nstyles[idx].items() if k in nuniquekeys}
-            for idx in range(len(markers))],
-        "text": [{k: v for k, v in lstyles[idx].items() if k in luniquekeys} 
-            for idx in range(len(markers))]
-    }
-    
-    return shared_styles, unique_styles
-
-
-
-## Unlike toyplot, I do not want to add text styling at draw time, 
-## but rather before hand so that we can simplify the HTML. 
-## MAYBE, better way to do this by editing HTML after its written
-## inside my own render function, so that less breaking with 
-## toyplot is needed. This is here for now...
-def _draw_text(
-    root,
-    text,
-    x=0,
-    y=0,
-    style=None,
-    angle=None,
-    title=None,
-    attributes=None,
-    layout=None,
-    ):
-
-    if not text:
-        return
-
-    if attributes is None:
-        attributes = {}
-
-    transform = ""
-    if x or y:
-        transform += "translate(%r,%r)" % (x, y)
-    if angle:
-        transform += "rotate(%r)" % (-angle)
-
-    group = xml.SubElement(
-        root,
-        "g",
-        attrib=attributes,
-        )
-    if transform:
-        group.set("transform", transform)
-
-    if title is not None:
-        xml.SubElement(group, "title").text = str(title)
-
-    fonts = toyplot.font.ReportlabLibrary()
-    layout = text if isinstance(text, toyplot.text.Layout) else toyplot.text.layout(text, style, fonts)
-    if layout.style.get("-toyplot-text-layout-visibility", None) == "visible":
-        xml.SubElement(
-            group,
-            "rect",
-            x=str(layout.left),
-            y=str(layout.top),
-            width=str(layout.width),
-            height=str(layout.height),
-            stroke="red",
-            fill="none",
-            opacity="0.5",
-            )
-        xml.SubElement(
-            group,
-            "circle",
-            x="0",
-            y="0",
-            r="3",
-            stroke="none",
-            fill="red",
-            opacity="0.5",
-            )
-
-    hyperlink = []
-    for line in layout.children:
-        if line.style.get("-toyplot-text-layout-line-visibility", None) == "visible":
-            xml.SubElement(
-                group,
-                "rect",
-                x=str(line.left),
-                y=str(line.top),
-                width=str(line.width),
-                height=str(line.height),
-                stroke="green",
-                fill="none",
-                opacity="0.5",
-                )
-            xml.SubElement(
-                group,
-                "line",
-                x1=str(line.left),
-                y1=str(line.baseline),
-                x2=str(line.right),
-                y2=str(line.baseline),
-                stroke="green",
-                fill="none",
-                opacity="0.5",
-                )
-        for box in line.children:
-            if isinstance(box, toyplot.text.TextBox):
-                xml.SubElement(
-                    group,
-                    "text",
-                    x=str(box.left),
-                    y=str(box.baseline),
-                    style=toyplot.style.to_css(style), #toyplot.style.to_css(box.style),
-                    ).text = box.text
-
-                if box.style.get("-toyplot-text-layout-box-visibility", None) == "visible":
-                    xml.SubElement(
-                        group,
-                        "rect",
-                        x=str(box.left),
-                        y=str(box.top),
-                        width=str(box.width),
-                        height=str(box.height),
-                        stroke="blue",
-                        fill="none",
-                        opacity="0.5",
-                        )
-                    xml.SubElement(
-                        group,
-                        "line",
-                        x1=str(box.left),
-                        y1=str(box.baseline),
-                        x2=str(box.right),
-                        y2=str(box.baseline),
-                        stroke="blue",
-                        fill="none",
-                        opacity="0.5",
-                        )
-
-            elif isinstance(box, toyplot.text.MarkerBox):
-                if box.marker:
-                    _draw_marker(
-                        group,
-                        cx=(box.left + box.right) * 0.5,
-                        cy=(box.top + box.bottom) * 0.5,
-                        marker=toyplot.marker.create(size=box.height) + box.marker,
-                        )
-                if box.style.get("-toyplot-text-layout-box-visibility", None) == "visible":
-                    xml.SubElement(
-                        group,
-                        "rect",
-                        x=str(box.left),
-                        y=str(box.top),
-                        width=str(box.width),
-                        height=str(box.height),
-                        stroke="blue",
-                        fill="none",
-                        opacity="0.5",
-                        )
-                    xml.SubElement(
-                        group,
-                        "line",
-                        x1=str(box.left),
-                        y1=str(box.baseline),
-                        x2=str(box.right),
-                        y2=str(box.baseline),
-                        stroke="blue",
-                        fill="none",
-                        opacity="0.5",
-                        )
-
-            elif isinstance(box, toyplot.text.PushHyperlink):
-                hyperlink.append(group)
-                group = xml.SubElement(group, "a")
-                group.set("xlink:href", box.href)
-            elif isinstance(box, toyplot.text.PopHyperlink):
-                group = hyperlink.pop()
-
-
-
-## copy from this to draw my own graph renderer
-#@dispatch(toyplot.coordinates.Cartesian, toyplot.mark.Graph, RenderContext)
-def _render_graph(axes, mark, context): 
-    # Project edge coordinates.
-    for i in range(2):
-        if mark._coordinate_axes[i] == "x":
-            edge_x = axes.project("x", mark._ecoordinates.T[i])
-        elif mark._coordinate_axes[i] == "y":
-            edge_y = axes.project("y", mark._ecoordinates.T[i])
-    edge_coordinates = numpy.column_stack((edge_x, edge_y))
-
-    # Project vertex coordinates.
-    for i in range(2):
-        if mark._coordinate_axes[i] == "x":
-            vertex_x = axes.project("x", mark._vtable[mark._vcoordinates[i]])
-        elif mark._coordinate_axes[i] == "y":
-            vertex_y = axes.project("y", mark._vtable[mark._vcoordinates[i]])
-
-    # NO VERTEX LABELS
-    #vertex_markers = []
-    #for vmarker, vsize, vcolor, vopacity in zip(
-    #        mark._vtable[mark._vmarker[0]],
-    #        mark._vtable[mark._vsize[0]],
-    #        mark._vtable[mark._vcolor[0]],
-    #        mark._vtable[mark._vopacity[0]],
-    #    ):
-    #    if vmarker:
-    #        vstyle = toyplot.style.combine(
-    #            {
-    #            "fill": toyplot.color.to_css(vcolor),
-    #            "stroke": toyplot.color.to_css(vcolor),
-    #            "opacity": vopacity,
-    #            },
-    #            mark._vstyle)
-    #        vertex_marker = toyplot.marker.create(size=vsize, mstyle=vstyle, lstyle=mark._vlstyle) + toyplot.marker.convert(vmarker)
-    #        vertex_markers.append(vertex_marker)
-    #    else:
-    #        vertex_markers.append(None)
-
-    # EDGE STYLES
-    edge_styles = []
-    for ecolor, ewidth, eopacity in zip(
-            mark._etable[mark._ecolor[0]],
-            mark._etable[mark._ewidth[0]],
-            mark._etable[mark._eopacity[0]],
-        ):
-        edge_styles.append(
-            toyplot.style.combine(
-                {
-                "fill": "none",
-                "stroke": toyplot.color.to_css(ecolor),
-                "stroke-width": ewidth,
-                "stroke-opacity": eopacity,
-                },
-                mark._estyle,
-            )
-        )
-
-    edge_marker_styles = []
-    for ecolor, estyle in zip(
-            mark._etable[mark._ecolor[0]],
-            edge_styles,
-            ):
-        edge_marker_styles.append(toyplot.style.combine(estyle, {"fill": toyplot.color.to_css(ecolor)}))
-
-    # Identify ranges of edge coordinates for each edge.
-    index = 0
-    edge_start = []
-    edge_end = []
-    for eshape in mark._etable[mark._eshape[0]]:
-        edge_start.append(index)
-        for segment in eshape:
-            if segment == "M":
-                count = 1
-            elif segment == "L":
-                count = 1
-            elif segment == "Q":
-                count = 2
-            elif segment == "C":
-                count = 3
-            index += count
-        edge_end.append(index)
-
-    # Adjust edge coordinates so edges don't overlap vertex markers.
-    for esource, etarget, start, end in zip(
-            mark._etable[mark._esource[0]],
-            mark._etable[mark._etarget[0]],
-            edge_start,
-            edge_end,
-        ):
-
-        # Skip loop edges.
-        if esource == etarget:
+            margins[side] += text
+
+        # scale each axis to fit, with an equal aspect for circular trees
+        xspan = max(xmax - xmin, 1e-12)
+        yspan = max(ymax - ymin, 1e-12)
+        xscale = max(self.width - margins[0] - margins[1], 1) / xspan
+        yscale = max(self.height - margins[2] - margins[3], 1) / yspan
+        if self.style.layout == "c":
+            xscale = yscale = min(xscale, yscale)
+
+        # center the tree inside the margins
+        xoff = margins[0] + (
+            self.width - margins[0] - margins[1] - xscale * (xmax - xmin)) / 2.
+        yoff = margins[2] + (
+            self.height - margins[2] - margins[3] - yscale * (ymax - ymin)) / 2.
+
+        def project(xy):
+            "project data coordinates to pixels with y pointing down"
+            pix = np.empty(xy.shape, dtype=float)
+            pix[:, 0] = xoff + (xy[:, 0] - xmin) * xscale
+            pix[:, 1] = yoff + (ymax - xy[:, 1]) * yscale
+            return pix
+        return project
+
+
+    def get_tip_shift_and_size(self):
+        "Returns the tip label anchor shift and font size in pixels"
+        tstyle = self.style.tip_labels_style
+        shift = abs(to_pixels(tstyle.get("-toyplot-anchor-shift"), 15.))
+        if self.style.tip_labels is False:
+            shift = 0.
+        return shift, to_pixels(tstyle.get("font-size"), 11.)
+
+
+    def get_tip_widths(self):
+        "Returns the width in pixels of each tip label as plain text"
+        tstyle = self.style.tip_labels_style
+        fstyle = {
+            i: tstyle[i] for i in ("font-family", "font-size", "font-weight")
+            if tstyle.get(i) is not None
+        }
+        fstyle = TEXT_METRICS.get_layout(fstyle)[-1]
+        return TEXT_METRICS.get_widths(
+            [str(i) for i in self.drawing.tip_labels], fstyle)
+
+
+    # -----------------------------------------------------------------
+    # SVG markup
+    # -----------------------------------------------------------------
+    def write_svg(self, fobj):
+        """
+        Writes the SVG markup of the tree to an open text file handle.
+        """
+        # a unique id to scope the CSS classes to this svg element
+        sid = "t" + uuid.uuid4().hex
+        fobj.write(
+            '<svg xmlns="http://www.w3.org/2000/svg" id="{}" width="{}px" '
+            'height="{}px" viewBox="0 0 {} {}">\n'
+            .format(sid, self.width, self.height, self.width, self.height))
+
+        # shared styles as CSS classes
+        fobj.write("<style>\n")
+        for line in self.get_css():
+            fobj.write("#{} {}\n".format(sid, line))
+        fobj.write("</style>\n")
+
+        # aligned tip lines, edges, nodes, node labels and tip labels
+        if self.align is not None:
+            self.write_segments(fobj, "a", self.align)
+        for gidx, (_, idxs) in enumerate(self.edge_groups):
+            self.write_segments(fobj, "e{}".format(gidx), self.edges[idxs])
+        self.write_nodes(fobj)
+        self.write_node_labels(fobj)
+        self.write_tip_labels(fobj)
+        fobj.write("</svg>\n")
+
+
+    def get_css(self):
+        "Returns a list of CSS rules for the shared styles"
+        rules = []
+
+        # edge styles: stroke color and width by group
+        estyle = {
+            i: j for (i, j) in self.style.edge_style.items()
+            if i not in ("stroke", "stroke-width")
+        }
+        estyle["fill"] = "none"
+        for gidx, ((color, width), _) in enumerate(self.edge_groups):
+            rules.append(".e{}{{{}}}".format(gidx, to_css_style(
+                estyle, {"stroke": color, "stroke-width": width})))
+
+        # aligned tip lines
+        astyle = dict(self.style.edge_align_style)
+        if not astyle.get("stroke-width"):
+            astyle["stroke-width"] = self.style.edge_style.get("stroke-width")
+        rules.append(".a{{{}}}".format(to_css_style(astyle, {"fill": "none"})))
+
+        # nodes: fill by group
+        nstyle = {
+            i: j for (i, j) in self.style.node_style.items() if i != "fill"}
+        for gidx, ((_, color), _) in enumerate(self.node_groups):
+            rules.append(".n{}{{{}}}".format(
+                gidx, to_css_style(nstyle, {"fill": color or "none"})))
+
+        # node labels
+        rules.append(".nl{{{}}}".format(to_css_style(
+            {"font-family": "helvetica"},
+            self.style.node_labels_style,
+            {"text-anchor": "middle", "dominant-baseline": "central"},
+        )))
+
+        # tip labels, the fill is set per color run
+        tstyle = {
+            i: j for (i, j) in self.style.tip_labels_style.items()
+            if i != "text-anchor"}
+        rules.append(".tl{{{}}}".format(to_css_style(
+            {"font-family": "helvetica"},
+            tstyle,
+            {"dominant-baseline": "central"},
+        )))
+        return rules
+
+
+    def write_segments(self, fobj, cls, segments):
+        "Writes line segments as a single path element, in chunks"
+        fobj.write('<path class="{}" d="'.format(cls))
+        fmt = "M{:.2f} {:.2f}L{:.2f} {:.2f}".format
+        for start in range(0, segments.shape[0], CHUNKSIZE):
+            chunk = segments[start:start + CHUNKSIZE].tolist()
+            fobj.write("".join([fmt(*i) for i in chunk]))
+        fobj.write('"/>\n')
+
+
+    def write_nodes(self, fobj):
+        "Writes node markers as one path per (shape, color) group"
+        for gidx, ((shape, _), idxs) in enumerate(self.node_groups):
+            idxs = idxs[self.node_sizes[idxs] > 0]
+            if not idxs.size:
+                continue
+            xy = self.nodes[idxs]
+            half = self.node_sizes[idxs] / 2.
+
+            # squares, or circles drawn as two arcs for any other shape
+            if shape == "s":
+                fmt = "M{:.2f} {:.2f}h{:.2f}v{:.2f}h-{:.2f}z".format
+                rows = zip(
+                    xy[:, 0] - half, xy[:, 1] - half, 2 * half, 2 * half,
+                    2 * half)
+            else:
+                fmt = (
+                    "M{:.2f} {:.2f}a{:.2f} {:.2f} 0 1 0 {:.2f} 0"
+                    "a{:.2f} {:.2f} 0 1 0 -{:.2f} 0").format
+                rows = zip(
+                    xy[:, 0] - half, xy[:, 1], half, half, 2 * half,
+                    half, half, 2 * half)
+            fobj.write('<path class="n{}" d="'.format(gidx))
+            fobj.write("".join([fmt(*i) for i in rows]))
+            fobj.write('"/>\n')
+
+
+    def write_node_labels(self, fobj):
+        "Writes node labels as a single run of tspan elements"
+        idxs = [i for (i, j) in enumerate(self.node_labels) if j.strip()]
+        if not idxs:
+            return
+        fobj.write('<text class="nl">')
+        for start in range(0, len(idxs), CHUNKSIZE):
+            fobj.write("".join([
+                '<tspan x="{:.2f}" y="{:.2f}">{}</tspan>'.format(
+                    self.nodes[i, 0], self.nodes[i, 1],
+                    escape(self.node_labels[i]))
+                for i in idxs[start:start + CHUNKSIZE]
+            ]))
+        fobj.write("</text>\n")
+
+
+    def write_tip_labels(self, fobj):
+        """
+        Writes tip labels grouped by color. Horizontal and vertical labels
+        are written as runs of tspan elements in one text element per color
+        (vertical labels inside a rotated text element), whereas circular
+        labels each need their own rotation.
+        """
+        if not any(self.tip_labels):
+            return
+        shift, _ = self.get_tip_shift_and_size()
+        layout = self.style.layout
+
+        # group tips by color and anchor
+        keys = list(zip(self.tip_colors, self.tip_anchors))
+        groups = group_by(keys, np.arange(len(self.tip_labels)))
+        fobj.write('<g class="tl">\n')
+        for (color, anchor), idxs in groups:
+            attrs = 'text-anchor="{}"'.format(anchor)
+            if color:
+                attrs += ' fill="{}"'.format(color)
+            sign = (-1 if anchor == "end" else 1)
+
+            # one text element per label with its own rotation
+            if layout == "c":
+                fmt = (
+                    '<text {} transform="translate({:.2f},{:.2f}) '
+                    'rotate({:.2f})" x="{:.2f}">{}</text>').format
+                for start in range(0, idxs.size, CHUNKSIZE):
+                    fobj.write("".join([
+                        fmt(attrs, self.tips[i, 0], self.tips[i, 1],
+                            -self.tip_angles[i], sign * shift,
+                            escape(self.tip_labels[i]))
+                        for i in idxs[start:start + CHUNKSIZE]
+                    ]))
+                fobj.write("\n")
+                continue
+
+            # vertical labels are written in a frame rotated by 90 degrees
+            # in which (x, y) pixels are at (y, -x).
+            if layout in ("u", "d"):
+                fobj.write('<text {} transform="rotate(90)">'.format(attrs))
+                xs = self.tips[idxs, 1] + sign * shift
+                ys = -self.tips[idxs, 0]
+            else:
+                fobj.write('<text {}>'.format(attrs))
+                xs = self.tips[idxs, 0] + sign * shift
+                ys = self.tips[idxs, 1]
+            fmt = '<tspan x="{:.2f}" y="{:.2f}">{}</tspan>'.format
+            for start in range(0, idxs.size, CHUNKSIZE):
+                end = start + CHUNKSIZE
+                fobj.write("".join([
+                    fmt(x, y, escape(self.tip_labels[i]))
+                    for (x, y, i) in zip(
+                        xs[start:end], ys[start:end], idxs[start:end])
+                ]))
+            fobj.write("</text>\n")
+        fobj.write("</g>\n")
+
+
+
+def render(ttree, fobj=None, tree_style=None, **kwargs):
+    """
+    Renders a tree as SVG markup with the native renderer (TreeRenderer).
+    Styling arguments are the same as for ToyTree.draw(). If fobj is a
+    file name or an open file handle the markup is streamed to it, else
+    the markup is returned as a string.
+
+    Parameters:
+    -----------
+    ttree: ToyTree
+        The tree to render.
+    fobj: str, file handle, or None
+        A file name or handle to write to. If None a string is returned.
+    tree_style: str
+        One of the preset tree styles (see ToyTree.draw()).
+    kwargs:
+        Styling arguments to ToyTree.draw(), e.g., layout, tip_labels,
+        edge_colors, node_sizes, height, width.
+    """
+    # copy the style and update it with the user args
+    style = deepcopy(ttree.style)
+    if kwargs.get("ts"):
+        tree_style = kwargs.pop("ts")
+    if tree_style:
+        style.update(TreeStyle(tree_style[0]))
+    style.update({i: j for (i, j) in kwargs.items() if j is not None})
+
+    # resolve attributes and stream to the file handle
+    renderer = TreeRenderer(ttree, style=style)
+    if fobj is None:
+        out = io.StringIO()
+        renderer.write_svg(out)
+        return out.getvalue()
+    if isinstance(fobj, str):
+        with open(fobj, 'w') as out:
+            renderer.write_svg(out)
+    else:
+        renderer.write_svg(fobj)
+
+
+
+def group_by(keys, idxs):
+    """
+    Groups the items of idxs by their key, where keys is indexed by the
+    values in idxs. Returns a list of (key, positions) tuples, where 
+    positions are the indices in idxs of the items with that key, in 
+    order of the first occurrence of each key in idxs.
+    """
+    # integer code for each unique key
+    groups = {}
+    codes = np.zeros(len(keys), dtype=int)
+    for kidx, key in enumerate(keys):
+        codes[kidx] = groups.setdefault(key, len(groups))
+    order = list(groups)
+
+    # split positions sorted by code into groups
+    gcodes = codes[np.asarray(idxs, dtype=int)]
+    sort = np.argsort(gcodes, kind="stable")
+    uniq, starts = np.unique(gcodes[sort], return_index=True)
+    splits = np.split(sort, starts[1:])
+    result = [(order[i], j) for (i, j) in zip(uniq, splits)]
+    return sorted(result, key=lambda i: i[1][0])
+
+
+def to_css(color):
+    "Returns a CSS color string from a color name, hex, or rgba values"
+    if color is None or isinstance(color, str):
+        return color
+    return toyplot.color.to_css(color)
+
+
+def to_pixels(value, default):
+    "Returns a float number of pixels from a CSS size such as '11px'"
+    if value is None:
+        return default
+    if isinstance(value, str):
+        value = value.strip().replace("px", "")
+        if not value:
+            return default
+    return float(value)
+
+
+def to_css_style(*styles):
+    """
+    Returns a CSS declaration string from style dicts, in which later
+    dicts override earlier ones. Toyplot-specific and None values are
+    skipped and colors are converted to CSS.
+    """
+    style = {}
+    for sdict in styles:
+        style.update(sdict)
+    decls = []
+    for key, val in style.items():
+        if val is None or key.startswith("-toyplot"):
             continue
-
-        source_vertex_marker = vertex_markers[esource]
-        target_vertex_marker = vertex_markers[etarget]
-
-        if source_vertex_marker:
-            dp = source_vertex_marker.intersect(edge_coordinates[start + 1] - edge_coordinates[start])
-            edge_coordinates[start] += dp
-
-        if target_vertex_marker:
-            dp = target_vertex_marker.intersect(edge_coordinates[end - 2] - edge_coordinates[end - 1])
-            edge_coordinates[end - 1] += dp
-
-    # Render the graph.
-    mark_xml = xml.SubElement(
-        context.parent, "g", 
-        id=context.get_id(mark), 
-        attrib={"class": "toyplot-mark-Graph"}
-        )
-    #_render_table(
-    #    owner=mark, 
-    #    key="vertex_data", 
-    #    label="graph vertex data", 
-    #    table=mark._vtable, 
-    #    filename=mark._vfilename, 
-    #    context=context)
-
-    ## THIS ADDS THE DOWNLOAD INFO (NEWICK STRING FILE) TO THE GRAPH
-    _render_table(
-        owner=mark, 
-        key="edge_data", 
-        label="graph edge data", 
-        table=mark._etable, 
-        filename=mark._efilename, 
-        context=context
-        )
-
-    # Render edges.
-    ## THIS IS WHERE WE STICK IN THE COMMON STYLE ELEMENTS
-    edge_xml = xml.SubElement(
-        mark_xml, 
-        "g", 
-        attrib={"class": "toyplot-Edges"}
-        )
-    ## THEN PUT IN THE UNIQUE STYLE ELEMENTS
-    for esource, etarget, eshape, estyle, hmarker, mmarker, mposition, tmarker, start, end in zip(
-            mark._etable[mark._esource[0]],
-            mark._etable[mark._etarget[0]],
-            mark._etable[mark._eshape[0]],
-            edge_styles,
-            mark._etable[mark._hmarker[0]],
-            mark._etable[mark._mmarker[0]],
-            mark._etable[mark._mposition[0]],
-            mark._etable[mark._tmarker[0]],
-            edge_start,
-            edge_end,
-        ):
-
-        path = []
-        index = 0
-        for segment in eshape:
-            if segment == "M":
-                count = 1
-            elif segment == "L":
-                count = 1
-            elif segment == "Q":
-                count = 2
-            elif segment == "C":
-                count = 3
-            path.append(segment)
-            for _ in range(count):
-                path.append(str(edge_coordinates[start + index][0]))
-                path.append(str(edge_coordinates[start + index][1]))
-                index += 1
-
-        xml.SubElement(
-            edge_xml,
-            "path",
-            d=" ".join(path),
-            style=_css_style(estyle),
-            )
-
-
-
-    # Render edge head markers.
-    # marker_xml = xml.SubElement(edge_xml, "g", attrib={"class": "toyplot-HeadMarkers"})
-    # for marker, mstyle, estart, eend in zip(
-    #         mark._etable[mark._hmarker[0]],
-    #         edge_marker_styles,
-    #         edge_start,
-    #         edge_end,
-    #     ):
-    #     if marker:
-    #         # Create the marker with defaults.
-    #         marker = toyplot.marker.create(size=10, mstyle=mstyle) + toyplot.marker.convert(marker)
-
-    #         # Compute the marker angle using the first edge segment.
-    #         edge_angle = -numpy.rad2deg(numpy.arctan2(
-    #             edge_coordinates[estart+1][1] - edge_coordinates[estart][1],
-    #             edge_coordinates[estart+1][0] - edge_coordinates[estart][0],
-    #             ))
-
-    #         transform = "translate(%r, %r)" % (edge_coordinates[estart][0], edge_coordinates[estart][1])
-    #         if edge_angle:
-    #             transform += " rotate(%r)" % (-edge_angle,)
-    #         transform += " translate(%r, 0)" % (marker.size / 2,)
-    #         if marker.angle is not None:
-    #             if isinstance(marker.angle, toyplot.compatibility.string_type) and marker.angle[0:1] == "r":
-    #                 angle = float(marker.angle[1:])
-    #             else:
-    #                 angle = -edge_angle + float(marker.angle)
-    #             transform += " rotate(%r)" % (-angle,)
-
-    #         _draw_marker(
-    #             marker_xml,
-    #             marker=marker,
-    #             transform=transform,
-    #             )
-
-    # # Render edge middle markers.
-    # marker_xml = xml.SubElement(edge_xml, "g", attrib={"class": "toyplot-MiddleMarkers"})
-    # for mstyle, marker, mposition, start, end in zip(
-    #         edge_marker_styles,
-    #         mark._etable[mark._mmarker[0]],
-    #         mark._etable[mark._mposition[0]],
-    #         edge_start,
-    #         edge_end,
-    #     ):
-    #     if marker:
-    #         # Create the marker with defaults.
-    #         marker = toyplot.marker.create(size=10, mstyle=mstyle) + toyplot.marker.convert(marker)
-
-    #         # Place the marker within the first edge segment.
-    #         x, y = edge_coordinates[start] * (1 - mposition) + edge_coordinates[start+1] * mposition
-
-    #         # Compute the marker angle using the first edge segment.
-    #         angle = -numpy.rad2deg(numpy.arctan2(
-    #             edge_coordinates[start+1][1] - edge_coordinates[start][1],
-    #             edge_coordinates[start+1][0] - edge_coordinates[start][0],
-    #             ))
-    #         if marker.angle is not None:
-    #             if isinstance(marker.angle, toyplot.compatibility.string_type) and marker.angle[0:1] == "r":
-    #                 angle += float(marker.angle[1:])
-    #             else:
-    #                 angle = float(marker.angle)
-
-    #         marker = marker + toyplot.marker.create(angle=angle)
-
-    #         _draw_marker(
-    #             marker_xml,
-    #             cx=x,
-    #             cy=y,
-    #             marker=marker,
-    #             )
-
-    # # Render edge tail markers.
-    # marker_xml = xml.SubElement(edge_xml, "g", attrib={"class": "toyplot-TailMarkers"})
-    # for mstyle, marker, start, end in zip(
-    #         edge_marker_styles,
-    #         mark._etable[mark._tmarker[0]],
-    #         edge_start,
-    #         edge_end,
-    #     ):
-    #     if marker:
-    #         # Create the marker with defaults.
-    #         marker = toyplot.marker.create(size=10, mstyle=mstyle, lstyle={}) + toyplot.marker.convert(marker)
-
-    #         # Compute the marker angle using the last edge segment.
-    #         edge_angle = -numpy.rad2deg(numpy.arctan2(
-    #             edge_coordinates[end-1][1] - edge_coordinates[end-2][1],
-    #             edge_coordinates[end-1][0] - edge_coordinates[end-2][0],
-    #             ))
-
-    #         transform = "translate(%r, %r)" % (edge_coordinates[end-1][0], edge_coordinates[end-1][1])
-    #         if edge_angle:
-    #             transform += " rotate(%r)" % (-edge_angle,)
-    #         transform += " translate(%r, 0)" % (-marker.size / 2,)
-    #         if marker.angle is not None:
-    #             if isinstance(marker.angle, toyplot.compatibility.string_type) and marker.angle[0:1] == "r":
-    #                 angle = float(marker.angle[1:])
-    #             else:
-    #                 angle = -edge_angle + float(marker.angle)
-    #             transform += " rotate(%r)" % (-angle,)
-
-
-    #         _draw_marker(
-    #             marker_xml,
-    #             marker=marker,
-    #             transform=transform,
-    #             )
-
-    # Render vertex markers
-    #vertex_xml = xml.SubElement(mark_xml, "g", attrib={"class": "toyplot-Vertices"})
-    #for vx, vy, vmarker, vtitle in zip(
-    #        vertex_x,
-    #        vertex_y,
-    #        vertex_markers,
-    #        mark._vtable[mark._vtitle[0]],
-    #    ):
-    #    if vmarker:
-    #        _draw_marker(
-    #            vertex_xml,
-    #            cx=vx,
-    #            cy=vy,
-    #            marker=vmarker,
-    #            extra_class="toyplot-Datum",
-    #            title=vtitle,
-    #            )
-
-    # Render vertex labels
-    #if mark._vlshow:
-    #    vlabel_xml = xml.SubElement(mark_xml, "g", attrib={"class": "toyplot-Labels"})
-    #    for dx, dy, dtext in zip(vertex_x, vertex_y, mark._vtable[mark._vlabel[0]]):
-    #        _draw_text(
-    #            root=vlabel_xml,
-    #            text=toyplot.compatibility.unicode_type(dtext),
-    #            x=dx,
-    #            y=dy,
-    #            style=mark._vlstyle,
-    #            attributes={"class": "toyplot-Datum"},
-    #            )
-
+        if key in ("fill", "stroke"):
+            val = to_css(val)
+        decls.append("{}:{}".format(key, val))
+    return ";".join(decls)
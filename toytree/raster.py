@@ -0,0 +1,464 @@
+#!/usr/bin/env python
+
+"""
+A raster (PNG) renderer for drawing massive trees and tree clouds.
+
+Edges are rasterized with numpy with anti-aliasing: horizontal and
+vertical segments are drawn as rectangles covering the exact area of each
+pixel, and other segments as lines with round ends whose pixel coverage is
+computed from their distance to the line. All segments drawn in one call
+form a single layer (overlapping segments do not darken each other) which
+is alpha composited onto the image, such that drawing many semi-transparent
+trees accumulates density like a tree cloud. Segments are processed in
+chunks and the buffers are the size of the image, so memory is bounded by
+the image size rather than by the size of the tree.
+
+Text (tip and node labels) and the outlines of node markers are not drawn
+by this renderer.
+"""
+
+from copy import deepcopy
+
+import numpy as np
+import png
+import toyplot
+
+from .html import TreeRenderer, to_pixels
+from .TreeStyle import TreeStyle
+from .utils import ToytreeError
+
+
+# max number of candidate pixels evaluated per chunk of segments
+CHUNKSIZE = 2000000
+
+
+
+class Raster:
+    """
+    An RGBA image onto which layers of anti-aliased line segments and
+    node markers are composited.
+
+    Parameters:
+    -----------
+    width: int
+        Width of the image in pixels.
+    height: int
+        Height of the image in pixels.
+    background: str or None
+        A background color, default is transparent.
+    """
+    def __init__(self, width, height, background=None):
+        self.width = int(width)
+        self.height = int(height)
+        if self.width < 1 or self.height < 1:
+            raise ToytreeError("image width and height must be > 0")
+
+        # premultiplied rgba buffer and a coverage buffer for one layer
+        self.rgba = np.zeros((self.height * self.width, 4), dtype=np.float32)
+        self._cover = np.zeros(self.height * self.width, dtype=np.float32)
+        background = to_rgba(background)
+        if background is not None:
+            self.rgba[:] = premultiply(background)
+
+
+    def add_segments(
+        self, segments, color="#262626", width=2, opacity=1., layers=None):
+        """
+        Draws line segments as a single layer, or as many layers of the
+        same style if layers is given, which is the same as (but faster
+        than) calling add_segments() once for each layer.
+
+        Parameters:
+        -----------
+        segments: ndarray
+            Array of shape (n, 4) with (x0, y0, x1, y1) pixel coordinates.
+        color: str
+            A color name, hex or CSS string.
+        width: float
+            Line width in pixels.
+        opacity: float
+            Opacity of each layer.
+        layers: ndarray (optional)
+            Integer layer of each segment, e.g., the index of the tree
+            that a segment belongs to in a tree cloud.
+        """
+        segments = np.asarray(segments, dtype=float).reshape(-1, 4)
+        self._add_layers(
+            segments, float(width), False, color, opacity, layers)
+
+
+    def add_points(self, points, size=8, color="#262626", opacity=1., shape="o"):
+        """
+        Draws filled node markers as a single layer. Squares are drawn for
+        shape "s" and circles for any other shape.
+
+        Parameters:
+        -----------
+        points: ndarray
+            Array of shape (n, 2) with (x, y) pixel coordinates.
+        size: float
+            Marker diameter in pixels.
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        self._add_layers(
+            np.hstack([points, points]), float(size), shape == "s",
+            color, opacity, None)
+
+
+    def _add_layers(self, segments, width, square, color, opacity, layers):
+        """
+        Accumulates the coverage of each layer of segments and composites
+        the layers. As all layers have the same color, compositing them is
+        the same as multiplying their transparencies, which are summed
+        over layers as logs and applied to the image once.
+        """
+        rgba = to_rgba(color)
+        if rgba is None or not segments.size or width <= 0:
+            return
+        rgba[3] *= opacity
+        if not rgba[3]:
+            return
+        if layers is None:
+            layers = np.zeros(segments.shape[0], dtype=np.int64)
+
+        # sort segments by layer, and split layers into chunks of about
+        # CHUNKSIZE candidate pixels made of whole layers.
+        order = np.argsort(layers, kind="stable")
+        segments = segments[order]
+        _, lcodes = np.unique(np.asarray(layers)[order], return_inverse=True)
+        sizes = np.bincount(
+            lcodes, weights=get_sizes(segments, width, square))
+        lstarts = np.searchsorted(lcodes, np.arange(sizes.size + 1))
+
+        # log transparency summed over layers
+        trans = np.zeros(self._cover.size, dtype=np.float64)
+        for start, end in get_chunks(sizes, CHUNKSIZE):
+            segs = segments[lstarts[start]:lstarts[end]]
+
+            # a single layer is accumulated on an image sized buffer
+            if end - start == 1:
+                self._add_rectangles(segs, width, square)
+                self._add_lines(segs, width, square)
+                idxs = np.flatnonzero(self._cover)
+                cover = self._cover[idxs]
+                self._cover[idxs] = 0
+
+            # many small layers are combined by (layer, pixel) keys
+            else:
+                idxs, cover = get_layer_coverage(
+                    segs, lcodes[lstarts[start]:lstarts[end]], width,
+                    square, self.width, self.height)
+            with np.errstate(divide="ignore"):
+                trans += np.bincount(
+                    idxs, weights=np.log1p(-cover * rgba[3]),
+                    minlength=trans.size)
+
+        # composite the layers over the image at the covered pixels
+        touched = np.flatnonzero(trans)
+        alpha = 1 - np.exp(trans[touched, None])
+        color = np.append(rgba[:3], 1.)
+        self.rgba[touched] = (
+            color[None, :] * alpha + self.rgba[touched] * (1 - alpha))
+
+
+    def _add_rectangles(self, segments, width, square):
+        """
+        Adds the coverage of segments drawn as rectangles to the layer
+        buffer. Coverage is summed over rectangles up to 1.
+        """
+        segments = segments[get_rectangles(segments, square)]
+        sizes = get_sizes(segments, width, True)
+        total = np.zeros(self._cover.size)
+        for start, end in get_chunks(sizes, CHUNKSIZE):
+            _, idxs, cover = get_rectangle_coverage(
+                segments[start:end], width, self.width, self.height)
+            total += np.bincount(idxs, weights=cover, minlength=total.size)
+        np.maximum(self._cover, np.minimum(total, 1), out=self._cover)
+
+
+    def _add_lines(self, segments, width, square):
+        """
+        Adds the coverage of segments drawn as lines with round ends to the
+        layer buffer. Coverage is the max over lines.
+        """
+        segments = segments[~get_rectangles(segments, square)]
+        sizes = get_sizes(segments, width, False)
+        for start, end in get_chunks(sizes, CHUNKSIZE):
+            _, idxs, cover = get_line_coverage(
+                segments[start:end], width, self.width, self.height)
+            np.maximum.at(self._cover, idxs, cover)
+
+
+    def to_array(self):
+        "Returns the image as a uint8 array of shape (height, width, 4)"
+        rgba = self.rgba.copy()
+        alpha = rgba[:, 3:]
+        np.divide(rgba[:, :3], alpha, out=rgba[:, :3], where=alpha > 0)
+        rgba = np.clip(np.round(rgba * 255), 0, 255).astype(np.uint8)
+        return rgba.reshape(self.height, self.width, 4)
+
+
+    def write_png(self, fobj):
+        "Writes the image as PNG to a file name or binary file handle"
+        writer = png.Writer(self.width, self.height, alpha=True, greyscale=False)
+        rows = self.to_array().reshape(self.height, self.width * 4)
+        if isinstance(fobj, str):
+            with open(fobj, 'wb') as out:
+                writer.write(out, rows)
+        else:
+            writer.write(fobj, rows)
+
+
+
+def render(ttree, fobj, tree_style=None, background=None, **kwargs):
+    """
+    Renders a tree as a PNG image with the raster renderer. Styling
+    arguments are the same as for ToyTree.draw(); edges and node markers
+    are drawn but labels are not. The tree is laid out the same as by the
+    native SVG renderer (toytree.html.render) without tip labels.
+
+    Parameters:
+    -----------
+    ttree: ToyTree
+        The tree to render.
+    fobj: str or file handle
+        A file name or binary file handle to write the PNG to.
+    tree_style: str
+        One of the preset tree styles (see ToyTree.draw()).
+    background: str or None
+        A background color, default is transparent.
+    kwargs:
+        Styling arguments to ToyTree.draw(), e.g., layout, edge_colors,
+        edge_widths, node_sizes, height, width.
+    """
+    # copy the style and update it with the user args
+    style = deepcopy(ttree.style)
+    if kwargs.get("ts"):
+        tree_style = kwargs.pop("ts")
+    if tree_style:
+        style.update(TreeStyle(tree_style[0]))
+    style.update({i: j for (i, j) in kwargs.items() if j is not None})
+    style.tip_labels = False
+
+    # project the tree geometry to pixels
+    renderer = TreeRenderer(ttree, style=style)
+    raster = Raster(renderer.width, renderer.height, background)
+
+    # edges by (color, width) group
+    estyle = renderer.style.edge_style
+    opacity = get_opacity(estyle, "stroke-opacity")
+    for (color, width), idxs in renderer.edge_groups:
+        raster.add_segments(
+            renderer.edges[idxs], color, to_pixels(width, 2.), opacity)
+
+    # node markers by (shape, color) group
+    nstyle = renderer.style.node_style
+    opacity = get_opacity(nstyle, "fill-opacity")
+    for (shape, color), idxs in renderer.node_groups:
+        for size in np.unique(renderer.node_sizes[idxs]):
+            if size > 0:
+                sidxs = idxs[renderer.node_sizes[idxs] == size]
+                raster.add_points(
+                    renderer.nodes[sidxs], size, color, opacity, shape)
+    raster.write_png(fobj)
+    return raster
+
+
+
+def get_rectangles(segments, square):
+    """
+    Returns a mask of the segments that are drawn as rectangles: horizontal
+    and vertical segments (e.g., all edges of rectangular trees), and
+    points if they are square markers. All other segments and points are
+    drawn as lines with round ends.
+    """
+    xflat = segments[:, 0] == segments[:, 2]
+    yflat = segments[:, 1] == segments[:, 3]
+    return (xflat | yflat) & (square | ~(xflat & yflat))
+
+
+def get_sizes(segments, width, square):
+    "Returns the number of candidate pixels evaluated for each segment"
+    dx = np.abs(segments[:, 2] - segments[:, 0])
+    dy = np.abs(segments[:, 3] - segments[:, 1])
+    rects = (dx + width + 2) * (dy + width + 2)
+    ncols, nrows = get_line_bands(dx, dy, width)
+    return np.where(get_rectangles(segments, square), rects, ncols * nrows)
+
+
+def get_line_bands(dx, dy, width):
+    """
+    Returns the number of columns and rows of pixels along the major and
+    minor axis that are evaluated to cover lines with these extents and
+    their round ends.
+    """
+    major = np.maximum(dx, dy)
+    slope = np.divide(
+        np.minimum(dx, dy), major, out=np.zeros(major.shape), where=major > 0)
+    reach = width / 2. + 0.5
+    ncols = np.floor(major + 2 * reach).astype(np.int64) + 2
+    nrows = np.ceil(2 * reach * np.sqrt(1 + slope ** 2)).astype(np.int64) + 2
+    return ncols, nrows
+
+
+def get_layer_coverage(segments, layers, width, square, imwidth, imheight):
+    """
+    Returns flat pixel indices and coverage for segments in many layers.
+    The coverage of each pixel in each layer is the sum of coverage by
+    rectangles (up to 1) or the max coverage by lines, whichever is larger.
+    A pixel index is returned once for each layer that covers it.
+    """
+    npix = imwidth * imheight
+    rects = get_rectangles(segments, square)
+    keys, covers = [], []
+    for mask, func, reduce in (
+            (rects, get_rectangle_coverage, np.add),
+            (~rects, get_line_coverage, np.maximum)):
+        rows, idxs, cover = func(segments[mask], width, imwidth, imheight)
+        key, inv = np.unique(
+            layers[mask][rows] * npix + idxs, return_inverse=True)
+        total = np.zeros(key.size)
+        reduce.at(total, inv, cover)
+        keys.append(key)
+        covers.append(np.minimum(total, 1))
+
+    # max of rectangle and line coverage of each (layer, pixel)
+    key, inv = np.unique(np.concatenate(keys), return_inverse=True)
+    cover = np.zeros(key.size)
+    np.maximum.at(cover, inv, np.concatenate(covers))
+    return key % npix, cover
+
+
+def get_rectangle_coverage(segments, width, imwidth, imheight):
+    """
+    Returns the segment row, flat pixel index and coverage (0-1) of each
+    pixel overlapped by horizontal or vertical segments drawn as rectangles
+    extended by half the width on each side. Coverage is the exact area of
+    the pixel inside the rectangle.
+    """
+    # rectangle bounds clipped to the image
+    half = width / 2.
+    xmin = np.clip(np.minimum(segments[:, 0], segments[:, 2]) - half, 0, imwidth)
+    xmax = np.clip(np.maximum(segments[:, 0], segments[:, 2]) + half, 0, imwidth)
+    ymin = np.clip(np.minimum(segments[:, 1], segments[:, 3]) - half, 0, imheight)
+    ymax = np.clip(np.maximum(segments[:, 1], segments[:, 3]) + half, 0, imheight)
+
+    # the block of pixels overlapped by each rectangle
+    col0 = np.floor(xmin).astype(np.int64)
+    row0 = np.floor(ymin).astype(np.int64)
+    ncols = np.ceil(xmax).astype(np.int64) - col0
+    nrows = np.ceil(ymax).astype(np.int64) - row0
+    npixels = np.where((xmax > xmin) & (ymax > ymin), ncols * nrows, 0)
+
+    # a row for each pixel of each rectangle
+    ridx = np.repeat(np.arange(segments.shape[0]), npixels)
+    offset = np.arange(ridx.size) - np.repeat(
+        np.cumsum(npixels) - npixels, npixels)
+    cols = col0[ridx] + offset % ncols[ridx]
+    rows = row0[ridx] + offset // ncols[ridx]
+
+    # overlap of each pixel with its rectangle on each axis
+    xover = np.minimum(cols + 1, xmax[ridx]) - np.maximum(cols, xmin[ridx])
+    yover = np.minimum(rows + 1, ymax[ridx]) - np.maximum(rows, ymin[ridx])
+    cover = np.clip(xover, 0, 1) * np.clip(yover, 0, 1)
+    return ridx, rows * imwidth + cols, cover
+
+
+def get_line_coverage(segments, width, imwidth, imheight):
+    """
+    Returns the segment row, flat pixel index and coverage (0-1) of the
+    pixels around segments drawn as lines with round ends. For each pixel
+    column along the major axis of a segment a band of pixels around the
+    line is evaluated, and coverage is a linear ramp of the pixel center
+    distance from the edge of the line.
+    """
+    # segment coordinates with u as the major axis and u0 <= u1
+    x0, y0, x1, y1 = segments.T
+    steep = np.abs(y1 - y0) > np.abs(x1 - x0)
+    u0, v0 = np.where(steep, y0, x0), np.where(steep, x0, y0)
+    u1, v1 = np.where(steep, y1, x1), np.where(steep, x1, y1)
+    flip = u1 < u0
+    u0, u1 = np.where(flip, u1, u0), np.where(flip, u0, u1)
+    v0, v1 = np.where(flip, v1, v0), np.where(flip, v0, v1)
+    ncols, nrows = get_line_bands(u1 - u0, np.abs(v1 - v0), width)
+    slope = np.divide(v1 - v0, u1 - u0, out=np.zeros(u0.shape), where=u1 > u0)
+
+    # a row for each column of each segment
+    reach = width / 2. + 0.5
+    sidx = np.repeat(np.arange(segments.shape[0]), ncols)
+    offset = np.arange(sidx.size) - np.repeat(np.cumsum(ncols) - ncols, ncols)
+    cols = np.floor(u0 - reach).astype(np.int64)[sidx] + offset
+
+    # the band of rows centered on the line in each column
+    cu = cols + 0.5 - u0[sidx]
+    vline = v0[sidx] + slope[sidx] * np.clip(cu, 0, (u1 - u0)[sidx])
+    band = nrows[sidx]
+    row0 = np.floor(vline - band / 2.).astype(np.int64) + 1
+
+    # a row for each pixel in the band of each column, with the column 
+    # values repeated for each pixel.
+    offset = np.arange(band.sum()) - np.repeat(np.cumsum(band) - band, band)
+    pu = np.repeat(cols, band)
+    pv = np.repeat(row0, band) + offset
+    du = np.repeat((u1 - u0)[sidx], band)
+    dv = np.repeat((v1 - v0)[sidx], band)
+    cu = np.repeat(cu, band)
+    cv = pv + 0.5 - np.repeat(v0[sidx], band)
+    steep = np.repeat(steep[sidx], band)
+    sidx = np.repeat(sidx, band)
+
+    # pixel center distances to the nearest point on each segment
+    norm = du * du + dv * dv
+    tpos = np.clip(
+        np.divide(cu * du + cv * dv, norm, out=np.zeros(norm.shape),
+                  where=norm > 0), 0, 1)
+    dist = np.hypot(cu - tpos * du, cv - tpos * dv)
+
+    # coverage of pixels inside the image
+    px = np.where(steep, pv, pu)
+    py = np.where(steep, pu, pv)
+    cover = np.clip(reach - dist, 0, min(width, 1.))
+    mask = (cover > 0) & (px >= 0) & (px < imwidth) & (py >= 0) & (py < imheight)
+    return sidx[mask], py[mask] * imwidth + px[mask], cover[mask]
+
+
+def get_chunks(sizes, budget):
+    """
+    Returns (start, end) index pairs splitting items into consecutive
+    chunks whose sizes sum to about budget. An item larger than the
+    budget gets a chunk of its own.
+    """
+    if not len(sizes):
+        return []
+    total = np.cumsum(sizes)
+    bounds = np.unique(np.concatenate([
+        [0],
+        np.searchsorted(total, np.arange(budget, total[-1], budget), "right"),
+        [len(sizes)],
+    ]))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def to_rgba(color):
+    "Returns a float array (r, g, b, a) from a color or None if no color"
+    if color is None:
+        return None
+    if not isinstance(color, str):
+        color = toyplot.color.to_css(color)
+    rgba = toyplot.color.css(color)
+    if rgba is None:
+        return None
+    return np.array([rgba["r"], rgba["g"], rgba["b"], rgba["a"]], dtype=float)
+
+
+def premultiply(rgba):
+    "Returns rgba with the color channels multiplied by alpha"
+    return np.concatenate([rgba[:3] * rgba[3], rgba[3:]])
+
+
+def get_opacity(style, key):
+    "Returns the product of the opacity and key opacity in a style dict"
+    opacity = style.get("opacity")
+    opacity = 1. if opacity is None else float(opacity)
+    other = style.get(key)
+    return opacity * (1. if other is None else float(other))